@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.analytics.repository import AnalyticsRepository
+
+
+class AsyncAnalyticsRepository:
+    """
+    Асинхронный репозиторий аналитики для эндпоинтов FastAPI.
+
+    Запросы те же, что в AnalyticsRepository: они выполняются через
+    AsyncSession.run_sync поверх соединения asyncpg, поэтому ожидание БД
+    не занимает event loop. Синхронный AnalyticsRepository остается для
+    скриптов, воркеров и фоновых потоков.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, method: str, *args, **kwargs):
+        return await self.db.run_sync(
+            lambda session: getattr(AnalyticsRepository(session), method)(*args, **kwargs)
+        )
+
+    async def count_transcriptions(self) -> int:
+        result = await self.db.execute(text("SELECT COUNT(*) FROM transcription_records"))
+        return result.scalar() or 0
+
+    async def get_total_count(self) -> Dict[str, int]:
+        return await self._run("get_total_count")
+
+    async def get_daily_statistics(self, days: int = 7) -> List[Dict[str, Any]]:
+        return await self._run("get_daily_statistics", days)
+
+    async def get_language_distribution(self) -> Dict[str, int]:
+        return await self._run("get_language_distribution")
+
+    async def get_success_rate(self, days: int = 7) -> Dict[str, float]:
+        return await self._run("get_success_rate", days)
+
+    async def get_performance_metrics(self, hours: int = 24) -> Dict[str, Any]:
+        return await self._run("get_performance_metrics", hours)
+
+    async def get_system_metrics(self, hours: int = 24, raw_hours: int = 24) -> Dict[str, Any]:
+        return await self._run("get_system_metrics", hours, raw_hours)
+
+    async def get_latency_histograms(self, hours: int = 24) -> List[Dict[str, Any]]:
+        return await self._run("get_latency_histograms", hours)
+
+    async def get_top_words(self, limit: int = 20, min_length: int = 3) -> List[Dict[str, Any]]:
+        return await self._run("get_top_words", limit, min_length)
+
+    async def get_recent_transcriptions(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return await self._run("get_recent_transcriptions", limit)
+
+    async def list_transcriptions(self, limit: int = 50, cursor: Optional[str] = None,
+                                  status: Optional[str] = None, language: Optional[str] = None,
+                                  created_from: Optional[datetime] = None, created_to: Optional[datetime] = None,
+                                  filename_prefix: Optional[str] = None) -> Dict[str, Any]:
+        return await self._run(
+            "list_transcriptions", limit, cursor, status=status, language=language,
+            created_from=created_from, created_to=created_to, filename_prefix=filename_prefix
+        )
+
+    async def search_transcriptions(self, q: str, limit: int = 20, cursor: Optional[str] = None,
+                                    language: Optional[str] = None) -> Dict[str, Any]:
+        return await self._run("search_transcriptions", q, limit, cursor, language=language)
+
+    async def get_document_keywords(self, file_uuid: str, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        return await self._run("get_document_keywords", file_uuid, limit)
+
+    async def get_trending_terms(self, hours: int = 24, limit: int = 20,
+                                 language: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self._run("get_trending_terms", hours, limit, language=language)
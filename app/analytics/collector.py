@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import psutil
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+METRIC_TYPES = ('cpu_usage', 'memory_usage', 'memory_available')
+
+
+class SystemMetricsCollector:
+    """
+    Сборщик системных метрик, один на процесс.
+
+    Семплы psutil складываются в кольцевой буфер фиксированного размера,
+    а в system_metrics раз в SYSTEM_METRICS_FLUSH_SECONDS пишется одна
+    агрегированная строка на метрику (среднее за окно) одним запросом.
+    """
+
+    def __init__(self, sample_interval: float, flush_interval: float, buffer_size: int,
+                 service: str = "transcription"):
+        self.sample_interval = sample_interval
+        self.flush_interval = flush_interval
+        self.service = service
+        self._buffer: Deque[Tuple[float, Dict[str, float]]] = deque(maxlen=buffer_size)
+        self._pending: List[Dict[str, float]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> Dict[str, float]:
+        """Один семпл без блокировки (cpu_percent считается с прошлого вызова)"""
+        memory = psutil.virtual_memory()
+        values = {
+            'cpu_usage': psutil.cpu_percent(interval=None),
+            'memory_usage': memory.percent,
+            'memory_available': memory.available / 1024 / 1024  # MB
+        }
+        with self._lock:
+            self._buffer.append((time.time(), values))
+            self._pending.append(values)
+        return values
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        """Последний семпл из буфера"""
+        with self._lock:
+            return dict(self._buffer[-1][1]) if self._buffer else None
+
+    def recent(self, seconds: float) -> Dict[str, Dict[str, float]]:
+        """Сводка (avg/max/min) по семплам за последние seconds секунд"""
+        since = time.time() - seconds
+        with self._lock:
+            samples = [values for timestamp, values in self._buffer if timestamp >= since]
+
+        summary = {}
+        for metric_type in METRIC_TYPES:
+            series = [values[metric_type] for values in samples]
+            if series:
+                summary[metric_type] = {
+                    'avg': round(sum(series) / len(series), 1),
+                    'max': round(max(series), 1),
+                    'min': round(min(series), 1)
+                }
+        return summary
+
+    def flush(self) -> int:
+        """Запись средних значений накопленных семплов в system_metrics"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        if not pending:
+            return 0
+
+        metrics = [{
+            'metric_type': metric_type,
+            'metric_value': sum(values[metric_type] for values in pending) / len(pending),
+            'service': self.service
+        } for metric_type in METRIC_TYPES]
+
+        from app.analytics.repository import AnalyticsRepository
+        from app.database import get_db_session
+
+        with get_db_session() as db:
+            AnalyticsRepository(db).add_system_metrics(metrics)
+        return len(metrics)
+
+    def start(self):
+        """Запуск сбора (повторный вызов ничего не делает)"""
+        if self._thread and self._thread.is_alive():
+            return
+        # Первый вызов cpu_percent(None) возвращает 0 - прогреваем счетчик
+        psutil.cpu_percent(interval=None)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="system-metrics", daemon=True)
+        self._thread.start()
+        print("📊 System metrics collection started")
+
+    def stop(self):
+        """Остановка сбора с финальной записью"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing system metrics: {e}")
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.wait(self.sample_interval):
+            try:
+                self.sample()
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    last_flush = time.monotonic()
+                    self.flush()
+            except Exception as e:
+                print(f"⚠️ Error collecting system metrics: {e}")
+
+
+system_metrics_collector = SystemMetricsCollector(
+    sample_interval=settings.SYSTEM_METRICS_SAMPLE_SECONDS,
+    flush_interval=settings.SYSTEM_METRICS_FLUSH_SECONDS,
+    buffer_size=settings.SYSTEM_METRICS_BUFFER_SIZE
+)
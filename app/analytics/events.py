@@ -0,0 +1,68 @@
+"""
+Типизированные события аналитики.
+
+Обработчики запросов только создают события и отдают их в analytics_writer,
+запись в Postgres выполняет фоновый поток пачками.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class AnalyticsEvent:
+    """Базовое событие аналитики"""
+    file_uuid: str
+
+    # Жизненный цикл транскрипции важнее метрик: при переполнении
+    # буфера такие события ждут место, остальные отбрасываются сразу
+    critical = False
+
+
+@dataclass
+class TranscriptionStarted(AnalyticsEvent):
+    filename: str = ""
+    file_size: int = 0
+    duration: float = 0.0
+    language: str = "ru"
+    model: str = "unknown"
+    transcription_id: str = ""
+    created_at: datetime = field(default_factory=_now)
+
+    critical = True
+
+
+@dataclass
+class TranscriptionCompleted(AnalyticsEvent):
+    text_length: int = 0
+    processing_time: float = 0.0
+    confidence_score: Optional[float] = None
+    duration: Optional[float] = None  # None - не перезаписывать значение из старта
+    transcript_text: Optional[str] = None  # None - не индексировать текст для поиска
+    completed_at: datetime = field(default_factory=_now)
+
+    critical = True
+
+
+@dataclass
+class TranscriptionFailed(AnalyticsEvent):
+    error_message: str = ""
+    completed_at: datetime = field(default_factory=_now)
+
+    critical = True
+
+
+@dataclass
+class WordStatisticsRecorded(AnalyticsEvent):
+    words: List[Dict[str, Any]] = field(default_factory=list)  # [{'word', 'count', 'language'}]
+
+
+@dataclass
+class PerformanceMetricRecorded(AnalyticsEvent):
+    metric_name: str = ""
+    value: float = 0.0
+    created_at: datetime = field(default_factory=_now)
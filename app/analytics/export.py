@@ -0,0 +1,245 @@
+"""
+Потоковая выгрузка аналитических таблиц в CSV и Parquet.
+
+Строки читаются серверным курсором порциями (yield_per) и сразу
+отдаются клиенту: CSV - текстом порции, Parquet - отдельной группой строк
+(row group). Память процесса не зависит от размера выгрузки.
+
+Выгрузка идет через отдельное соединение без пула в read-only транзакции
+REPEATABLE READ (согласованный снимок), поэтому долгий экспорт не занимает
+соединения пула API. Одновременных выгрузок не больше EXPORT_MAX_CONCURRENT.
+"""
+import csv
+import io
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Таблица -> (столбец времени для from/to, [(столбец, тип)])
+EXPORT_TABLES: Dict[str, Tuple[str, List[Tuple[str, str]]]] = {
+    "transcription_records": ("created_at", [
+        ("id", "str"), ("transcription_id", "str"), ("filename", "str"), ("file_size", "int"),
+        ("duration", "float"), ("language", "str"), ("model", "str"), ("status", "str"),
+        ("error_message", "str"), ("text_length", "int"), ("processing_time", "float"),
+        ("confidence_score", "float"), ("created_at", "datetime"), ("completed_at", "datetime"),
+    ]),
+    "performance_metrics": ("created_at", [
+        ("id", "int"), ("file_uuid", "str"), ("metric_name", "str"), ("metric_value", "float"),
+        ("unit", "str"), ("created_at", "datetime"),
+    ]),
+    "system_metrics": ("timestamp", [
+        ("timestamp", "datetime"), ("metric_type", "str"), ("metric_value", "float"), ("service", "str"),
+    ]),
+    "system_metrics_hourly": ("hour", [
+        ("hour", "datetime"), ("metric_type", "str"), ("service", "str"), ("avg_value", "float"),
+        ("min_value", "float"), ("max_value", "float"), ("samples", "int"),
+    ]),
+    "word_statistics": ("created_at", [
+        ("file_uuid", "str"), ("word", "str"), ("count", "int"), ("language", "str"), ("created_at", "datetime"),
+    ]),
+    "transcription_rollups_hourly": ("bucket", [
+        ("bucket", "datetime"), ("status", "str"), ("language", "str"), ("model", "str"), ("count", "int"),
+        ("processing_time_sum", "float"), ("processing_time_min", "float"), ("processing_time_max", "float"),
+        ("text_length_sum", "int"), ("text_length_max", "int"), ("duration_sum", "float"),
+    ]),
+    "transcription_rollups_daily": ("bucket", [
+        ("bucket", "datetime"), ("status", "str"), ("language", "str"), ("model", "str"), ("count", "int"),
+        ("processing_time_sum", "float"), ("processing_time_min", "float"), ("processing_time_max", "float"),
+        ("text_length_sum", "int"), ("text_length_max", "int"), ("duration_sum", "float"),
+    ]),
+    "document_keywords": ("created_at", [
+        ("file_uuid", "str"), ("term", "str"), ("language", "str"), ("score", "float"),
+        ("position", "int"), ("created_at", "datetime"),
+    ]),
+}
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ExportError(ValueError):
+    """Неверные параметры выгрузки"""
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файловый объект для ParquetWriter: накопленные байты забираются после каждой группы строк"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _parquet_schema(columns: List[Tuple[str, str]]):
+    types = {
+        "str": pyarrow.string(),
+        "int": pyarrow.int64(),
+        "float": pyarrow.float64(),
+        "datetime": pyarrow.timestamp("us"),
+    }
+    return pyarrow.schema([(name, types[kind]) for name, kind in columns])
+
+
+class ExportSlot:
+    """
+    Занятый слот выгрузки. Освобождается один раз: повторный release
+    (из генератора и из фоновой задачи ответа) ничего не делает
+    """
+
+    def __init__(self, semaphore: threading.BoundedSemaphore):
+        self._semaphore = semaphore
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._semaphore.release()
+
+
+class AnalyticsExporter:
+    """Потоковая выгрузка таблиц аналитики"""
+
+    def __init__(self, batch_size: int = 10000, max_concurrent: int = 2):
+        self.batch_size = batch_size
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._engine = None
+        self._engine_lock = threading.Lock()
+
+    @property
+    def engine(self):
+        # Отдельный движок без пула: соединение живет ровно столько, сколько выгрузка
+        with self._engine_lock:
+            if self._engine is None:
+                self._engine = create_engine(settings.DATABASE_URL, poolclass=NullPool, pool_pre_ping=True)
+            return self._engine
+
+    def validate(self, table: str, fmt: str):
+        if table not in EXPORT_TABLES:
+            raise ExportError(f"Unknown table: {table}. Available: {', '.join(sorted(EXPORT_TABLES))}")
+        if fmt not in EXPORT_FORMATS:
+            raise ExportError(f"Unknown format: {fmt}. Available: csv, parquet")
+        if fmt == "parquet" and pyarrow is None:
+            raise ExportError("Parquet export requires pyarrow")
+
+    def acquire(self) -> Optional[ExportSlot]:
+        """Слот выгрузки (None - уже выполняется максимум выгрузок)"""
+        if not self._slots.acquire(blocking=False):
+            return None
+        return ExportSlot(self._slots)
+
+    def query(self, table: str, start: Optional[datetime], end: Optional[datetime]):
+        time_column, columns = EXPORT_TABLES[table]
+        conditions, params = [], {}
+        if start:
+            conditions.append(f"{time_column} >= :start")
+            params['start'] = start
+        if end:
+            conditions.append(f"{time_column} < :end")
+            params['end'] = end
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        column_list = ", ".join(name for name, _ in columns)
+        return text(f"SELECT {column_list} FROM {table} {where} ORDER BY {time_column}"), params
+
+    def iter_batches(self, table: str, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> Iterator[List[tuple]]:
+        """Порции строк серверного курсора"""
+        query, params = self.query(table, start, end)
+        with self.engine.connect() as conn:
+            conn = conn.execution_options(
+                isolation_level="REPEATABLE READ",
+                postgresql_readonly=True,
+                yield_per=self.batch_size
+            )
+            result = conn.execute(query, params)
+            for rows in result.partitions():
+                yield rows
+
+    def stream(self, table: str, fmt: str, start: Optional[datetime] = None,
+               end: Optional[datetime] = None, batches: Optional[Iterator[List[tuple]]] = None,
+               slot: Optional[ExportSlot] = None) -> Iterator[bytes]:
+        """
+        Байты выгрузки; слот освобождается, когда поток закончен или закрыт.
+        Генератор, закрытый до первой порции, finally не выполняет - такой слот
+        освобождает вызывающий код (фоновая задача ответа)
+        """
+        try:
+            batches = batches if batches is not None else self.iter_batches(table, start, end)
+            columns = EXPORT_TABLES[table][1]
+            if fmt == "parquet":
+                yield from self.parquet_chunks(columns, batches)
+            else:
+                yield from self.csv_chunks(columns, batches)
+        finally:
+            if slot is not None:
+                slot.release()
+
+    def csv_chunks(self, columns: List[Tuple[str, str]], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([name for name, _ in columns])
+        for rows in batches:
+            writer.writerows(
+                [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                for row in rows
+            )
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def parquet_chunks(self, columns: List[Tuple[str, str]], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+        schema = _parquet_schema(columns)
+        sink = _ChunkSink()
+        writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+        try:
+            for rows in batches:
+                # Каждая порция - отдельная группа строк, записанные байты сразу уходят клиенту
+                arrays = [
+                    pyarrow.array([row[i] for row in rows], type=schema.field(i).type)
+                    for i in range(len(columns))
+                ]
+                writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+                chunk = sink.take()
+                if chunk:
+                    yield chunk
+        finally:
+            writer.close()
+        yield sink.take()
+
+
+analytics_exporter = AnalyticsExporter(
+    batch_size=settings.EXPORT_BATCH_SIZE,
+    max_concurrent=settings.EXPORT_MAX_CONCURRENT
+)
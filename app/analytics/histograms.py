@@ -0,0 +1,219 @@
+import math
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+# Логарифмические корзины (в стиле HDR): граница корзины i = MIN_VALUE * GROWTH ** i,
+# относительная ошибка перцентиля не больше ~5%. Корзина 0 - все, что меньше MIN_VALUE.
+MIN_VALUE = 0.001  # секунды
+GROWTH = 1.1
+BUCKET_COUNT = 200  # до ~ 1.9e5 секунд
+
+PERCENTILES = (50, 90, 99)
+
+DURATION_BUCKETS = (
+    (30, "<30s"),
+    (120, "30s-2m"),
+    (600, "2m-10m"),
+    (1800, "10m-30m"),
+)
+
+# Ключ гистограммы: (stage, model, language, duration_bucket)
+HistogramKey = Tuple[str, str, str, str]
+
+
+def duration_bucket(duration: Optional[float]) -> str:
+    """Группа длительности аудио для разбивки перцентилей"""
+    if not duration or duration <= 0:
+        return "unknown"
+    for limit, label in DURATION_BUCKETS:
+        if duration < limit:
+            return label
+    return ">30m"
+
+
+def bucket_index(value: float) -> int:
+    if value < MIN_VALUE:
+        return 0
+    index = int(math.log(value / MIN_VALUE) / math.log(GROWTH)) + 1
+    return min(index, BUCKET_COUNT - 1)
+
+
+def bucket_upper_bound(index: int) -> float:
+    return MIN_VALUE * GROWTH ** index
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами: сливается простым сложением счетчиков"""
+
+    def __init__(self, counts: Optional[Sequence[int]] = None, total: float = 0.0,
+                 minimum: Optional[float] = None, maximum: Optional[float] = None):
+        self.counts = list(counts) if counts else [0] * BUCKET_COUNT
+        self.counts += [0] * (BUCKET_COUNT - len(self.counts))
+        self.total = total
+        self.min = minimum
+        self.max = maximum
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def record(self, value: float):
+        value = max(0.0, value)
+        self.counts[bucket_index(value)] += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, percent: float) -> float:
+        """Значение перцентиля (верхняя граница корзины, ограниченная max)"""
+        count = self.count
+        if count == 0:
+            return 0.0
+
+        rank = max(1, math.ceil(count * percent / 100))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                value = bucket_upper_bound(index)
+                return min(value, self.max) if self.max is not None else value
+        return self.max or 0.0
+
+    def summary(self) -> Dict[str, float]:
+        count = self.count
+        result = {f"p{p}": round(self.percentile(p), 3) for p in PERCENTILES}
+        result['count'] = count
+        result['avg'] = round(self.total / count, 3) if count else 0.0
+        result['max'] = round(self.max or 0.0, 3)
+        return result
+
+
+class HistogramRegistry:
+    """
+    Гистограммы задержек процесса по этапам пайплайна.
+
+    Запись идет в память, раз в flush_interval накопленные гистограммы
+    сливаются в таблицу latency_histograms (часовые корзины), где их
+    складывают все процессы API и воркеров.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._histograms: Dict[HistogramKey, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def observe(self, stage: str, seconds: float, model: Optional[str] = None,
+                language: Optional[str] = None, duration: Optional[float] = None):
+        """Запись длительности этапа"""
+        key = (stage, model or settings.WHISPER_MODEL, language or "unknown", duration_bucket(duration))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def flush(self) -> int:
+        """Слияние накопленных гистограмм с таблицей latency_histograms"""
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+
+        if not histograms:
+            return 0
+
+        from app.analytics.repository import AnalyticsRepository
+        from app.database import get_db_session
+
+        rows = [{
+            'stage': stage,
+            'model': model,
+            'language': language,
+            'duration_bucket': duration_label,
+            'counts': histogram.counts,
+            'total': histogram.total,
+            'min_value': histogram.min,
+            'max_value': histogram.max
+        } for (stage, model, language, duration_label), histogram in histograms.items()]
+
+        try:
+            with get_db_session() as db:
+                AnalyticsRepository(db).merge_latency_histograms(rows)
+        except Exception:
+            # Не теряем данные: возвращаем в память до следующей попытки
+            with self._lock:
+                for key, histogram in histograms.items():
+                    current = self._histograms.get(key)
+                    self._histograms[key] = histogram.merge(current) if current else histogram
+            raise
+        return len(rows)
+
+    def start(self):
+        """Запуск периодической записи (повторный вызов ничего не делает)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="latency-histograms", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️ Error flushing latency histograms: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Error flushing latency histograms: {e}")
+
+
+def summarize(rows: List[Tuple[HistogramKey, LatencyHistogram]]) -> Dict[str, Dict]:
+    """
+    Перцентили по этапам: общие и в разбивке по модели, языку и длительности.
+    rows - гистограммы с ключами (stage, model, language, duration_bucket)
+    """
+    merged: Dict[str, Dict[str, Dict[str, LatencyHistogram]]] = {}
+
+    def add(stage: str, group: str, label: str, histogram: LatencyHistogram):
+        target = merged.setdefault(stage, {}).setdefault(group, {})
+        if label not in target:
+            target[label] = LatencyHistogram()
+        target[label].merge(histogram)
+
+    for (stage, model, language, duration_label), histogram in rows:
+        add(stage, 'overall', 'all', histogram)
+        add(stage, 'by_model', model, histogram)
+        add(stage, 'by_language', language, histogram)
+        add(stage, 'by_duration', duration_label, histogram)
+
+    result = {}
+    for stage, groups in merged.items():
+        result[stage] = {
+            'overall': groups['overall']['all'].summary(),
+            **{
+                group: {label: histogram.summary() for label, histogram in labels.items()}
+                for group, labels in groups.items() if group != 'overall'
+            }
+        }
+    return result
+
+
+latency_histograms = HistogramRegistry(flush_interval=settings.LATENCY_HISTOGRAM_FLUSH_SECONDS)
@@ -0,0 +1,98 @@
+"""
+Инкрементальный TF-IDF индекс по корпусу транскрипций.
+
+Индекс обновляется writer-ом аналитики в той же транзакции, что и
+статистика слов. Для каждого нового документа:
+  - document frequency его терминов увеличивается на 1 (term_document_frequency),
+    число документов языка - в corpus_documents;
+  - разреженный вектор документа - его строки word_statistics (слово, количество);
+  - по частотам на момент записи считаются и сохраняются топ ключевых слов
+    документа (document_keywords).
+
+Старые транскрипции повторно не обрабатываются: ключевые слова документа
+и трендовые термины корпуса читаются из индекса.
+"""
+import math
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from app.config import settings
+
+
+def idf(df: int, documents: int) -> float:
+    """Сглаженный IDF: термин из всех документов получает вес 1, а не 0"""
+    return math.log((1 + documents) / (1 + df)) + 1.0
+
+
+def tfidf_keywords(term_counts: Dict[str, int], frequencies: Dict[str, int],
+                   documents: int, limit: int) -> List[Tuple[str, float]]:
+    """Топ терминов документа по TF-IDF (TF - доля термина в документе)"""
+    total = sum(term_counts.values())
+    if not total:
+        return []
+    scores = [
+        (term, count / total * idf(frequencies.get(term, 1), documents))
+        for term, count in term_counts.items()
+    ]
+    scores.sort(key=lambda item: (-item[1], item[0]))
+    return scores[:limit]
+
+
+class KeywordIndex:
+    """Обновление TF-IDF индекса по статистике слов новых документов"""
+
+    def __init__(self, keywords_per_document: int = 10):
+        self.keywords_per_document = keywords_per_document
+
+    def ingest(self, repository, word_rows: List[Dict[str, Any]]) -> int:
+        """
+        Индексация документов по строкам aggregate_word_statistics
+        ({'file_uuid', 'word', 'language', 'count'}), возвращает число новых документов
+        """
+        documents: Dict[str, Tuple[str, Dict[str, int]]] = {}
+        for row in word_rows:
+            language, terms = documents.setdefault(row['file_uuid'], (row['language'], {}))
+            terms[row['word']] = terms.get(row['word'], 0) + row['count']
+
+        new_ids = repository.register_documents([{
+            'file_uuid': file_uuid,
+            'language': language,
+            'term_count': sum(terms.values())
+        } for file_uuid, (language, terms) in documents.items()])
+        if not new_ids:
+            return 0
+        documents = {file_uuid: documents[file_uuid] for file_uuid in new_ids}
+
+        term_deltas: Counter = Counter()
+        language_deltas: Counter = Counter()
+        for language, terms in documents.values():
+            language_deltas[language] += 1
+            for term in terms:
+                term_deltas[(term, language)] += 1
+
+        repository.increment_document_frequencies(
+            [{'term': term, 'language': language, 'delta': delta} for (term, language), delta in term_deltas.items()],
+            [{'language': language, 'delta': delta} for language, delta in language_deltas.items()]
+        )
+
+        # Частоты после приращения: документ учитывает сам себя, как в обычном TF-IDF
+        frequencies = repository.get_document_frequencies(list(term_deltas))
+        corpus = repository.get_corpus_sizes()
+
+        keyword_rows = []
+        for file_uuid, (language, terms) in documents.items():
+            doc_frequencies = {term: frequencies.get((term, language), 1) for term in terms}
+            keywords = tfidf_keywords(terms, doc_frequencies, corpus.get(language, 1), self.keywords_per_document)
+            keyword_rows.extend({
+                'file_uuid': file_uuid,
+                'term': term,
+                'language': language,
+                'score': score,
+                'position': position
+            } for position, (term, score) in enumerate(keywords))
+
+        repository.insert_document_keywords(keyword_rows)
+        return len(documents)
+
+
+keyword_index = KeywordIndex(keywords_per_document=settings.KEYWORDS_PER_DOCUMENT)
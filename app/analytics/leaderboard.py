@@ -0,0 +1,274 @@
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+TOP_KEY = "words:top"
+LANGUAGE_KEY = "words:top:lang:{language}"
+HOUR_KEY = "words:top:hour:{hour}"
+RECENT_KEY = "words:top:recent"
+PENDING_KEY = "words:top:pending"
+SNAPSHOT_KEY = "words:top:pending:snapshot"
+LOCK_KEY = "words:top:lock"
+SEEDED_KEY = "words:top:seeded"
+
+# Слова короче не попадают в статистику (см. collect_word_statistics)
+MIN_WORD_LENGTH = 3
+# Разделитель языка и слова в приростах, ожидающих снимка
+PENDING_SEPARATOR = "\x1f"
+RECENT_TTL_SECONDS = 60
+SCAN_PAGE = 1000
+
+
+def hour_key(moment: datetime) -> str:
+    return HOUR_KEY.format(hour=moment.strftime("%Y%m%d%H"))
+
+
+class WordLeaderboard:
+    """
+    Рейтинг слов в sorted set-ах Redis.
+
+    Счетчики каждой пачки статистики слов добавляются через ZINCRBY одним
+    pipeline: общий рейтинг, рейтинг по языку и часовая корзина (живет
+    window_hours + 1 час). Топ читается через ZREVRANGE, топ за последние
+    window_hours - объединением часовых корзин.
+
+    Postgres (word_totals) хранит только снимок: раз в snapshot_interval
+    прирост счетчиков с прошлого снимка прибавляется к таблице, а при пустом
+    Redis рейтинг восстанавливается из нее. Снимок и восстановление идут под
+    общей блокировкой LOCK_KEY, иначе восстановление прочитало бы уже
+    прибавленный прирост второй раз.
+    """
+
+    def __init__(self, redis, snapshot_interval: float, window_hours: int):
+        self.redis = redis
+        self.snapshot_interval = snapshot_interval
+        self.window_hours = window_hours
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def client(self):
+        if not settings.WORD_LEADERBOARD_ENABLED:
+            return None
+        return self.redis.redis_client
+
+    def record(self, rows: List[Dict[str, Any]], now: Optional[datetime] = None) -> bool:
+        """
+        Добавление счетчиков слов (строки aggregate_word_statistics).
+        False - Redis недоступен, счетчики нужно вести в Postgres
+        """
+        client = self.client
+        if client is None:
+            return False
+        if not rows:
+            return True
+
+        totals: Dict[tuple, int] = {}
+        for row in rows:
+            key = (row['word'], row['language'])
+            totals[key] = totals.get(key, 0) + int(row['count'])
+
+        bucket = hour_key(now or datetime.now(timezone.utc))
+        try:
+            pipe = client.pipeline(transaction=False)
+            for (word, language), count in totals.items():
+                pipe.zincrby(TOP_KEY, count, word)
+                pipe.zincrby(LANGUAGE_KEY.format(language=language), count, word)
+                pipe.zincrby(bucket, count, word)
+                pipe.zincrby(PENDING_KEY, count, f"{language}{PENDING_SEPARATOR}{word}")
+            pipe.expire(bucket, (self.window_hours + 1) * 3600)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error updating word leaderboard: {e}")
+            return False
+
+    def top(self, limit: int = 20, language: Optional[str] = None,
+            min_length: int = MIN_WORD_LENGTH) -> Optional[List[Dict[str, Any]]]:
+        """Топ слов (None - Redis недоступен)"""
+        key = LANGUAGE_KEY.format(language=language) if language else TOP_KEY
+        return self._read(key, limit, min_length)
+
+    def top_recent(self, limit: int = 20, min_length: int = MIN_WORD_LENGTH,
+                   now: Optional[datetime] = None) -> Optional[List[Dict[str, Any]]]:
+        """Топ слов за последние window_hours часов"""
+        client = self.client
+        if client is None:
+            return None
+
+        now = now or datetime.now(timezone.utc)
+        keys = [hour_key(now - timedelta(hours=offset)) for offset in range(self.window_hours)]
+        try:
+            # Объединение кэшируется на минуту, чтобы не пересчитывать на каждый запрос
+            if not client.exists(RECENT_KEY):
+                pipe = client.pipeline(transaction=False)
+                pipe.zunionstore(RECENT_KEY, keys)
+                pipe.expire(RECENT_KEY, RECENT_TTL_SECONDS)
+                pipe.execute()
+        except Exception as e:
+            logger.error(f"Error building recent word leaderboard: {e}")
+            return None
+        return self._read(RECENT_KEY, limit, min_length)
+
+    def _read(self, key: str, limit: int, min_length: int) -> Optional[List[Dict[str, Any]]]:
+        client = self.client
+        if client is None:
+            return None
+
+        try:
+            if min_length <= MIN_WORD_LENGTH:
+                entries = client.zrevrange(key, 0, limit - 1, withscores=True)
+            else:
+                # Фильтр по длине: листаем рейтинг страницами до нужного количества
+                entries, offset = [], 0
+                while len(entries) < limit:
+                    page = client.zrevrange(key, offset, offset + SCAN_PAGE - 1, withscores=True)
+                    if not page:
+                        break
+                    entries += [entry for entry in page if len(entry[0]) >= min_length]
+                    offset += SCAN_PAGE
+                entries = entries[:limit]
+        except Exception as e:
+            logger.error(f"Error reading word leaderboard: {e}")
+            return None
+
+        return [{'word': word, 'count': int(score)} for word, score in entries]
+
+    def _lock(self, client) -> bool:
+        return bool(client.set(LOCK_KEY, self.owner, nx=True, ex=self._lock_ttl()))
+
+    def _unlock(self, client):
+        # Чужую блокировку (наша истекла и ее взял другой процесс) не снимаем
+        if client.get(LOCK_KEY) == self.owner:
+            client.delete(LOCK_KEY)
+
+    def _lock_ttl(self) -> int:
+        return max(int(self.snapshot_interval), 30)
+
+    def snapshot(self) -> int:
+        """
+        Прибавление прироста счетчиков с прошлого снимка к word_totals.
+        Счетчики, записанные в word_totals напрямую (пока Redis был недоступен),
+        при этом сохраняются
+        """
+        client = self.client
+        if client is None or not self._lock(client):
+            return 0
+
+        try:
+            # Прирост забирается атомарно; недописанный прошлый снимок
+            # остается в SNAPSHOT_KEY и дописывается сейчас
+            pipe = client.pipeline(transaction=True)
+            pipe.zunionstore(SNAPSHOT_KEY, [SNAPSHOT_KEY, PENDING_KEY])
+            pipe.delete(PENDING_KEY)
+            pipe.execute()
+
+            entries = client.zrange(SNAPSHOT_KEY, 0, -1, withscores=True)
+            rows = []
+            for member, score in entries:
+                language, _, word = member.partition(PENDING_SEPARATOR)
+                if int(score) > 0:
+                    rows.append({'word': word, 'language': language, 'count': int(score)})
+
+            if rows:
+                from app.analytics.repository import AnalyticsRepository
+                from app.database import get_db_session
+
+                with get_db_session() as db:
+                    AnalyticsRepository(db).add_word_totals(rows)
+
+            client.delete(SNAPSHOT_KEY)
+            return len(rows)
+        finally:
+            self._unlock(client)
+
+    def seed(self) -> int:
+        """
+        Восстановление рейтинга из снимка word_totals, если Redis пуст.
+        Метка SEEDED_KEY ставится один раз, счетчики складываются с теми,
+        что успели появиться после старта (их прирост еще не в word_totals:
+        снимок ждет той же блокировки)
+        """
+        client = self.client
+        if client is None or client.exists(SEEDED_KEY):
+            return 0
+        if not self._lock(client):
+            # Идет снимок или восстановление в другом процессе - повторим в следующем цикле
+            return 0
+
+        from app.analytics.repository import AnalyticsRepository
+        from app.database import get_db_session
+
+        loaded = 0
+        try:
+            if not client.set(SEEDED_KEY, self.owner, nx=True):
+                return 0
+            try:
+                with get_db_session() as db:
+                    for rows in AnalyticsRepository(db).iter_word_totals(SCAN_PAGE * 10):
+                        pipe = client.pipeline(transaction=False)
+                        for row in rows:
+                            pipe.zincrby(TOP_KEY, row['count'], row['word'])
+                            pipe.zincrby(LANGUAGE_KEY.format(language=row['language']), row['count'], row['word'])
+                        # Большая таблица грузится дольше TTL блокировки - продлеваем на каждой странице
+                        pipe.expire(LOCK_KEY, self._lock_ttl())
+                        pipe.execute()
+                        loaded += len(rows)
+            except Exception:
+                client.delete(SEEDED_KEY)
+                raise
+        finally:
+            self._unlock(client)
+
+        if loaded:
+            print(f"🏆 Word leaderboard restored from snapshot: {loaded} words")
+        return loaded
+
+    def start(self):
+        """Восстановление из снимка и периодические снимки (повторный вызов ничего не делает)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="word-leaderboard", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.snapshot()
+        except Exception as e:
+            print(f"⚠️ Error saving word leaderboard snapshot: {e}")
+
+    def _run(self):
+        while True:
+            # Восстановление проверяется каждый цикл: блокировка могла быть занята
+            # при старте, а Redis - перезапущен без данных
+            try:
+                self.seed()
+            except Exception as e:
+                print(f"⚠️ Error restoring word leaderboard: {e}")
+            if self._stop.wait(self.snapshot_interval):
+                break
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"⚠️ Error saving word leaderboard snapshot: {e}")
+
+
+word_leaderboard = WordLeaderboard(
+    redis_client,
+    snapshot_interval=settings.WORD_LEADERBOARD_SNAPSHOT_SECONDS,
+    window_hours=settings.WORD_LEADERBOARD_WINDOW_HOURS
+)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Computed, Integer, BigInteger, String, Float, DateTime, Boolean, Text, ForeignKey, Index, LargeBinary
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime, timezone
 import uuid
@@ -9,6 +10,14 @@ Base = declarative_base()
 class TranscriptionRecord(Base):
     """Запись о транскрипции"""
     __tablename__ = "transcription_records"
+    __table_args__ = (
+        Index("idx_transcription_records_created_id", "created_at", "id"),
+        Index("idx_transcription_records_status_created", "status", "created_at", "id"),
+        Index("idx_transcription_records_language_created", "language", "created_at", "id"),
+        Index("idx_transcription_records_filename_prefix", "filename",
+              postgresql_ops={"filename": "text_pattern_ops"}),
+        Index("idx_transcription_records_search", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     filename = Column(String(255), nullable=False)
@@ -27,6 +36,16 @@ class TranscriptionRecord(Base):
     ip_address = Column(String(45), nullable=True)
     user_agent = Column(Text, nullable=True)
     transcription_id = Column(String(255), nullable=True)
+    model = Column(String(50), nullable=True)  # модель Whisper
+
+    # Полнотекстовый поиск: словарь выбирается по языку записи
+    transcript_text = Column(Text, nullable=True)
+    search_vector = Column(TSVECTOR, Computed(
+        "to_tsvector(CASE language WHEN 'ru' THEN 'russian'::regconfig "
+        "WHEN 'en' THEN 'english'::regconfig ELSE 'simple'::regconfig END, "
+        "COALESCE(transcript_text, ''))",
+        persisted=True
+    ))
 
     # Временные метки
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -54,6 +73,60 @@ class WordStatistic(Base):
     transcription = relationship("TranscriptionRecord", back_populates="word_statistics")
 
 
+class _TranscriptionRollup:
+    """Общие столбцы агрегатов транскрипций"""
+    bucket = Column(DateTime, primary_key=True)
+    status = Column(String(20), primary_key=True)
+    language = Column(String(10), primary_key=True, default="unknown")
+    model = Column(String(50), primary_key=True, default="unknown")
+    count = Column(BigInteger, nullable=False, default=0)
+    processing_time_sum = Column(Float, nullable=False, default=0)
+    processing_time_min = Column(Float)
+    processing_time_max = Column(Float)
+    text_length_sum = Column(BigInteger, nullable=False, default=0)
+    text_length_max = Column(Integer)
+    duration_sum = Column(Float, nullable=False, default=0)
+
+
+class TranscriptionRollupHourly(_TranscriptionRollup, Base):
+    """Агрегаты транскрипций по часам"""
+    __tablename__ = "transcription_rollups_hourly"
+
+
+class TranscriptionRollupDaily(_TranscriptionRollup, Base):
+    """Агрегаты транскрипций по дням"""
+    __tablename__ = "transcription_rollups_daily"
+
+
+class LatencyHistogramRecord(Base):
+    """Часовые гистограммы задержек этапов пайплайна"""
+    __tablename__ = "latency_histograms"
+
+    bucket = Column(DateTime, primary_key=True)
+    stage = Column(String(50), primary_key=True)
+    model = Column(String(50), primary_key=True)
+    language = Column(String(10), primary_key=True)
+    duration_bucket = Column(String(20), primary_key=True)
+    counts = Column(ARRAY(BigInteger), nullable=False)
+    total = Column(Float, nullable=False, default=0)
+    min_value = Column(Float)
+    max_value = Column(Float)
+
+
+class WordTotal(Base):
+    """Накопительные счетчики слов"""
+    __tablename__ = "word_totals"
+
+    word = Column(String(100), primary_key=True)
+    language = Column(String(10), primary_key=True, default="unknown")
+    count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("idx_word_totals_count", count.desc()),
+    )
+
+
 class PerformanceMetric(Base):
     """Метрики производительности"""
     __tablename__ = "performance_metrics"
@@ -70,12 +143,106 @@ class PerformanceMetric(Base):
 
 
 class SystemMetric(Base):
-    """Системные метрики"""
+    """Системные метрики (минутные значения, секции по дням)"""
     __tablename__ = "system_metrics"
+    __table_args__ = (
+        Index("idx_system_metrics_type_timestamp", "metric_type", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"}
+    )
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    timestamp = Column(DateTime, primary_key=True, default=lambda: datetime.now(timezone.utc))
     metric_type = Column(String(50), nullable=False)  # cpu_usage, memory_usage, active_requests
     metric_value = Column(Float, nullable=False)
     service = Column(String(50), default="transcription")
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class SystemMetricHourly(Base):
+    """Часовые агрегаты системных метрик (секции по месяцам)"""
+    __tablename__ = "system_metrics_hourly"
+    __table_args__ = {"postgresql_partition_by": "RANGE (hour)"}
+
+    hour = Column(DateTime, primary_key=True)
+    metric_type = Column(String(50), primary_key=True)
+    service = Column(String(50), primary_key=True, default="transcription")
+    avg_value = Column(Float, nullable=False)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    samples = Column(Integer, nullable=False)
+
+
+class DeliveryOutbox(Base):
+    """Исходящие доставки (outbox)"""
+    __tablename__ = "delivery_outbox"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    kind = Column(String(20), nullable=False, default="external_api")  # external_api, webhook
+    target_url = Column(Text, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, delivered, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    last_status_code = Column(Integer, nullable=True)
+    last_error = Column(Text, nullable=True)
+    latency_ms = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    delivered_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("idx_delivery_outbox_pending", "next_attempt_at", postgresql_where=(status == "pending")),
+    )
+
+
+class TranscriptBlob(Base):
+    """Текст транскрипции в хранилище Postgres (STORAGE_BACKEND=postgres)"""
+    __tablename__ = "transcript_blobs"
+
+    file_id = Column(String(255), primary_key=True)
+    encoding = Column(String(10), nullable=False, default="identity")  # zstd, gzip, identity
+    size = Column(Integer, nullable=False)  # сжатых байт
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class IndexedDocument(Base):
+    """Документ в TF-IDF индексе"""
+    __tablename__ = "indexed_documents"
+
+    file_uuid = Column(String(255), primary_key=True)
+    language = Column(String(10), nullable=False)
+    term_count = Column(Integer, nullable=False, default=0)
+    indexed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class CorpusDocuments(Base):
+    """Число документов в индексе по языкам"""
+    __tablename__ = "corpus_documents"
+
+    language = Column(String(10), primary_key=True)
+    documents = Column(BigInteger, nullable=False, default=0)
+
+
+class TermDocumentFrequency(Base):
+    """Document frequency термина"""
+    __tablename__ = "term_document_frequency"
+
+    term = Column(String(100), primary_key=True)
+    language = Column(String(10), primary_key=True)
+    df = Column(BigInteger, nullable=False, default=0)
+
+
+class DocumentKeyword(Base):
+    """Ключевое слово документа (TF-IDF на момент индексации)"""
+    __tablename__ = "document_keywords"
+
+    file_uuid = Column(String(255), primary_key=True)
+    term = Column(String(100), primary_key=True)
+    language = Column(String(10), nullable=False)
+    score = Column(Float, nullable=False)
+    position = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("idx_document_keywords_created", "created_at"),
+    )
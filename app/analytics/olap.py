@@ -0,0 +1,319 @@
+"""
+Колоночная аналитика: снимки таблиц в Parquet и запросы к ним через DuckDB.
+
+Тяжелые аналитические запросы (разрезы за месяцы) не должны сканировать
+Postgres, который обслуживает запись. Периодический снимок выгружает
+transcription_records, performance_metrics и word_statistics в Parquet,
+секционированный по дням:
+    <OLAP_DIR>/<таблица>/day=YYYY-MM-DD/data.parquet
+
+Завершенные дни выгружаются один раз; текущий день перезаписывается каждым
+проходом, а у transcription_records - еще и последние OLAP_MUTABLE_DAYS дней
+(статус и время завершения записи меняются после создания).
+
+Отчеты (OlapQueryService) выполняет встроенный DuckDB: векторизованное
+сканирование только нужных столбцов и секций Parquet, без обращения к Postgres.
+
+Запуск снимков отдельным процессом:
+    python -m app.analytics.olap            # периодически
+    python -m app.analytics.olap --once     # один проход
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.analytics.export import EXPORT_TABLES, AnalyticsExporter, analytics_exporter
+from app.config import settings
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+SNAPSHOT_TABLES = ("transcription_records", "performance_metrics", "word_statistics")
+
+# Таблицы, строки которых меняются после вставки
+MUTABLE_TABLES = ("transcription_records",)
+
+STATE_FILE = "_state.json"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ParquetSnapshotter:
+    """Периодические снимки таблиц в Parquet, секционированный по дням"""
+
+    def __init__(self, root: Path, interval: float, mutable_days: int = 2, backfill_days: int = 365,
+                 exporter: AnalyticsExporter = analytics_exporter):
+        self.root = Path(root)
+        self.interval = interval
+        self.mutable_days = mutable_days
+        self.backfill_days = backfill_days
+        self.exporter = exporter
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    #  Состояние: первый день, который еще нужно выгрузить
+
+    def load_state(self) -> Dict[str, str]:
+        try:
+            return json.loads((self.root / STATE_FILE).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_state(self, state: Dict[str, str]):
+        self._atomic_write(self.root / STATE_FILE, [json.dumps(state, indent=2).encode("utf-8")])
+
+    def partition_path(self, table: str, day: date) -> Path:
+        return self.root / table / f"day={day.isoformat()}" / "data.parquet"
+
+    def days_to_export(self, table: str, state: Dict[str, str], today: date,
+                       oldest: Optional[datetime]) -> List[date]:
+        """Дни для выгрузки: от первого незавершенного дня до сегодняшнего"""
+        if table in state:
+            start = date.fromisoformat(state[table])
+        elif oldest is not None:
+            start = max(oldest.date(), today - timedelta(days=self.backfill_days))
+        else:
+            start = today
+        if table in MUTABLE_TABLES:
+            start = min(start, today - timedelta(days=self.mutable_days))
+        return [start + timedelta(days=i) for i in range((today - start).days + 1)]
+
+    def _oldest(self, table: str) -> Optional[datetime]:
+        time_column = EXPORT_TABLES[table][0]
+        with self.exporter.engine.connect() as conn:
+            return conn.execute(text(f"SELECT MIN({time_column}) FROM {table}")).scalar()
+
+    def _atomic_write(self, path: Path, chunks):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Читатели (DuckDB) видят либо старый файл секции, либо новый целиком
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def export_day(self, table: str, day: date, batches: Optional[Callable] = None) -> Path:
+        """Выгрузка одного дня таблицы в секцию Parquet (группа строк на порцию курсора)"""
+        start = datetime.combine(day, datetime.min.time())
+        rows = batches(table, start, start + timedelta(days=1)) if batches \
+            else self.exporter.iter_batches(table, start, start + timedelta(days=1))
+        path = self.partition_path(table, day)
+        self._atomic_write(path, self.exporter.parquet_chunks(EXPORT_TABLES[table][1], rows))
+        return path
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Один проход: выгрузка новых и изменяемых дней всех таблиц"""
+        now = now or _utcnow()
+        today = now.date()
+        state = self.load_state()
+        exported = {}
+
+        for table in SNAPSHOT_TABLES:
+            oldest = None if table in state else self._oldest(table)
+            days = self.days_to_export(table, state, today, oldest)
+            for day in days:
+                self.export_day(table, day)
+            # Прошедшие дни больше не меняются, следующий проход начнет с сегодняшнего
+            state[table] = today.isoformat()
+            self.save_state(state)
+            exported[table] = len(days)
+
+        print(f"🧊 [OLAP] Snapshot days exported: {exported}")
+        return exported
+
+    def start(self):
+        """Запуск периодических снимков (повторный вызов ничего не делает)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="olap-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"⚠️ [OLAP] Snapshot error: {e}")
+            self._stop.wait(self.interval)
+
+
+# Отчеты: SQL DuckDB над представлениями таблиц снимка, параметры - $days и $limit.
+# Условие по столбцу секции day обязательно: по нему DuckDB отбрасывает файлы
+# лишних дней, не открывая их; условие по created_at само файлы не отсекает
+REPORTS: Dict[str, str] = {
+    # Язык x длительность аудио x задержка
+    "language_duration_latency": """
+        SELECT
+            COALESCE(language, 'unknown') AS language,
+            CASE
+                WHEN duration < 30 THEN '<30s'
+                WHEN duration < 120 THEN '30s-2m'
+                WHEN duration < 600 THEN '2-10m'
+                WHEN duration < 1800 THEN '10-30m'
+                ELSE '30m+'
+            END AS duration_bucket,
+            COUNT(*) AS transcriptions,
+            AVG(processing_time) AS avg_processing_time,
+            quantile_cont(processing_time, 0.5) AS p50_processing_time,
+            quantile_cont(processing_time, 0.95) AS p95_processing_time,
+            AVG(processing_time / NULLIF(duration, 0)) AS avg_realtime_factor
+        FROM transcription_records
+        WHERE day >= current_date - to_days(CAST($days AS INTEGER))
+          AND status = 'completed' AND created_at >= current_date - to_days(CAST($days AS INTEGER))
+        GROUP BY ALL
+        ORDER BY language, MIN(duration)
+    """,
+    # Динамика по дням
+    "daily": """
+        SELECT
+            CAST(created_at AS DATE) AS day,
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+            COUNT(*) FILTER (WHERE status = 'failed') AS failed,
+            SUM(duration) FILTER (WHERE status = 'completed') AS audio_seconds,
+            AVG(processing_time) FILTER (WHERE status = 'completed') AS avg_processing_time
+        FROM transcription_records
+        WHERE day >= current_date - to_days(CAST($days AS INTEGER))
+          AND created_at >= current_date - to_days(CAST($days AS INTEGER))
+        GROUP BY ALL
+        ORDER BY day
+    """,
+    # Перцентили метрик производительности
+    "performance": """
+        SELECT
+            metric_name,
+            COUNT(*) AS samples,
+            AVG(metric_value) AS avg_value,
+            quantile_cont(metric_value, 0.5) AS p50,
+            quantile_cont(metric_value, 0.95) AS p95,
+            quantile_cont(metric_value, 0.99) AS p99,
+            MAX(metric_value) AS max_value
+        FROM performance_metrics
+        WHERE day >= current_date - to_days(CAST($days AS INTEGER))
+          AND created_at >= current_date - to_days(CAST($days AS INTEGER))
+        GROUP BY ALL
+        ORDER BY samples DESC
+    """,
+    # Самые частые слова по языкам
+    "top_words": """
+        SELECT word, language, SUM(count) AS count, COUNT(DISTINCT file_uuid) AS documents
+        FROM word_statistics
+        WHERE day >= current_date - to_days(CAST($days AS INTEGER))
+          AND created_at >= current_date - to_days(CAST($days AS INTEGER))
+        GROUP BY ALL
+        ORDER BY count DESC
+        LIMIT $limit
+    """,
+}
+
+
+class OlapUnavailable(RuntimeError):
+    """DuckDB не установлен или снимков еще нет"""
+
+
+class OlapQueryService:
+    """
+    Отчеты над снимками Parquet во встроенном DuckDB.
+    Соединение одно на процесс, каждый запрос выполняется в своем курсоре
+    """
+
+    def __init__(self, root: Path, threads: int = 2, memory_limit: str = "1GB"):
+        self.root = Path(root)
+        self.threads = threads
+        self.memory_limit = memory_limit
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if duckdb is None:
+            raise OlapUnavailable("duckdb is not installed")
+        with self._lock:
+            if self._conn is None:
+                conn = duckdb.connect(database=":memory:")
+                conn.execute(f"SET threads = {int(self.threads)}")
+                conn.execute(f"SET memory_limit = '{self.memory_limit}'")
+                self._conn = conn
+            return self._conn
+
+    def _register_views(self, cursor, tables):
+        for table in tables:
+            files = self.root / table
+            if not any(files.glob("day=*/data.parquet")):
+                raise OlapUnavailable(f"No snapshot for {table} yet")
+            # hive_partitioning: столбец day берется из пути, условие по нему отсекает файлы секций
+            cursor.execute(
+                f"CREATE OR REPLACE TEMP VIEW {table} AS "
+                f"SELECT * FROM read_parquet('{(files / 'day=*' / 'data.parquet').as_posix()}', hive_partitioning = true)"
+            )
+
+    def run(self, report: str, days: int = 30, limit: int = 100) -> List[Dict[str, Any]]:
+        """Выполнение отчета, KeyError - неизвестный отчет"""
+        query = REPORTS[report]
+        cursor = self._connection().cursor()
+        try:
+            self._register_views(cursor, [table for table in SNAPSHOT_TABLES if table in query])
+            params = {'days': days}
+            if "$limit" in query:
+                params['limit'] = limit
+            result = cursor.execute(query, params)
+            columns = [column[0] for column in result.description]
+            return [dict(zip(columns, row)) for row in result.fetchall()]
+        finally:
+            cursor.close()
+
+
+parquet_snapshotter = ParquetSnapshotter(
+    root=settings.olap_dir_path,
+    interval=settings.OLAP_SNAPSHOT_SECONDS,
+    mutable_days=settings.OLAP_MUTABLE_DAYS,
+    backfill_days=settings.OLAP_BACKFILL_DAYS
+)
+
+olap_query_service = OlapQueryService(
+    root=settings.olap_dir_path,
+    threads=settings.OLAP_DUCKDB_THREADS,
+    memory_limit=settings.OLAP_DUCKDB_MEMORY_LIMIT
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parquet snapshots for the OLAP query service")
+    parser.add_argument("--once", action="store_true", help="Run a single snapshot pass and exit")
+    args = parser.parse_args()
+
+    if args.once:
+        parquet_snapshotter.run_once()
+        return
+
+    print("🧊 [OLAP] Running snapshots standalone, press Ctrl+C to stop")
+    try:
+        parquet_snapshotter._run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
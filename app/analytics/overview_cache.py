@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from app.config import settings
+from app.metrics import record_cache
+from app.redis_client import async_redis_client, redis_client
+from app.storage import content_etag
+
+logger = logging.getLogger(__name__)
+
+OVERVIEW_KEY = "analytics:overview"
+OVERVIEW_LOCK_KEY = "analytics:overview:lock"
+
+
+class OverviewSnapshot:
+    """Готовый к отдаче обзор аналитики"""
+
+    def __init__(self, body: bytes, etag: str, generated_at: float):
+        self.body = body
+        self.etag = etag
+        self.generated_at = generated_at
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.generated_at
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'body': self.body.decode("utf-8"),
+            'etag': self.etag,
+            'generated_at': self.generated_at
+        })
+
+    @classmethod
+    def from_json(cls, value: str) -> "OverviewSnapshot":
+        data = json.loads(value)
+        return cls(data['body'].encode("utf-8"), data['etag'], data['generated_at'])
+
+
+class OverviewCache:
+    """
+    Кэш /analytics/overview, который обновляется в фоне.
+
+    Обзор пересчитывается раз в refresh_interval секунд и хранится в Redis
+    (общий для всех процессов API) и в памяти процесса. Пересчет выполняет
+    только процесс, захвативший блокировку в Redis, остальные читают готовый
+    результат. Без Redis каждый процесс считает обзор сам.
+    """
+
+    def __init__(self, redis, refresh_interval: float, stale_seconds: int, async_redis=None):
+        self.redis = redis
+        self.async_redis = async_redis
+        self.refresh_interval = refresh_interval
+        self.stale_seconds = stale_seconds
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        self._snapshot: Optional[OverviewSnapshot] = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def cache_control(self) -> str:
+        return f"public, max-age={int(self.refresh_interval)}, stale-while-revalidate={self.stale_seconds}"
+
+    def build(self) -> OverviewSnapshot:
+        """Пересчет обзора по БД"""
+        from app.analytics.service import AnalyticsService
+        from app.database import get_db_session
+
+        generated_at = time.time()
+        with get_db_session() as db:
+            overview = AnalyticsService(db).get_system_overview()
+
+        body = json.dumps(jsonable_encoder({
+            "status": "success",
+            "data": overview,
+            "timestamp": datetime.fromtimestamp(generated_at, timezone.utc).isoformat()
+        }), ensure_ascii=False).encode("utf-8")
+        return OverviewSnapshot(body, content_etag(body), generated_at)
+
+    def refresh(self, force: bool = True) -> OverviewSnapshot:
+        """Пересчет и публикация обзора"""
+        with self._refresh_lock:
+            # Пока ждали блокировку, обзор мог посчитать другой запрос
+            if not force and self._snapshot:
+                return self._snapshot
+            snapshot = self.build()
+            self._snapshot = snapshot
+            if self.redis.redis_client:
+                self.redis.set(
+                    OVERVIEW_KEY, snapshot.to_json(),
+                    ttl=int(self.refresh_interval) + self.stale_seconds
+                )
+            return snapshot
+
+    def get(self) -> Optional[OverviewSnapshot]:
+        """Текущий обзор без обращения к БД (None - еще не посчитан)"""
+        snapshot = self._snapshot
+        if snapshot and snapshot.age < self.refresh_interval:
+            return snapshot
+
+        # Локальная копия устарела - возможно, другой процесс уже пересчитал
+        return self._prefer_shared(snapshot, self._load_shared())
+
+    async def get_async(self) -> Optional[OverviewSnapshot]:
+        """То же, что get, но общий обзор читается асинхронным клиентом Redis"""
+        snapshot = self._snapshot
+        if snapshot and snapshot.age < self.refresh_interval:
+            return snapshot
+        if self.async_redis is None:
+            return await asyncio.to_thread(self.get)
+        return self._prefer_shared(snapshot, self._parse(await self.async_redis.get(OVERVIEW_KEY)))
+
+    async def get_or_build(self) -> OverviewSnapshot:
+        """Обзор из кэша, при холодном старте - синхронный пересчет в потоке"""
+        snapshot = await self.get_async()
+        record_cache("analytics_overview", snapshot is not None)
+        if snapshot is None:
+            snapshot = await asyncio.to_thread(self.refresh, False)
+        return snapshot
+
+    def start(self):
+        """Запуск фонового обновления (повторный вызов ничего не делает)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="overview-refresher", daemon=True)
+        self._thread.start()
+        print(f"📈 Analytics overview refresher started (every {self.refresh_interval}s)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _prefer_shared(self, snapshot: Optional[OverviewSnapshot],
+                       shared: Optional[OverviewSnapshot]) -> Optional[OverviewSnapshot]:
+        if shared and (not snapshot or shared.generated_at > snapshot.generated_at):
+            self._snapshot = snapshot = shared
+        return snapshot
+
+    def _load_shared(self) -> Optional[OverviewSnapshot]:
+        if not self.redis.redis_client:
+            return None
+        return self._parse(self.redis.get(OVERVIEW_KEY))
+
+    @staticmethod
+    def _parse(value: Optional[str]) -> Optional[OverviewSnapshot]:
+        try:
+            return OverviewSnapshot.from_json(value) if value else None
+        except (ValueError, KeyError) as e:
+            logger.error(f"Invalid cached overview: {e}")
+            return None
+
+    def _acquire_refresh(self) -> bool:
+        """Один пересчет на интервал для всех процессов"""
+        if not self.redis.redis_client:
+            return True
+        try:
+            return bool(self.redis.redis_client.set(
+                OVERVIEW_LOCK_KEY, self.owner, nx=True, ex=max(1, int(self.refresh_interval))
+            ))
+        except Exception as e:
+            print(f"⚠️ Overview lock error: {e}")
+            return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._acquire_refresh():
+                    started = time.monotonic()
+                    self.refresh()
+                    print(f"📈 Analytics overview refreshed in {time.monotonic() - started:.2f}s")
+                else:
+                    self.get()
+            except Exception as e:
+                print(f"⚠️ Error refreshing analytics overview: {e}")
+            self._stop.wait(self.refresh_interval)
+
+
+overview_cache = OverviewCache(
+    redis_client,
+    refresh_interval=settings.OVERVIEW_REFRESH_SECONDS,
+    stale_seconds=settings.OVERVIEW_STALE_SECONDS,
+    async_redis=async_redis_client
+)
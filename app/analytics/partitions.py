@@ -0,0 +1,274 @@
+"""
+Обслуживание секционированных системных метрик.
+
+system_metrics хранит минутные значения в секциях по дням, system_metrics_hourly -
+часовые агрегаты в секциях по месяцам. Фоновое обслуживание (или ручной запуск):
+    python -m app.analytics.partitions            # один проход обслуживания
+    python -m app.analytics.partitions --migrate  # перевод старой несекционированной таблицы
+
+За проход:
+  - создаются секции на SYSTEM_METRICS_PARTITIONS_AHEAD дней вперед (строки,
+    попавшие в system_metrics_default, переносятся в секцию своего дня);
+  - минутные значения сворачиваются в часовые агрегаты;
+  - секции минутных значений старше SYSTEM_METRICS_RAW_RETENTION_HOURS и уже
+    свернутые удаляются целиком (DROP TABLE вместо DELETE);
+  - секции часовых агрегатов старше SYSTEM_METRICS_RETENTION_DAYS удаляются.
+"""
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.config import settings
+
+RAW_TABLE = "system_metrics"
+HOURLY_TABLE = "system_metrics_hourly"
+LEGACY_TABLE = "system_metrics_legacy"
+
+# Ключ pg_advisory_xact_lock: обслуживание выполняет один процесс за раз
+MAINTENANCE_LOCK_KEY = 410041
+
+# Таблица -> единица секционирования
+PARTITION_UNITS = {RAW_TABLE: "day", HOURLY_TABLE: "month"}
+
+# Таблица -> ключ секционирования
+PARTITION_COLUMNS = {RAW_TABLE: "timestamp", HOURLY_TABLE: "hour"}
+
+# Секция по умолчанию минутных значений: запись сборщика не падает, даже если
+# обслуживание давно не создавало секций. Ее строки переносятся в секцию дня
+# при создании, см. AnalyticsRepository.create_partition
+DEFAULT_PARTITION = f"{RAW_TABLE}_default"
+
+CREATE_TABLES_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS system_metrics (
+        id BIGSERIAL,
+        timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        metric_type VARCHAR(50) NOT NULL,
+        metric_value FLOAT NOT NULL,
+        service VARCHAR(50) DEFAULT 'transcription',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp)
+    """,
+    f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF system_metrics DEFAULT",
+    """
+    CREATE TABLE IF NOT EXISTS system_metrics_hourly (
+        hour TIMESTAMP NOT NULL,
+        metric_type VARCHAR(50) NOT NULL,
+        service VARCHAR(50) NOT NULL DEFAULT 'transcription',
+        avg_value DOUBLE PRECISION NOT NULL,
+        min_value DOUBLE PRECISION NOT NULL,
+        max_value DOUBLE PRECISION NOT NULL,
+        samples INTEGER NOT NULL,
+        PRIMARY KEY (hour, metric_type, service)
+    ) PARTITION BY RANGE (hour)
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_system_metrics_type_timestamp ON system_metrics(metric_type, timestamp)"
+)
+
+
+def _utcnow() -> datetime:
+    # Столбцы без часового пояса заполняются NOW() сервера в UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def period_start(moment: datetime, unit: str) -> datetime:
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    return day.replace(day=1) if unit == "month" else day
+
+
+def next_period(start: datetime, unit: str) -> datetime:
+    if unit == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def partition_name(table: str, start: datetime) -> str:
+    suffix = start.strftime("%Y%m") if PARTITION_UNITS[table] == "month" else start.strftime("%Y%m%d")
+    return f"{table}_p{suffix}"
+
+
+def partition_range(table: str, name: str) -> Optional[Tuple[datetime, datetime]]:
+    """Границы секции по имени (None - секция создана не нами)"""
+    prefix = f"{table}_p"
+    unit = PARTITION_UNITS[table]
+    if not name.startswith(prefix):
+        return None
+    try:
+        start = datetime.strptime(name[len(prefix):], "%Y%m" if unit == "month" else "%Y%m%d")
+    except ValueError:
+        return None
+    return start, next_period(start, unit)
+
+
+class SystemMetricsMaintenance:
+    """Секции, свертка и хранение системных метрик"""
+
+    def __init__(self, interval: float, raw_retention_hours: int, retention_days: int, days_ahead: int):
+        self.interval = interval
+        self.raw_retention_hours = raw_retention_hours
+        self.retention_days = retention_days
+        self.days_ahead = days_ahead
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def ensure_partitions(self, repository, table: str, since: datetime, until: datetime) -> int:
+        """Секции таблицы, покрывающие [since, until]"""
+        unit = PARTITION_UNITS[table]
+        existing = set(repository.list_partitions(table))
+        created = 0
+        start = period_start(since, unit)
+        while start <= until:
+            end = next_period(start, unit)
+            name = partition_name(table, start)
+            if name not in existing:
+                repository.create_partition(table, name, start, end, column=PARTITION_COLUMNS[table])
+                created += 1
+            start = end
+        return created
+
+    def downsample(self, repository, now: datetime, source: str = RAW_TABLE) -> Optional[datetime]:
+        """Свертка завершенных часов, возвращает границу свернутых данных"""
+        until = now.replace(minute=0, second=0, microsecond=0)
+        since = repository.get_downsample_watermark() if source == RAW_TABLE else None
+        if since is None:
+            since = repository.get_oldest_system_metric(source)
+            if since is None:
+                return until
+            since = since.replace(minute=0, second=0, microsecond=0)
+        if since < until:
+            repository.downsample_system_metrics(since, until, source=source)
+        return until
+
+    def drop_expired(self, repository, now: datetime, rolled_until: Optional[datetime]) -> int:
+        """Удаление секций старше срока хранения (минутные - только уже свернутые)"""
+        raw_cutoff = now - timedelta(hours=self.raw_retention_hours)
+        if rolled_until is not None:
+            raw_cutoff = min(raw_cutoff, rolled_until)
+        cutoffs = {
+            RAW_TABLE: raw_cutoff,
+            HOURLY_TABLE: now - timedelta(days=self.retention_days)
+        }
+
+        dropped = 0
+        for table, cutoff in cutoffs.items():
+            for name in repository.list_partitions(table):
+                bounds = partition_range(table, name)
+                if bounds and bounds[1] <= cutoff:
+                    repository.drop_partition(name)
+                    dropped += 1
+        return dropped
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Один проход обслуживания"""
+        from app.analytics.repository import AnalyticsRepository
+        from app.database import get_db_session
+
+        now = now or _utcnow()
+        with get_db_session() as db:
+            repository = AnalyticsRepository(db)
+            if not repository.try_advisory_lock(MAINTENANCE_LOCK_KEY):
+                return {}
+
+            until = now + timedelta(days=self.days_ahead)
+            # Минутные секции - с начала срока хранения: строки, записанные в default,
+            # пока обслуживание не работало, переезжают в свои дни и удаляются по сроку
+            since = {RAW_TABLE: now - timedelta(hours=self.raw_retention_hours), HOURLY_TABLE: now}
+            created = sum(self.ensure_partitions(repository, table, since[table], until) for table in PARTITION_UNITS)
+            rolled_until = self.downsample(repository, now)
+            dropped = self.drop_expired(repository, now, rolled_until)
+
+        if created or dropped:
+            print(f"🗂️ [SystemMetrics] Partitions created: {created}, dropped: {dropped}")
+        return {'created': created, 'dropped': dropped}
+
+    def migrate_legacy(self, now: Optional[datetime] = None) -> bool:
+        """
+        Перевод несекционированной system_metrics: таблица переименовывается в
+        system_metrics_legacy, последние минутные значения копируются в новую
+        таблицу, вся история сворачивается в часовые агрегаты
+        """
+        from app.analytics.repository import AnalyticsRepository
+        from app.database import get_db_session
+
+        now = now or _utcnow()
+        with get_db_session() as db:
+            kind = db.execute(
+                text("SELECT relkind FROM pg_class WHERE relname = :table AND relkind IN ('r', 'p')"),
+                {'table': RAW_TABLE}
+            ).scalar()
+            if kind != 'r':
+                return False
+
+            db.execute(text(f"ALTER TABLE {RAW_TABLE} RENAME TO {LEGACY_TABLE}"))
+            db.execute(text(f"ALTER SEQUENCE IF EXISTS {RAW_TABLE}_id_seq RENAME TO {LEGACY_TABLE}_id_seq"))
+            db.execute(text(f"ALTER INDEX IF EXISTS {RAW_TABLE}_pkey RENAME TO {LEGACY_TABLE}_pkey"))
+            db.execute(text("DROP INDEX IF EXISTS idx_system_metrics_timestamp, idx_system_metrics_metric_type"))
+            for statement in CREATE_TABLES_SQL:
+                db.execute(text(statement))
+
+            repository = AnalyticsRepository(db)
+            oldest = repository.get_oldest_system_metric(LEGACY_TABLE) or now
+            raw_since = now - timedelta(hours=self.raw_retention_hours)
+            until = now + timedelta(days=self.days_ahead)
+            self.ensure_partitions(repository, RAW_TABLE, raw_since, until)
+            self.ensure_partitions(repository, HOURLY_TABLE, min(oldest, raw_since), until)
+
+            db.execute(text(f"""
+                INSERT INTO {RAW_TABLE} (timestamp, metric_type, metric_value, service, created_at)
+                SELECT timestamp, metric_type, metric_value, service, created_at
+                FROM {LEGACY_TABLE}
+                WHERE timestamp >= :since
+            """), {'since': raw_since})
+            self.downsample(repository, now, source=LEGACY_TABLE)
+
+        print(f"✅ [SystemMetrics] Migrated to partitions, old data kept in {LEGACY_TABLE} "
+              f"(drop it with DROP TABLE {LEGACY_TABLE})")
+        return True
+
+    def start(self):
+        """Запуск периодического обслуживания (повторный вызов ничего не делает)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="system-metrics-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"⚠️ [SystemMetrics] Maintenance error: {e}")
+            self._stop.wait(self.interval)
+
+
+system_metrics_maintenance = SystemMetricsMaintenance(
+    interval=settings.SYSTEM_METRICS_MAINTENANCE_SECONDS,
+    raw_retention_hours=settings.SYSTEM_METRICS_RAW_RETENTION_HOURS,
+    retention_days=settings.SYSTEM_METRICS_RETENTION_DAYS,
+    days_ahead=settings.SYSTEM_METRICS_PARTITIONS_AHEAD
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="System metrics partition maintenance")
+    parser.add_argument("--migrate", action="store_true", help="Convert a legacy unpartitioned system_metrics table")
+    args = parser.parse_args()
+
+    if args.migrate and not system_metrics_maintenance.migrate_legacy():
+        print("🗂️ [SystemMetrics] Table is already partitioned")
+    print(f"✅ [SystemMetrics] Maintenance: {system_metrics_maintenance.run_once()}")
+
+
+if __name__ == "__main__":
+    main()
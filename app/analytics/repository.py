@@ -1,11 +1,160 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List, Dict, Any
-from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
+import base64
+import json
 import logging
 
+from app.tracing import traced
+
 logger = logging.getLogger(__name__)
 
+# word_statistics.word / word_totals.word - VARCHAR(100)
+MAX_WORD_LENGTH = 100
+
+# Словарь полнотекстового поиска по языку записи (как в search_vector, init.sql)
+SEARCH_CONFIG_SQL = (
+    "CASE {column} WHEN 'ru' THEN 'russian'::regconfig "
+    "WHEN 'en' THEN 'english'::regconfig ELSE 'simple'::regconfig END"
+)
+
+# Запрос поиска строится во всех словарях сразу: один tsquery-литерал
+# позволяет использовать GIN-индекс, а слова стеммятся так же, как в тексте
+SEARCH_QUERY_SQL = (
+    "(websearch_to_tsquery('russian', :q) || websearch_to_tsquery('english', :q)"
+    " || websearch_to_tsquery('simple', :q))"
+)
+
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=25, MinWords=10, MaxFragments=2, FragmentDelimiter=\" ... \""
+
+
+def aggregate_word_statistics(file_uuid: str, word_stats: list) -> List[Dict[str, Any]]:
+    """Схлопывание повторов (word, language) в пределах файла"""
+    totals: Dict[tuple, int] = {}
+    for word_stat in word_stats:
+        key = (word_stat['word'][:MAX_WORD_LENGTH], word_stat.get('language') or 'unknown')
+        totals[key] = totals.get(key, 0) + int(word_stat['count'])
+
+    return [{
+        'file_uuid': file_uuid,
+        'word': word,
+        'language': language,
+        'count': count
+    } for (word, language), count in totals.items()]
+
+
+def _pack_cursor(position: list) -> str:
+    raw = json.dumps(position).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _unpack_cursor(cursor: str) -> list:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    return json.loads(raw)
+
+
+def encode_cursor(created_at: datetime, record_id: str) -> str:
+    """Курсор страницы: позиция последней записи (created_at, id)"""
+    return _pack_cursor([created_at.isoformat(), record_id])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Разбор курсора, ValueError - курсор поврежден"""
+    try:
+        created_at, record_id = _unpack_cursor(cursor)
+        return datetime.fromisoformat(created_at), str(record_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def encode_search_cursor(rank: float, record_id: str) -> str:
+    """Курсор страницы поиска: позиция последнего результата (rank, id)"""
+    return _pack_cursor([rank, record_id])
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, str]:
+    """Разбор курсора поиска, ValueError - курсор поврежден"""
+    try:
+        rank, record_id = _unpack_cursor(cursor)
+        return float(rank), str(record_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+ROLLUP_TABLES = {
+    'transcription_rollups_hourly': 'hour',
+    'transcription_rollups_daily': 'day'
+}
+
+
+def _rollup_upsert(table: str, unit: str, source: str = "deltas") -> str:
+    """
+    INSERT ... ON CONFLICT для одной таблицы агрегатов.
+    source - CTE со столбцами created_at, status, language, model, delta,
+    processing_time, text_length, duration. Строки со снятием (delta < 0) несут
+    метрики со знаком минус и уменьшают суммы; min/max по ним не пересчитываются
+    """
+    return f"""
+        INSERT INTO {table} AS r (
+            bucket, status, language, model, count,
+            processing_time_sum, processing_time_min, processing_time_max,
+            text_length_sum, text_length_max, duration_sum
+        )
+        SELECT
+            date_trunc('{unit}', created_at), COALESCE(status, 'started'),
+            COALESCE(language, 'unknown'), COALESCE(model, 'unknown'), SUM(delta),
+            COALESCE(SUM(processing_time), 0),
+            MIN(processing_time) FILTER (WHERE delta > 0), MAX(processing_time) FILTER (WHERE delta > 0),
+            COALESCE(SUM(text_length), 0), MAX(text_length) FILTER (WHERE delta > 0),
+            COALESCE(SUM(duration), 0)
+        FROM {source}
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (bucket, status, language, model) DO UPDATE
+        SET count = r.count + EXCLUDED.count,
+            processing_time_sum = r.processing_time_sum + EXCLUDED.processing_time_sum,
+            processing_time_min = LEAST(r.processing_time_min, EXCLUDED.processing_time_min),
+            processing_time_max = GREATEST(r.processing_time_max, EXCLUDED.processing_time_max),
+            text_length_sum = r.text_length_sum + EXCLUDED.text_length_sum,
+            text_length_max = GREATEST(r.text_length_max, EXCLUDED.text_length_max),
+            duration_sum = r.duration_sum + EXCLUDED.duration_sum
+    """
+
+
+def _with_rollups(ctes: str) -> str:
+    """Запрос, который после изменения записи применяет deltas к часовым и дневным агрегатам"""
+    hourly, daily = [_rollup_upsert(table, unit) for table, unit in ROLLUP_TABLES.items()]
+    return f"WITH {ctes}, hourly AS ({hourly}) {daily}"
+
+
+# Старые значения метрик записи (для снятия из агрегатов старого статуса)
+OLD_METRICS_SQL = "processing_time AS old_processing_time, text_length AS old_text_length, duration AS old_duration"
+
+
+def _transition_deltas(new_status: str) -> str:
+    """
+    Перевод записи из старого статуса в новый: -1 старому, +1 новому.
+    Метрики накапливаются только в агрегатах completed, поэтому при уходе
+    из completed старые значения вычитаются вместе со счетчиком.
+    updated должен возвращать old_status и old_processing_time/old_text_length/old_duration
+    """
+    metrics = "processing_time, text_length, duration" if new_status == 'completed' \
+        else "NULL::FLOAT, NULL::INTEGER, NULL::FLOAT"
+    return f"""deltas AS (
+        SELECT created_at, old_status AS status, language, model, -1 AS delta,
+               CASE WHEN old_status = 'completed' THEN -old_processing_time END::FLOAT AS processing_time,
+               CASE WHEN old_status = 'completed' THEN -old_text_length END::INTEGER AS text_length,
+               CASE WHEN old_status = 'completed' THEN -old_duration END::FLOAT AS duration
+        FROM updated
+        UNION ALL
+        SELECT created_at, '{new_status}', language, model, 1, {metrics}
+        FROM updated
+    )"""
+
 
 class AnalyticsRepository:
     """Репозиторий для работы с аналитикой на реальных данных"""
@@ -13,95 +162,24 @@ class AnalyticsRepository:
     def __init__(self, db: Session):
         self.db = db
 
-    def create_transcription_record(self, data: Dict[str, Any]) -> str:
-        """Создание записи о начале транскрипции"""
-        try:
-            file_uuid = data.get('file_uuid') or data.get('transcription_id', '')
-
-            query = text("""
-                INSERT INTO transcription_records (
-                    id, filename, file_size, duration, language,
-                    transcription_id, file_uuid, status, created_at
-                ) VALUES (
-                    :id, :filename, :file_size, :duration, :language,
-                    :transcription_id, :file_uuid, 'started', NOW()
-                )
-                RETURNING id
-            """)
-
-            params = {
-                'id': file_uuid,
-                'filename': data.get('filename', ''),
-                'file_size': data.get('file_size', 0),
-                'duration': data.get('duration', 0),
-                'language': data.get('language', 'ru'),
-                'transcription_id': data.get('transcription_id', ''),
-                'file_uuid': file_uuid
-            }
-
-            result = self.db.execute(query, params)
-            self.db.commit()
-
-            record_id = result.fetchone()[0]
-            return record_id
-
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error creating transcription record: {e}")
-            return ""
-
-    def update_transcription_record(self, file_uuid: str, data: Dict[str, Any]) -> bool:
-        """Обновление записи транскрипции"""
-        try:
-            # Собираем SET часть запроса
-            set_parts = []
-            params = {'file_uuid': file_uuid}
-
-            for key, value in data.items():
-                if key == 'completed_at' and isinstance(value, datetime):
-                    params[key] = value
-                elif key == 'completed_at' and value is None:
-                    params[key] = datetime.now(timezone.utc)
-                else:
-                    params[key] = value
-                set_parts.append(f"{key} = :{key}")
-
-            set_clause = ", ".join(set_parts)
-
-            query = text(f"""
-                UPDATE transcription_records
-                SET {set_clause}
-                WHERE id = :file_uuid
-            """)
-
-            result = self.db.execute(query, params)
-            self.db.commit()
-
-            return result.rowcount > 0
-
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error updating transcription record: {e}")
-            return False
-
     def get_total_count(self) -> Dict[str, int]:
         """Получение общего количества транскрипций"""
         try:
             query = text("""
                 SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed,
-                    SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed
-                FROM transcription_records
+                    SUM(count) as total,
+                    SUM(count) FILTER (WHERE status = 'completed') as completed,
+                    SUM(count) FILTER (WHERE status = 'failed') as failed
+                FROM transcription_rollups_daily
             """)
 
             result = self.db.execute(query).fetchone()
 
             if result:
                 return {
-                    'total': result[0] or 0,
-                    'completed': result[1] or 0,
-                    'failed': result[2] or 0
+                    'total': int(result[0] or 0),
+                    'completed': int(result[1] or 0),
+                    'failed': int(result[2] or 0)
                 }
             return {'total': 0, 'completed': 0, 'failed': 0}
 
@@ -114,13 +192,14 @@ class AnalyticsRepository:
         try:
             query = text("""
                 SELECT 
-                    DATE(created_at) as date,
-                    COUNT(*) as total,
-                    SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed,
-                    SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed
-                FROM transcription_records
-                WHERE created_at >= NOW() - INTERVAL ':days days'
-                GROUP BY DATE(created_at)
+                    bucket as date,
+                    SUM(count) as total,
+                    SUM(count) FILTER (WHERE status = 'completed') as completed,
+                    SUM(count) FILTER (WHERE status = 'failed') as failed
+                FROM transcription_rollups_daily
+                WHERE bucket >= date_trunc('day', NOW() - make_interval(days => :days))
+                GROUP BY bucket
+                HAVING SUM(count) > 0
                 ORDER BY date DESC
             """)
 
@@ -131,9 +210,9 @@ class AnalyticsRepository:
             for row in rows:
                 daily_stats.append({
                     'date': row[0].strftime('%Y-%m-%d') if row[0] else '',
-                    'total': row[1] or 0,
-                    'completed': row[2] or 0,
-                    'failed': row[3] or 0
+                    'total': int(row[1] or 0),
+                    'completed': int(row[2] or 0),
+                    'failed': int(row[3] or 0)
                 })
 
             return daily_stats
@@ -147,10 +226,11 @@ class AnalyticsRepository:
         try:
             query = text("""
                 SELECT 
-                    COALESCE(language, 'unknown') as language,
-                    COUNT(*) as count
-                FROM transcription_records
+                    language,
+                    SUM(count) as count
+                FROM transcription_rollups_daily
                 GROUP BY language
+                HAVING SUM(count) > 0
                 ORDER BY count DESC
             """)
 
@@ -159,7 +239,7 @@ class AnalyticsRepository:
 
             distribution = {}
             for row in rows:
-                distribution[row[0]] = row[1] or 0
+                distribution[row[0]] = int(row[1] or 0)
 
             return distribution
 
@@ -172,16 +252,16 @@ class AnalyticsRepository:
         try:
             query = text("""
                 SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed
-                FROM transcription_records
-                WHERE created_at >= NOW() - INTERVAL ':days days'
+                    SUM(count) as total,
+                    SUM(count) FILTER (WHERE status = 'completed') as completed
+                FROM transcription_rollups_daily
+                WHERE bucket >= date_trunc('day', NOW() - make_interval(days => :days))
             """)
 
             result = self.db.execute(query, {'days': days}).fetchone()
 
-            total = result[0] or 0
-            completed = result[1] or 0
+            total = int(result[0] or 0)
+            completed = int(result[1] or 0)
 
             if total > 0:
                 success_rate = (completed / total) * 100
@@ -197,61 +277,62 @@ class AnalyticsRepository:
     def get_performance_metrics(self, hours: int = 24) -> Dict[str, Any]:
         """Метрики производительности"""
         try:
-            # Среднее время обработки
-            query_avg = text("""
-                SELECT 
-                    AVG(processing_time) as avg_processing_time,
-                    MAX(processing_time) as max_processing_time
-                FROM transcription_records
-                WHERE status = 'completed' 
-                AND processing_time > 0
-                AND created_at >= NOW() - INTERVAL ':hours hours'
-            """)
-
-            result = self.db.execute(query_avg, {'hours': hours}).fetchone()
-
-            avg_time = result[0] or 0
-            max_time = result[1] or 0
-
-            # Статистика по длине текста
-            query_text = text("""
+            query = text("""
                 SELECT 
-                    AVG(text_length) as avg_text_length,
-                    MAX(text_length) as max_text_length
-                FROM transcription_records
-                WHERE status = 'completed' 
-                AND text_length > 0
-                AND created_at >= NOW() - INTERVAL ':hours hours'
+                    SUM(processing_time_sum) / NULLIF(SUM(count), 0) as avg_processing_time,
+                    MAX(processing_time_max) as max_processing_time,
+                    SUM(text_length_sum) / NULLIF(SUM(count), 0) as avg_text_length,
+                    MAX(text_length_max) as max_text_length
+                FROM transcription_rollups_hourly
+                WHERE status = 'completed'
+                AND bucket >= date_trunc('hour', NOW() - make_interval(hours => :hours))
             """)
 
-            result_text = self.db.execute(query_text, {'hours': hours}).fetchone()
+            result = self.db.execute(query, {'hours': hours}).fetchone()
 
             return {
-                'avg_processing_time': round(float(avg_time), 2),
-                'max_processing_time': round(float(max_time), 2),
-                'avg_text_length': round(float(result_text[0] or 0), 0),
-                'max_text_length': round(float(result_text[1] or 0), 0)
+                'avg_processing_time': round(float(result[0] or 0), 2),
+                'max_processing_time': round(float(result[1] or 0), 2),
+                'avg_text_length': round(float(result[2] or 0), 0),
+                'max_text_length': round(float(result[3] or 0), 0)
             }
 
         except Exception as e:
             logger.error(f"Error getting performance metrics: {e}")
             return {'avg_processing_time': 0, 'max_processing_time': 0}
 
-    def get_system_metrics(self, hours: int = 24) -> Dict[str, Any]:
-        """Системные метрики (последние)"""
+    def get_system_metrics(self, hours: int = 24, raw_hours: int = 24) -> Dict[str, Any]:
+        """
+        Системные метрики за hours часов: последние raw_hours часов из минутных
+        значений, более старые - из часовых агрегатов. Условия по времени
+        отсекают лишние секции обеих таблиц
+        """
         try:
             query = text("""
-                SELECT 
+                WITH samples AS (
+                    SELECT metric_type, metric_value AS avg_value, metric_value AS max_value,
+                           metric_value AS min_value, 1 AS samples
+                    FROM system_metrics
+                    WHERE timestamp >= GREATEST(
+                        NOW() - make_interval(hours => :hours),
+                        date_trunc('hour', NOW() - make_interval(hours => :raw_hours))
+                    )
+                    UNION ALL
+                    SELECT metric_type, avg_value, max_value, min_value, samples
+                    FROM system_metrics_hourly
+                    WHERE hour >= date_trunc('hour', NOW() - make_interval(hours => :hours))
+                      AND hour < date_trunc('hour', NOW() - make_interval(hours => :raw_hours))
+                )
+                SELECT
                     metric_type,
-                    AVG(metric_value) as avg_value,
-                    MAX(metric_value) as max_value,
-                    MIN(metric_value) as min_value
-                FROM system_metrics
-                WHERE timestamp >= NOW() - INTERVAL ':hours hours'
+                    SUM(avg_value * samples) / NULLIF(SUM(samples), 0) as avg_value,
+                    MAX(max_value) as max_value,
+                    MIN(min_value) as min_value
+                FROM samples
                 GROUP BY metric_type
             """)
 
-            result = self.db.execute(query, {'hours': hours})
+            result = self.db.execute(query, {'hours': hours, 'raw_hours': raw_hours})
             rows = result.fetchall()
 
             metrics = {}
@@ -263,24 +344,37 @@ class AnalyticsRepository:
                     'min': round(float(row[3] or 0), 1)
                 }
 
-            # Добавляем текущие метрики системы
-            try:
-                import psutil
-                cpu_percent = psutil.cpu_percent(interval=1)
-                memory = psutil.virtual_memory()
-
-                metrics['current_cpu'] = round(cpu_percent, 1)
-                metrics['current_memory'] = round(memory.percent, 1)
-                metrics['memory_available_mb'] = round(memory.available / (1024 * 1024), 0)
-            except ImportError:
-                logger.warning("psutil not available for system metrics")
-
             return metrics
 
         except Exception as e:
             logger.error(f"Error getting system metrics: {e}")
             return {}
 
+    def get_latency_histograms(self, hours: int = 24) -> List[Dict[str, Any]]:
+        """Часовые гистограммы задержек за последние N часов"""
+        try:
+            query = text("""
+                SELECT stage, model, language, duration_bucket, counts, total, min_value, max_value
+                FROM latency_histograms
+                WHERE bucket >= date_trunc('hour', NOW() - make_interval(hours => :hours))
+            """)
+
+            rows = self.db.execute(query, {'hours': hours}).fetchall()
+            return [{
+                'stage': row[0],
+                'model': row[1],
+                'language': row[2],
+                'duration_bucket': row[3],
+                'counts': list(row[4] or []),
+                'total': float(row[5] or 0),
+                'min_value': row[6],
+                'max_value': row[7]
+            } for row in rows]
+
+        except Exception as e:
+            logger.error(f"Error getting latency histograms: {e}")
+            return []
+
     def get_top_words(self, limit: int = 20, min_length: int = 3) -> List[Dict[str, Any]]:
         """Самые частые слова"""
         try:
@@ -288,7 +382,7 @@ class AnalyticsRepository:
                 SELECT 
                     word,
                     SUM(count) as total_count
-                FROM word_statistics
+                FROM word_totals
                 WHERE LENGTH(word) >= :min_length
                 GROUP BY word
                 ORDER BY total_count DESC
@@ -349,6 +443,72 @@ class AnalyticsRepository:
             logger.error(f"Error getting recent transcriptions: {e}")
             return []
 
+    def list_transcriptions(self, limit: int = 50, cursor: Optional[str] = None,
+                            status: Optional[str] = None, language: Optional[str] = None,
+                            created_from: Optional[datetime] = None, created_to: Optional[datetime] = None,
+                            filename_prefix: Optional[str] = None) -> Dict[str, Any]:
+        """
+        История транскрипций по убыванию (created_at, id) с keyset-пагинацией:
+        следующая страница начинается строго после позиции из курсора, поэтому
+        глубокие страницы стоят столько же, сколько первая (без OFFSET)
+        """
+        conditions = []
+        params: Dict[str, Any] = {'limit': limit + 1}
+
+        if cursor:
+            params['cursor_created_at'], params['cursor_id'] = decode_cursor(cursor)
+            conditions.append("(created_at, id) < (:cursor_created_at, :cursor_id)")
+        if status:
+            conditions.append("status = :status")
+            params['status'] = status
+        if language:
+            conditions.append("language = :language")
+            params['language'] = language
+        if created_from:
+            conditions.append("created_at >= :created_from")
+            params['created_from'] = created_from
+        if created_to:
+            conditions.append("created_at < :created_to")
+            params['created_to'] = created_to
+        if filename_prefix:
+            conditions.append("filename LIKE :filename_prefix")
+            params['filename_prefix'] = _escape_like(filename_prefix) + "%"
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = text(f"""
+            SELECT
+                id, transcription_id, filename, language, model, status,
+                duration, text_length, processing_time, error_message,
+                created_at, completed_at
+            FROM transcription_records
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT :limit
+        """)
+        rows = self.db.execute(query, params).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = [{
+            'id': row[0],
+            'transcription_id': row[1],
+            'filename': row[2],
+            'language': row[3],
+            'model': row[4],
+            'status': row[5],
+            'duration': row[6],
+            'text_length': row[7] or 0,
+            'processing_time': row[8],
+            'error_message': row[9],
+            'created_at': row[10],
+            'completed_at': row[11]
+        } for row in rows]
+
+        return {
+            'items': items,
+            'next_cursor': encode_cursor(rows[-1][10], rows[-1][0]) if has_more and rows else None
+        }
+
     def add_system_metric(self, metric_data: Dict[str, Any]) -> bool:
         """Добавление системной метрики"""
         try:
@@ -375,83 +535,572 @@ class AnalyticsRepository:
             logger.error(f"Error adding system metric: {e}")
             return False
 
-    def add_word_statistics(self, file_uuid: str, word_stats: list) -> bool:
-        """Добавление статистики слов"""
-        try:
-            for word_stat in word_stats:
-                query = text("""
-                    INSERT INTO word_statistics (
-                        file_uuid, word, count, language, created_at
-                    ) VALUES (
-                        :file_uuid, :word, :count, :language, NOW()
-                    )
-                """)
-
-                params = {
-                    'file_uuid': file_uuid,
-                    'word': word_stat['word'],
-                    'count': word_stat['count'],
-                    'language': word_stat.get('language', 'unknown')
-                }
-
-                self.db.execute(query, params)
-
-            self.db.commit()
+    def add_system_metrics(self, metrics: List[Dict[str, Any]]) -> bool:
+        """Пакетное добавление системных метрик одним запросом"""
+        if not metrics:
             return True
-
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error adding word statistics: {e}")
-            return False
-
-    def add_performance_metric(self, file_uuid: str, metric_type: str, value: float) -> bool:
-        """Добавление метрики производительности"""
         try:
             query = text("""
-                INSERT INTO performance_metrics (
-                    file_uuid, metric_name, metric_value, created_at
+                INSERT INTO system_metrics (
+                    timestamp, metric_type, metric_value, service
                 ) VALUES (
-                    :file_uuid, :metric_name, :metric_value, NOW()
+                    NOW(), :metric_type, :metric_value, :service
                 )
             """)
 
-            params = {
-                'file_uuid': file_uuid,
-                'metric_name': metric_type,
-                'metric_value': value
-            }
-
-            self.db.execute(query, params)
+            self.db.execute(query, [{
+                'metric_type': metric['metric_type'],
+                'metric_value': metric['metric_value'],
+                'service': metric.get('service', 'transcription')
+            } for metric in metrics])
             self.db.commit()
             return True
 
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error adding performance metric: {e}")
+            logger.error(f"Error adding system metrics: {e}")
             return False
 
-    def record_transcription_error(self, file_uuid: str, error_message: str) -> bool:
-        """Запись ошибки транскрипции"""
-        try:
-            query = text("""
-                UPDATE transcription_records 
-                SET status = 'failed',
-                    error_message = :error_message,
-                    completed_at = NOW()
-                WHERE id = :file_uuid
-            """)
-
-            params = {
-                'file_uuid': file_uuid,
-                'error_message': error_message
-            }
+    def add_word_statistics(self, file_uuid: str, word_stats: list) -> bool:
+        """
+        Добавление статистики слов одним запросом: строки транскрипции
+        в word_statistics и накопительные счетчики в word_totals
+        """
+        if not word_stats:
+            return True
 
-            result = self.db.execute(query, params)
+        try:
+            self.insert_word_statistics(aggregate_word_statistics(file_uuid, word_stats))
             self.db.commit()
-
-            return result.rowcount > 0
+            return True
 
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error recording transcription error: {e}")
-            return False
\ No newline at end of file
+            logger.error(f"Error adding word statistics: {e}")
+            return False
+
+    #  Пакетная запись (без commit, транзакцией управляет вызывающий код)
+
+    @traced("db.insert_transcription_records")
+    def insert_transcription_records(self, rows: List[Dict[str, Any]]):
+        """Пакетное создание записей о начале транскрипции (с обновлением агрегатов)"""
+        if not rows:
+            return
+        query = text(_with_rollups("""
+            inserted AS (
+                INSERT INTO transcription_records (
+                    id, filename, file_size, duration, language, model,
+                    transcription_id, file_uuid, status, created_at
+                ) VALUES (
+                    :file_uuid, :filename, :file_size, :duration, :language, :model,
+                    :transcription_id, :file_uuid, 'started', :created_at
+                )
+                ON CONFLICT (id) DO NOTHING
+                RETURNING created_at, status, language, model
+            ), deltas AS (
+                SELECT created_at, status, language, model, 1 AS delta,
+                       NULL::FLOAT AS processing_time, NULL::INTEGER AS text_length, NULL::FLOAT AS duration
+                FROM inserted
+            )
+        """))
+        self.db.execute(query, rows)
+
+    @traced("db.complete_transcription_records")
+    def complete_transcription_records(self, rows: List[Dict[str, Any]]):
+        """Пакетное завершение транскрипций (с обновлением агрегатов)"""
+        if not rows:
+            return
+        query = text(_with_rollups("""
+            old AS (
+                SELECT id, status AS old_status, """ + OLD_METRICS_SQL + """
+                FROM transcription_records
+                WHERE id = :file_uuid AND status IS DISTINCT FROM 'completed'
+                FOR UPDATE
+            ), updated AS (
+                UPDATE transcription_records t
+                SET status = 'completed',
+                    text_length = :text_length,
+                    processing_time = :processing_time,
+                    confidence_score = COALESCE(:confidence_score, t.confidence_score),
+                    duration = COALESCE(:duration, t.duration),
+                    transcript_text = COALESCE(:transcript_text, t.transcript_text),
+                    completed_at = :completed_at
+                FROM old
+                WHERE t.id = old.id
+                RETURNING t.created_at, t.language, t.model, old.old_status,
+                          old.old_processing_time, old.old_text_length, old.old_duration,
+                          t.processing_time, t.text_length, t.duration
+            ), """ + _transition_deltas('completed')))
+        self.db.execute(query, rows)
+
+    @traced("db.fail_transcription_records")
+    def fail_transcription_records(self, rows: List[Dict[str, Any]]):
+        """Пакетная запись ошибок транскрипции (с обновлением агрегатов)"""
+        if not rows:
+            return
+        query = text(_with_rollups("""
+            old AS (
+                SELECT id, status AS old_status, """ + OLD_METRICS_SQL + """
+                FROM transcription_records
+                WHERE id = :file_uuid AND status IS DISTINCT FROM 'failed'
+                FOR UPDATE
+            ), updated AS (
+                UPDATE transcription_records t
+                SET status = 'failed',
+                    error_message = :error_message,
+                    completed_at = :completed_at
+                FROM old
+                WHERE t.id = old.id
+                RETURNING t.created_at, t.language, t.model, old.old_status,
+                          old.old_processing_time, old.old_text_length, old.old_duration
+            ), """ + _transition_deltas('failed')))
+        self.db.execute(query, rows)
+
+    def search_transcriptions(self, q: str, limit: int = 20, cursor: Optional[str] = None,
+                              language: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Полнотекстовый поиск по текстам транскрипций (GIN-индекс по search_vector).
+        Результаты упорядочены по релевантности (rank, id), страницы - по курсору.
+        Фрагменты с подсветкой (ts_headline) строятся только для строк страницы
+        """
+        conditions = [f"search_vector @@ {SEARCH_QUERY_SQL}"]
+        params: Dict[str, Any] = {'q': q, 'limit': limit + 1}
+
+        if language:
+            conditions.append("language = :language")
+            params['language'] = language
+
+        page_filter = ""
+        if cursor:
+            params['cursor_rank'], params['cursor_id'] = decode_search_cursor(cursor)
+            page_filter = """
+                WHERE rank < CAST(:cursor_rank AS REAL)
+                   OR (rank = CAST(:cursor_rank AS REAL) AND id > :cursor_id)
+            """
+
+        query = text(f"""
+            WITH hits AS (
+                SELECT id, transcription_id, filename, language, created_at,
+                       ts_rank(search_vector, {SEARCH_QUERY_SQL}, 1) AS rank
+                FROM transcription_records
+                WHERE {' AND '.join(conditions)}
+            ), page AS (
+                SELECT * FROM hits
+                {page_filter}
+                ORDER BY rank DESC, id
+                LIMIT :limit
+            )
+            SELECT page.id, page.transcription_id, page.filename, page.language, page.created_at, page.rank,
+                   ts_headline({SEARCH_CONFIG_SQL.format(column='t.language')}, t.transcript_text,
+                               {SEARCH_QUERY_SQL}, '{SEARCH_HEADLINE_OPTIONS}') AS snippet
+            FROM page
+            JOIN transcription_records t ON t.id = page.id
+            ORDER BY page.rank DESC, page.id
+        """)
+        rows = self.db.execute(query, params).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = [{
+            'id': row[0],
+            'transcription_id': row[1],
+            'filename': row[2],
+            'language': row[3],
+            'created_at': row[4],
+            'rank': float(row[5]),
+            'snippet': row[6] or ''
+        } for row in rows]
+
+        return {
+            'items': items,
+            'next_cursor': encode_search_cursor(float(rows[-1][5]), rows[-1][0]) if has_more and rows else None
+        }
+
+    def list_unindexed_transcriptions(self, limit: int = 500, after_id: str = "") -> List[str]:
+        """Завершенные транскрипции без текста в индексе поиска (для заполнения с диска)"""
+        result = self.db.execute(text("""
+            SELECT id FROM transcription_records
+            WHERE status = 'completed' AND transcript_text IS NULL AND id > :after_id
+            ORDER BY id
+            LIMIT :limit
+        """), {'after_id': after_id, 'limit': limit})
+        return [row[0] for row in result.fetchall()]
+
+    def set_transcript_texts(self, rows: List[Dict[str, Any]]):
+        """Пакетная запись текстов транскрипций: [{'file_uuid', 'transcript_text'}]"""
+        if not rows:
+            return
+        self.db.execute(text("""
+            UPDATE transcription_records
+            SET transcript_text = :transcript_text
+            WHERE id = :file_uuid
+        """), rows)
+
+    def rebuild_rollups(self, start: datetime, end: datetime) -> int:
+        """
+        Пересчет агрегатов за [start, end) по transcription_records.
+        Границы должны совпадать с началом суток, иначе дневные агрегаты
+        будут посчитаны по неполным дням.
+        """
+        self.db.execute(text(
+            "LOCK TABLE transcription_rollups_hourly, transcription_rollups_daily IN EXCLUSIVE MODE"
+        ))
+        for table in ROLLUP_TABLES:
+            self.db.execute(
+                text(f"DELETE FROM {table} WHERE bucket >= :start AND bucket < :end"),
+                {'start': start, 'end': end}
+            )
+
+        hourly, daily = [_rollup_upsert(table, unit, source="source") for table, unit in ROLLUP_TABLES.items()]
+        query = text(f"""
+            WITH source AS (
+                SELECT created_at, status, language, model, 1 AS delta,
+                       CASE WHEN status = 'completed' THEN processing_time END AS processing_time,
+                       CASE WHEN status = 'completed' THEN text_length END AS text_length,
+                       CASE WHEN status = 'completed' THEN duration END AS duration
+                FROM transcription_records
+                WHERE created_at >= :start AND created_at < :end
+            ), hourly AS ({hourly}) {daily}
+        """)
+        self.db.execute(query, {'start': start, 'end': end})
+
+        count = self.db.execute(
+            text("SELECT COUNT(*) FROM transcription_records WHERE created_at >= :start AND created_at < :end"),
+            {'start': start, 'end': end}
+        ).scalar()
+        return count or 0
+
+    def try_advisory_lock(self, key: int) -> bool:
+        """Блокировка на время транзакции, чтобы обслуживание выполнял один процесс"""
+        return bool(self.db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {'key': key}).scalar())
+
+    def list_partitions(self, table: str) -> List[str]:
+        """Имена секций секционированной таблицы"""
+        result = self.db.execute(text("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = :table
+            ORDER BY child.relname
+        """), {'table': table})
+        return [row[0] for row in result.fetchall()]
+
+    def create_partition(self, table: str, name: str, start: datetime, end: datetime,
+                         column: Optional[str] = None):
+        """
+        Секция [start, end); имена формирует app.analytics.partitions.
+        Если у таблицы есть секция {table}_default (column - ключ секционирования),
+        строки диапазона, попавшие в нее, переносятся в новую секцию: иначе
+        Postgres не создаст секцию, пересекающуюся с данными default
+        """
+        bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        default = f"{table}_default"
+        has_default = column and self.db.execute(
+            text("SELECT to_regclass(:name) IS NOT NULL"), {'name': default}
+        ).scalar()
+        if not has_default:
+            self.db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {bounds}"))
+            return
+
+        self.db.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        self.db.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM {default}
+                WHERE {column} >= :start AND {column} < :end
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """), {'start': start, 'end': end})
+        self.db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {bounds}"))
+
+    def drop_partition(self, name: str):
+        self.db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+
+    def get_downsample_watermark(self) -> Optional[datetime]:
+        """Последний час, уже свернутый в system_metrics_hourly"""
+        return self.db.execute(text("SELECT MAX(hour) FROM system_metrics_hourly")).scalar()
+
+    def get_oldest_system_metric(self, source: str = "system_metrics") -> Optional[datetime]:
+        return self.db.execute(text(f"SELECT MIN(timestamp) FROM {source}")).scalar()
+
+    @traced("db.downsample_system_metrics")
+    def downsample_system_metrics(self, since: datetime, until: datetime, source: str = "system_metrics") -> int:
+        """
+        Свертка минутных значений [since, until) в часовые агрегаты.
+        Повторная свертка часа заменяет агрегат, поэтому последний час можно
+        пересчитывать, пока он дописывается
+        """
+        result = self.db.execute(text(f"""
+            INSERT INTO system_metrics_hourly (
+                hour, metric_type, service, avg_value, min_value, max_value, samples
+            )
+            SELECT
+                date_trunc('hour', timestamp), metric_type, COALESCE(service, 'transcription'),
+                AVG(metric_value), MIN(metric_value), MAX(metric_value), COUNT(*)
+            FROM {source}
+            WHERE timestamp >= :since AND timestamp < :until
+            GROUP BY 1, 2, 3
+            ON CONFLICT (hour, metric_type, service) DO UPDATE
+            SET avg_value = EXCLUDED.avg_value,
+                min_value = EXCLUDED.min_value,
+                max_value = EXCLUDED.max_value,
+                samples = EXCLUDED.samples
+        """), {'since': since, 'until': until})
+        return result.rowcount or 0
+
+    @traced("db.insert_word_statistics")
+    def insert_word_statistics(self, rows: List[Dict[str, Any]], update_totals: bool = True):
+        """
+        Статистика слов одного или нескольких файлов одним запросом.
+        rows - результат aggregate_word_statistics (ключ file_uuid/word/language уникален).
+        update_totals=False - счетчики ведет рейтинг в Redis, word_totals
+        обновляется его снимками
+        """
+        if not rows:
+            return
+        totals = """
+            INSERT INTO word_totals (word, language, count, updated_at)
+            SELECT word, language, SUM(count), NOW()
+            FROM input
+            GROUP BY word, language
+            ON CONFLICT (word, language) DO UPDATE
+            SET count = word_totals.count + EXCLUDED.count,
+                updated_at = EXCLUDED.updated_at
+        """ if update_totals else "SELECT 1"
+        query = text("""
+            WITH input AS (
+                SELECT *
+                FROM unnest(
+                    CAST(:file_uuids AS TEXT[]),
+                    CAST(:words AS TEXT[]),
+                    CAST(:counts AS INTEGER[]),
+                    CAST(:languages AS TEXT[])
+                ) AS t(file_uuid, word, count, language)
+            ), inserted AS (
+                INSERT INTO word_statistics (file_uuid, word, count, language, created_at)
+                SELECT file_uuid, word, count, language, NOW()
+                FROM input
+            )
+        """ + totals)
+        self.db.execute(query, {
+            'file_uuids': [row['file_uuid'] for row in rows],
+            'words': [row['word'] for row in rows],
+            'counts': [row['count'] for row in rows],
+            'languages': [row['language'] for row in rows]
+        })
+
+    @traced("db.add_word_totals")
+    def add_word_totals(self, rows: List[Dict[str, Any]]):
+        """Снимок рейтинга слов: прирост счетчиков из Redis прибавляется к таблице"""
+        if not rows:
+            return
+        query = text("""
+            INSERT INTO word_totals (word, language, count, updated_at)
+            SELECT word, language, count, NOW()
+            FROM unnest(
+                CAST(:words AS TEXT[]),
+                CAST(:languages AS TEXT[]),
+                CAST(:counts AS BIGINT[])
+            ) AS t(word, language, count)
+            ON CONFLICT (word, language) DO UPDATE
+            SET count = word_totals.count + EXCLUDED.count,
+                updated_at = EXCLUDED.updated_at
+        """)
+        self.db.execute(query, {
+            'words': [row['word'] for row in rows],
+            'languages': [row['language'] for row in rows],
+            'counts': [row['count'] for row in rows]
+        })
+
+    def iter_word_totals(self, batch_size: int = 10000):
+        """Снимок word_totals частями (серверный курсор)"""
+        result = self.db.execute(
+            text("SELECT word, language, count FROM word_totals").execution_options(stream_results=True)
+        )
+        for rows in result.partitions(batch_size):
+            yield [{'word': row[0], 'language': row[1], 'count': row[2]} for row in rows]
+
+    @traced("db.register_documents")
+    def register_documents(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """
+        Регистрация документов в TF-IDF индексе: [{'file_uuid', 'language', 'term_count'}].
+        Возвращает только новые документы - повторная запись не меняет частоты
+        """
+        if not rows:
+            return []
+        result = self.db.execute(text("""
+            INSERT INTO indexed_documents (file_uuid, language, term_count, indexed_at)
+            SELECT file_uuid, language, term_count, NOW()
+            FROM unnest(
+                CAST(:file_uuids AS TEXT[]),
+                CAST(:languages AS TEXT[]),
+                CAST(:term_counts AS INTEGER[])
+            ) AS t(file_uuid, language, term_count)
+            ON CONFLICT (file_uuid) DO NOTHING
+            RETURNING file_uuid
+        """), {
+            'file_uuids': [row['file_uuid'] for row in rows],
+            'languages': [row['language'] for row in rows],
+            'term_counts': [row['term_count'] for row in rows]
+        })
+        return [row[0] for row in result.fetchall()]
+
+    @traced("db.increment_document_frequencies")
+    def increment_document_frequencies(self, terms: List[Dict[str, Any]], documents: List[Dict[str, Any]]):
+        """
+        Приращение document frequency терминов [{'term', 'language', 'delta'}]
+        и числа документов языков [{'language', 'delta'}]
+        """
+        if documents:
+            self.db.execute(text("""
+                INSERT INTO corpus_documents (language, documents)
+                SELECT language, delta
+                FROM unnest(CAST(:languages AS TEXT[]), CAST(:deltas AS BIGINT[])) AS t(language, delta)
+                ON CONFLICT (language) DO UPDATE
+                SET documents = corpus_documents.documents + EXCLUDED.documents
+            """), {
+                'languages': [row['language'] for row in documents],
+                'deltas': [row['delta'] for row in documents]
+            })
+        if terms:
+            # Порядок ключей постоянный: параллельные writer-ы не взаимоблокируются
+            terms = sorted(terms, key=lambda row: (row['term'], row['language']))
+            self.db.execute(text("""
+                INSERT INTO term_document_frequency (term, language, df)
+                SELECT term, language, delta
+                FROM unnest(
+                    CAST(:terms AS TEXT[]),
+                    CAST(:languages AS TEXT[]),
+                    CAST(:deltas AS BIGINT[])
+                ) AS t(term, language, delta)
+                ON CONFLICT (term, language) DO UPDATE
+                SET df = term_document_frequency.df + EXCLUDED.df
+            """), {
+                'terms': [row['term'] for row in terms],
+                'languages': [row['language'] for row in terms],
+                'deltas': [row['delta'] for row in terms]
+            })
+
+    def get_document_frequencies(self, terms: List[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        """df терминов: {(term, language): df}"""
+        if not terms:
+            return {}
+        result = self.db.execute(text("""
+            SELECT f.term, f.language, f.df
+            FROM term_document_frequency f
+            JOIN unnest(CAST(:terms AS TEXT[]), CAST(:languages AS TEXT[])) AS t(term, language)
+              ON f.term = t.term AND f.language = t.language
+        """), {
+            'terms': [term for term, _ in terms],
+            'languages': [language for _, language in terms]
+        })
+        return {(row[0], row[1]): row[2] for row in result.fetchall()}
+
+    def get_corpus_sizes(self) -> Dict[str, int]:
+        """Число документов в индексе по языкам"""
+        result = self.db.execute(text("SELECT language, documents FROM corpus_documents"))
+        return {row[0]: row[1] for row in result.fetchall()}
+
+    @traced("db.insert_document_keywords")
+    def insert_document_keywords(self, rows: List[Dict[str, Any]]):
+        """Ключевые слова документов: [{'file_uuid', 'term', 'language', 'score', 'position'}]"""
+        if not rows:
+            return
+        self.db.execute(text("""
+            INSERT INTO document_keywords (file_uuid, term, language, score, position, created_at)
+            SELECT file_uuid, term, language, score, position, NOW()
+            FROM unnest(
+                CAST(:file_uuids AS TEXT[]),
+                CAST(:terms AS TEXT[]),
+                CAST(:languages AS TEXT[]),
+                CAST(:scores AS FLOAT[]),
+                CAST(:positions AS INTEGER[])
+            ) AS t(file_uuid, term, language, score, position)
+            ON CONFLICT (file_uuid, term) DO NOTHING
+        """), {
+            'file_uuids': [row['file_uuid'] for row in rows],
+            'terms': [row['term'] for row in rows],
+            'languages': [row['language'] for row in rows],
+            'scores': [row['score'] for row in rows],
+            'positions': [row['position'] for row in rows]
+        })
+
+    def get_document_keywords(self, file_uuid: str, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Ключевые слова документа, None - документ не проиндексирован"""
+        indexed = self.db.execute(
+            text("SELECT 1 FROM indexed_documents WHERE file_uuid = :file_uuid"),
+            {'file_uuid': file_uuid}
+        ).fetchone()
+        if not indexed:
+            return None
+        result = self.db.execute(text("""
+            SELECT term, score
+            FROM document_keywords
+            WHERE file_uuid = :file_uuid
+            ORDER BY position
+            LIMIT :limit
+        """), {'file_uuid': file_uuid, 'limit': limit})
+        return [{'term': row[0], 'score': round(row[1], 6)} for row in result.fetchall()]
+
+    def get_trending_terms(self, hours: int = 24, limit: int = 20,
+                           language: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Трендовые термины: ключевые слова документов за последние hours часов.
+        Ключевые слова уже отобраны по TF-IDF, поэтому служебные слова сюда не попадают
+        """
+        language_filter = "AND language = :language" if language else ""
+        result = self.db.execute(text(f"""
+            SELECT term, language, COUNT(*) AS documents, SUM(score) AS score
+            FROM document_keywords
+            WHERE created_at >= NOW() - make_interval(hours => :hours)
+            {language_filter}
+            GROUP BY term, language
+            ORDER BY documents DESC, score DESC, term
+            LIMIT :limit
+        """), {'hours': hours, 'limit': limit, 'language': language})
+        return [{
+            'term': row[0],
+            'language': row[1],
+            'documents': row[2],
+            'score': round(row[3], 6)
+        } for row in result.fetchall()]
+
+    @traced("db.merge_latency_histograms")
+    def merge_latency_histograms(self, rows: List[Dict[str, Any]]):
+        """Сложение гистограмм задержек с гистограммами текущего часа"""
+        if not rows:
+            return
+        query = text("""
+            INSERT INTO latency_histograms AS h (
+                bucket, stage, model, language, duration_bucket,
+                counts, total, min_value, max_value
+            ) VALUES (
+                date_trunc('hour', NOW()), :stage, :model, :language, :duration_bucket,
+                CAST(:counts AS BIGINT[]), :total, :min_value, :max_value
+            )
+            ON CONFLICT (bucket, stage, model, language, duration_bucket) DO UPDATE
+            SET counts = ARRAY(
+                    SELECT COALESCE(a, 0) + COALESCE(b, 0)
+                    FROM unnest(h.counts, EXCLUDED.counts) WITH ORDINALITY AS t(a, b, i)
+                    ORDER BY i
+                ),
+                total = h.total + EXCLUDED.total,
+                min_value = LEAST(h.min_value, EXCLUDED.min_value),
+                max_value = GREATEST(h.max_value, EXCLUDED.max_value)
+        """)
+        self.db.execute(query, rows)
+
+    @traced("db.insert_performance_metrics")
+    def insert_performance_metrics(self, rows: List[Dict[str, Any]]):
+        """Пакетное добавление метрик производительности"""
+        if not rows:
+            return
+        query = text("""
+            INSERT INTO performance_metrics (
+                file_uuid, metric_name, metric_value, created_at
+            ) VALUES (
+                :file_uuid, :metric_name, :metric_value, :created_at
+            )
+        """)
+        self.db.execute(query, rows)
@@ -0,0 +1,77 @@
+"""
+Пересчет часовых и дневных агрегатов транскрипций по transcription_records.
+
+Агрегаты обновляются инкрементально при записи событий аналитики, команда
+нужна для первичного заполнения и для сверки (например, по cron раз в сутки):
+    python -m app.analytics.rollups --backfill        # вся история
+    python -m app.analytics.rollups --days 2          # сверка последних 2 суток
+    python -m app.analytics.rollups --since 2024-01-01 --until 2024-02-01
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+
+from app.analytics.repository import AnalyticsRepository
+from app.database import get_db_session
+
+
+def _day_start(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def resolve_range(days: Optional[int], since: Optional[str], until: Optional[str],
+                  now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """Диапазон пересчета [start, end), выровненный по суткам"""
+    now = now or datetime.now(timezone.utc)
+    end = _day_start(datetime.fromisoformat(until)) if until else _day_start(now) + timedelta(days=1)
+    if since:
+        start = _day_start(datetime.fromisoformat(since))
+    else:
+        start = end - timedelta(days=days or 1)
+    return start, end
+
+
+def rebuild(start: datetime, end: datetime, chunk_days: int = 7) -> int:
+    """Пересчет по частям, чтобы не держать блокировку агрегатов долго"""
+    total = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end)
+        with get_db_session() as db:
+            count = AnalyticsRepository(db).rebuild_rollups(chunk_start, chunk_end)
+        print(f"📊 [Rollups] {chunk_start:%Y-%m-%d} .. {chunk_end:%Y-%m-%d}: {count} records")
+        total += count
+        chunk_start = chunk_end
+    return total
+
+
+def _history_start() -> Optional[datetime]:
+    with get_db_session() as db:
+        return db.execute(text("SELECT MIN(created_at) FROM transcription_records")).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild transcription rollup tables")
+    parser.add_argument("--backfill", action="store_true", help="Rebuild the whole history")
+    parser.add_argument("--days", type=int, default=2, help="Reconcile the last N days")
+    parser.add_argument("--since", help="Start date (YYYY-MM-DD)")
+    parser.add_argument("--until", help="End date, exclusive (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    since = args.since
+    if args.backfill and not since:
+        first = _history_start()
+        if first is None:
+            print("📊 [Rollups] No transcription records, nothing to backfill")
+            return
+        since = first.date().isoformat()
+
+    start, end = resolve_range(args.days, since, args.until)
+    total = rebuild(start, end)
+    print(f"✅ [Rollups] Rebuilt {start:%Y-%m-%d} .. {end:%Y-%m-%d} from {total} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Заполнение индекса полнотекстового поиска.
+
+Новые транскрипции попадают в индекс вместе с событием завершения
+(transcript_text -> search_vector). Для записей, созданных раньше, текст
+читается из хранилища результатов:
+    python -m app.analytics.search --backfill
+"""
+import argparse
+
+from app.config import settings
+from app.storage import TranscriptBackend, create_transcript_store
+
+
+def backfill_search_index(store: TranscriptBackend, batch_size: int = 500) -> int:
+    """Запись текстов завершенных транскрипций, которых еще нет в индексе"""
+    from app.analytics.repository import AnalyticsRepository
+    from app.database import get_db_session
+
+    indexed = 0
+    after_id = ""
+    while True:
+        with get_db_session() as db:
+            ids = AnalyticsRepository(db).list_unindexed_transcriptions(batch_size, after_id)
+        if not ids:
+            return indexed
+        after_id = ids[-1]
+
+        rows = []
+        for file_id in ids:
+            text_content = store.read_text(file_id)
+            if text_content is not None:
+                rows.append({
+                    'file_uuid': file_id,
+                    'transcript_text': text_content[:settings.SEARCH_MAX_TEXT_CHARS]
+                })
+
+        with get_db_session() as db:
+            AnalyticsRepository(db).set_transcript_texts(rows)
+        indexed += len(rows)
+        print(f"🔎 [Search] Indexed {indexed} transcripts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search index maintenance")
+    parser.add_argument("--backfill", action="store_true", help="Index transcripts stored before search was enabled")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.backfill:
+        indexed = backfill_search_index(create_transcript_store(), args.batch_size)
+        print(f"✅ [Search] Backfill complete: {indexed} transcripts")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
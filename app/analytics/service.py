@@ -1,122 +1,19 @@
 from typing import Dict, Any
-import psutil
-import time
-from fastapi import logger
+import logging
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
-import threading
+from app.config import settings
+from app.analytics.collector import system_metrics_collector
+from app.analytics.histograms import LatencyHistogram, summarize as summarize_histograms
+from app.analytics.leaderboard import word_leaderboard
 from app.analytics.repository import AnalyticsRepository
 
+logger = logging.getLogger(__name__)
+
 
 class AnalyticsService:
     def __init__(self, db: Session):
         self.repository = AnalyticsRepository(db)
-        self._start_system_metrics_collection()
-
-    def _start_system_metrics_collection(self):
-        """Запуск сбора системных метрик в фоне"""
-        def collect_metrics():
-            while True:
-                try:
-                    # Собираем метрики системы
-                    cpu_percent = psutil.cpu_percent(interval=1)
-                    memory = psutil.virtual_memory()
-
-                    # Сохраняем метрики
-                    system_metrics = [
-                        {
-                            'metric_type': 'cpu_usage',
-                            'metric_value': cpu_percent,
-                            'service': 'transcription'
-                        },
-                        {
-                            'metric_type': 'memory_usage',
-                            'metric_value': memory.percent,
-                            'service': 'transcription'
-                        },
-                        {
-                            'metric_type': 'memory_available',
-                            'metric_value': memory.available / 1024 / 1024,  # MB
-                            'service': 'transcription'
-                        }
-                    ]
-
-                    # Сохраняем в БД
-                    for metric in system_metrics:
-                        self.repository.add_system_metric(metric)
-
-                    # Ждем 60 секунд перед следующим сбором
-                    time.sleep(60)
-
-                except Exception as e:
-                    print(f"⚠️ Error collecting system metrics: {e}")
-                    time.sleep(60)
-
-        # Запускаем в отдельном потоке
-        thread = threading.Thread(target=collect_metrics, daemon=True)
-        thread.start()
-        print("📊 System metrics collection started")
-
-    def record_transcription_complete(self, file_uuid: str, data: Dict[str, Any]) -> bool:
-        """Запись завершения транскрипции с метриками"""
-        try:
-            # Обновляем запись транскрипции
-            success = self.repository.update_transcription_record(file_uuid, {
-                **data,
-                'completed_at': datetime.now(timezone.utc),
-                'status': 'completed'
-            })
-
-            if success and 'processing_time' in data:
-                # Добавляем метрику производительности
-                self.add_performance_metric(file_uuid, 'transcription_time', data['processing_time'])
-
-                # Добавляем системные метрики для этой транскрипции
-                self._add_transcription_system_metrics(file_uuid, data)
-
-            return success
-
-        except Exception as e:
-            logger.error(f"Error recording transcription complete: {e}")
-            return False
-
-    def _add_transcription_system_metrics(self, data: Dict[str, Any]):
-        """Добавление системных метрик для конкретной транскрипции"""
-        try:
-            import psutil
-
-            # Собираем метрики во время транскрипции
-            cpu_percent = psutil.cpu_percent(interval=None)
-            memory = psutil.virtual_memory()
-
-            system_metrics = [
-                {
-                    'metric_type': 'transcription_cpu_usage',
-                    'metric_value': cpu_percent,
-                    'service': 'transcription'
-                },
-                {
-                    'metric_type': 'transcription_memory_usage',
-                    'metric_value': memory.percent,
-                    'service': 'transcription'
-                },
-                {
-                    'metric_type': 'text_length',
-                    'metric_value': data.get('text_length', 0),
-                    'service': 'transcription'
-                },
-                {
-                    'metric_type': 'processing_time',
-                    'metric_value': data.get('processing_time', 0),
-                    'service': 'transcription'
-                }
-            ]
-
-            for metric in system_metrics:
-                self.repository.add_system_metric(metric)
-
-        except Exception as e:
-            logger.error(f"Error adding transcription system metrics: {e}")
 
     def get_system_overview(self) -> Dict[str, Any]:
         """Полный обзор системы на реальных данных"""
@@ -126,8 +23,10 @@ class AnalyticsService:
                 'language_distribution': self.get_language_distribution(),
                 'success_rate': self.get_success_rate(7),
                 'performance_metrics': self.get_performance_metrics(24),
+                'latency_percentiles': self.get_latency_percentiles(24),
                 'system_metrics': self.get_system_metrics(24),
-                'top_words': self.get_top_words(20, 30),
+                'top_words': self.get_top_words(20),
+                'recent_top_words': self.get_recent_top_words(20),
                 'recent_transcriptions': self.get_recent_transcriptions(10),
                 'total_transcriptions': self._get_total_count(),
                 'timestamp': datetime.now(timezone.utc).isoformat()
@@ -169,22 +68,49 @@ class AnalyticsService:
             logger.error(f"Error getting performance metrics: {e}")
             return {}
 
+    def get_latency_percentiles(self, hours: int = 24):
+        """p50/p90/p99 по этапам пайплайна с разбивкой по модели, языку и длительности"""
+        try:
+            rows = [(
+                (row['stage'], row['model'], row['language'], row['duration_bucket']),
+                LatencyHistogram(row['counts'], row['total'], row['min_value'], row['max_value'])
+            ) for row in self.repository.get_latency_histograms(hours)]
+            return summarize_histograms(rows)
+        except Exception as e:
+            logger.error(f"Error getting latency percentiles: {e}")
+            return {}
+
     def get_system_metrics(self, hours: int = 24):
-        """Системные метрики"""
+        """Системные метрики: история из БД, текущие значения из буфера сборщика"""
         try:
-            return self.repository.get_system_metrics(hours)
+            metrics = self.repository.get_system_metrics(hours, settings.SYSTEM_METRICS_RAW_RETENTION_HOURS)
+
+            latest = system_metrics_collector.latest()
+            if latest:
+                metrics['current_cpu'] = round(latest['cpu_usage'], 1)
+                metrics['current_memory'] = round(latest['memory_usage'], 1)
+                metrics['memory_available_mb'] = round(latest['memory_available'], 0)
+                metrics['recent'] = system_metrics_collector.recent(settings.SYSTEM_METRICS_RECENT_SECONDS)
+            return metrics
         except Exception as e:
             logger.error(f"Error getting system metrics: {e}")
             return {}
 
     def get_top_words(self, limit: int = 20, min_length: int = 3):
-        """Самые частые слова"""
+        """Самые частые слова: из рейтинга в Redis, без него - из снимка word_totals"""
         try:
+            top_words = word_leaderboard.top(limit, min_length=min_length)
+            if top_words is not None:
+                return top_words
             return self.repository.get_top_words(limit, min_length)
         except Exception as e:
             logger.error(f"Error getting top words: {e}")
             return []
 
+    def get_recent_top_words(self, limit: int = 20):
+        """Самые частые слова за последние WORD_LEADERBOARD_WINDOW_HOURS часов (только с Redis)"""
+        return word_leaderboard.top_recent(limit) or []
+
     def get_recent_transcriptions(self, limit: int = 10):
         """Последние транскрипции"""
         try:
@@ -201,26 +127,6 @@ class AnalyticsService:
             logger.error(f"Error getting total count: {e}")
             return {'total': 0, 'completed': 0, 'failed': 0}
 
-    def record_transcription_start(self, data: Dict[str, Any]) -> str:
-        """Запись начала транскрипции"""
-        try:
-            return self.repository.create_transcription_record(data)
-        except Exception as e:
-            logger.error(f"Error recording transcription start: {e}")
-            return ""
-
-    def record_transcription_error(self, file_uuid: str, error_message: str) -> bool:
-        """Запись ошибки транскрипции"""
-        try:
-            return self.repository.update_transcription_record(file_uuid, {
-                'status': 'failed',
-                'error_message': error_message,
-                'completed_at': datetime.now(timezone.utc)
-            })
-        except Exception as e:
-            logger.error(f"Error recording transcription error: {e}")
-            return False
-
     def add_word_statistics(self, file_uuid: str, word_stats: list) -> bool:
         """Добавление статистики слов"""
         try:
@@ -228,11 +134,3 @@ class AnalyticsService:
         except Exception as e:
             logger.error(f"Error adding word statistics: {e}")
             return False
-
-    def add_performance_metric(self, file_uuid: str, metric_type: str, value: float) -> bool:
-        """Добавление метрики производительности"""
-        try:
-            return self.repository.add_performance_metric(file_uuid, metric_type, value)
-        except Exception as e:
-            logger.error(f"Error adding performance metric: {e}")
-            return False
\ No newline at end of file
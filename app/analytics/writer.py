@@ -0,0 +1,252 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import asdict
+from typing import Deque, Dict, List, Optional
+
+from app.analytics.events import (
+    AnalyticsEvent,
+    TranscriptionStarted,
+    TranscriptionCompleted,
+    TranscriptionFailed,
+    WordStatisticsRecorded,
+    PerformanceMetricRecorded
+)
+from app.analytics.keywords import keyword_index
+from app.analytics.leaderboard import word_leaderboard
+from app.config import settings
+from app.tracing import trace
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsWriter:
+    """
+    Фоновая запись событий аналитики.
+
+    emit() только кладет событие в ограниченную очередь процесса, поток
+    writer-а собирает события в пачки (до batch_size или flush_interval
+    секунд) и пишет каждую пачку одной транзакцией.
+
+    emit() никогда не ждет: его вызывают прямо из обработчиков запросов.
+    Политика переполнения: события жизненного цикла транскрипции (critical)
+    при полной очереди попадают в небольшой резерв (critical_overflow),
+    метрики и статистика слов отбрасываются сразу. Отброшенные события
+    считаются в dropped. Пачка, которую не удалось записать после повтора,
+    теряется.
+    """
+
+    def __init__(self, max_buffer: int, batch_size: int, flush_interval: float, critical_overflow: int = 1000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.critical_overflow = critical_overflow
+        self._queue: "queue.Queue[AnalyticsEvent]" = queue.Queue(maxsize=max_buffer)
+        # Critical события, не поместившиеся в очередь; новее всего, что лежит в очереди
+        self._overflow: Deque[AnalyticsEvent] = deque()
+        # emit() вызывается из многих потоков, счетчики меняются под блокировкой
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped: Counter = Counter()
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'failed_batches': 0
+        }
+
+    def emit(self, event: AnalyticsEvent) -> bool:
+        """Постановка события в очередь без обращения к БД"""
+        if not settings.ANALYTICS_ENABLED:
+            return False
+
+        with self._lock:
+            # Пока резерв не пуст, critical события идут в него, чтобы не обогнать более ранние
+            if event.critical and self._overflow:
+                accepted = self._to_overflow(event)
+            else:
+                try:
+                    self._queue.put_nowait(event)
+                    accepted = True
+                except queue.Full:
+                    accepted = event.critical and self._to_overflow(event)
+
+            if accepted:
+                self.stats['enqueued'] += 1
+                return True
+
+            event_type = type(event).__name__
+            self.dropped[event_type] += 1
+            dropped = dict(self.dropped)
+
+        if sum(dropped.values()) % 100 == 1:
+            print(f"⚠️ Analytics buffer is full, dropping {event_type} events (dropped: {dropped})")
+        return False
+
+    def write_now(self, event: AnalyticsEvent) -> bool:
+        """
+        Синхронная запись события мимо очереди (блокирующий вызов - из
+        обработчиков через to_thread). Нужна, когда следующее событие той же
+        записи пишет буфер другого процесса: в режиме очереди старт должен
+        оказаться в БД раньше, чем воркер запишет завершение.
+        При ошибке событие уходит в очередь как обычно, возвращается False
+        """
+        if not settings.ANALYTICS_ENABLED:
+            return False
+        try:
+            self.write_batch([event])
+            with self._lock:
+                self.stats['written'] += 1
+                self.stats['batches'] += 1
+            return True
+        except Exception as e:
+            logger.error(f"Error writing {type(event).__name__} synchronously: {e}")
+            self.emit(event)
+            return False
+
+    def _to_overflow(self, event: AnalyticsEvent) -> bool:
+        if len(self._overflow) >= self.critical_overflow:
+            return False
+        self._overflow.append(event)
+        return True
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() + len(self._overflow)
+
+    def snapshot_stats(self) -> Dict[str, int]:
+        """Согласованная копия счетчиков для /health"""
+        with self._lock:
+            return {'pending': self.pending, 'dropped': dict(self.dropped), **self.stats}
+
+    def write_batch(self, events: List[AnalyticsEvent], update_word_totals: bool = True):
+        """Запись пачки событий одной транзакцией"""
+        grouped: Dict[type, List[AnalyticsEvent]] = {}
+        for event in events:
+            grouped.setdefault(type(event), []).append(event)
+
+        from app.analytics.repository import AnalyticsRepository
+        from app.database import get_db_session
+
+        # Отдельная трасса пачки: спаны репозитория видны в экспорте трасс
+        with trace(persist=False), get_db_session() as db:
+            repository = AnalyticsRepository(db)
+            # Порядок важен: старт должен попасть в БД раньше завершения
+            repository.insert_transcription_records(
+                [asdict(event) for event in grouped.get(TranscriptionStarted, [])]
+            )
+            repository.complete_transcription_records(
+                [asdict(event) for event in grouped.get(TranscriptionCompleted, [])]
+            )
+            repository.fail_transcription_records(
+                [asdict(event) for event in grouped.get(TranscriptionFailed, [])]
+            )
+            word_rows = _word_rows(events)
+            repository.insert_word_statistics(word_rows, update_totals=update_word_totals)
+            if settings.KEYWORDS_ENABLED:
+                keyword_index.ingest(repository, word_rows)
+            repository.insert_performance_metrics([{
+                'file_uuid': event.file_uuid,
+                'metric_name': event.metric_name,
+                'metric_value': event.value,
+                'created_at': event.created_at
+            } for event in grouped.get(PerformanceMetricRecorded, [])])
+
+    def flush(self) -> int:
+        """Синхронная запись всего, что накопилось в очереди"""
+        written = 0
+        while True:
+            batch = self._take(block=False)
+            if not batch:
+                return written
+            self._write(batch)
+            written += len(batch)
+
+    def start(self):
+        """Запуск потока записи (повторный вызов ничего не делает)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self._thread.start()
+        print("📊 Analytics writer started")
+
+    def stop(self):
+        """Остановка с записью оставшихся событий"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _take(self, block: bool) -> List[AnalyticsEvent]:
+        """Сбор пачки: ждем первое событие, затем добираем до batch_size в пределах flush_interval"""
+        try:
+            first = self._queue.get(timeout=self.flush_interval) if block else self._queue.get_nowait()
+        except queue.Empty:
+            # Резерв заполняется только при полной очереди, но после остановки может остаться один
+            return self._take_overflow(self.batch_size)
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if block and remaining > 0 and not self._stop.is_set():
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        # Резерв новее всего, что было в очереди, поэтому добирается после нее
+        return batch + self._take_overflow(self.batch_size - len(batch))
+
+    def _take_overflow(self, limit: int) -> List[AnalyticsEvent]:
+        with self._lock:
+            return [self._overflow.popleft() for _ in range(min(limit, len(self._overflow)))]
+
+    def _write(self, batch: List[AnalyticsEvent]):
+        # Счетчики слов идут в рейтинг Redis один раз, до повторов записи в БД;
+        # без Redis они ведутся в word_totals как раньше
+        ranked = word_leaderboard.record(_word_rows(batch))
+        for attempt in (1, 2):
+            try:
+                self.write_batch(batch, update_word_totals=not ranked)
+                with self._lock:
+                    self.stats['written'] += len(batch)
+                    self.stats['batches'] += 1
+                return
+            except Exception as e:
+                logger.error(f"Error writing analytics batch (attempt {attempt}): {e}")
+                if attempt == 1:
+                    self._stop.wait(1)
+
+        with self._lock:
+            self.stats['failed_batches'] += 1
+        print(f"❌ Analytics batch of {len(batch)} events lost")
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take(block=True)
+            if batch:
+                self._write(batch)
+
+
+def _word_rows(events: List[AnalyticsEvent]) -> List[Dict]:
+    from app.analytics.repository import aggregate_word_statistics
+
+    return [
+        row
+        for event in events if isinstance(event, WordStatisticsRecorded)
+        for row in aggregate_word_statistics(event.file_uuid, event.words)
+    ]
+
+
+analytics_writer = AnalyticsWriter(
+    max_buffer=settings.ANALYTICS_BUFFER_SIZE,
+    batch_size=settings.ANALYTICS_BATCH_SIZE,
+    flush_interval=settings.ANALYTICS_FLUSH_SECONDS,
+    critical_overflow=settings.ANALYTICS_CRITICAL_OVERFLOW
+)
@@ -1,7 +1,9 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from app.config import settings
+from app.metrics import instrument_engine, instrument_pool, time_checkout
 import contextlib
 
 # Создаем подключение к базе данных
@@ -10,10 +12,15 @@ engine = create_engine(
     pool_pre_ping=True,
     echo=settings.DEBUG,
     pool_recycle=3600,  # Переподключение каждые час
-    pool_size=10,       # Размер пула соединений
-    max_overflow=20     # Максимальное количество соединений
+    pool_size=settings.DB_POOL_SIZE,        # Размер пула соединений
+    max_overflow=settings.DB_MAX_OVERFLOW,  # Соединения сверх пула
+    pool_timeout=settings.DB_POOL_TIMEOUT   # Ожидание свободного соединения
 )
 
+# Время SQL запросов и состояние пула для /metrics
+instrument_engine(engine)
+instrument_pool(engine, "sync", settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+
 # Создаем фабрику сессий
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -22,16 +29,40 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+# Асинхронное подключение (asyncpg) для эндпоинтов FastAPI: ожидание БД
+# не блокирует event loop и другие запросы процесса
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    echo=settings.DEBUG,
+    pool_recycle=3600,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT
+)
+instrument_engine(async_engine.sync_engine)
+instrument_pool(async_engine.sync_engine, "async", settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
 def get_db():
     """
-    Зависимость для FastAPI Dependency Injection
-    Используется в эндпоинтах
+    Зависимость для FastAPI Dependency Injection.
+    Соединение занято до конца запроса, поэтому в долгих эндпоинтах
+    (транскрипция) используйте короткие области get_db_session
     """
     db = SessionLocal()
     try:
+        # Соединение берется сразу, чтобы ожидание пула попало в метрику
+        with time_checkout("sync"):
+            db.connection()
         yield db
     except Exception:
         db.rollback()
@@ -40,6 +71,36 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Асинхронная зависимость для эндпоинтов FastAPI
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            with time_checkout("async"):
+                await db.connection()
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
+
+
+@contextlib.asynccontextmanager
+async def get_async_db_session():
+    """
+    Асинхронный контекстный менеджер с фиксацией транзакции
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            with time_checkout("async"):
+                await db.connection()
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+
 @contextlib.contextmanager
 def get_db_session():
     """
@@ -48,6 +109,8 @@ def get_db_session():
     """
     db = SessionLocal()
     try:
+        with time_checkout("sync"):
+            db.connection()
         yield db
         db.commit()
     except Exception:
@@ -61,7 +124,9 @@ def check_db_connection() -> bool:
     """Проверка подключения к БД"""
     try:
         # Используем контекстный менеджер для безопасного подключения
-        with engine.connect() as conn:
+        with time_checkout("sync"):
+            conn = engine.connect()
+        with conn:
             result = conn.execute(text("SELECT 1"))
             return result.scalar() == 1
     except Exception as e:
@@ -69,6 +134,17 @@ def check_db_connection() -> bool:
         return False
 
 
+async def check_async_db_connection() -> bool:
+    """Проверка подключения к БД через асинхронный пул"""
+    try:
+        async with async_engine.connect() as conn:
+            result = await conn.execute(text("SELECT 1"))
+            return result.scalar() == 1
+    except Exception as e:
+        print(f"❌ Database connection error: {e}")
+        return False
+
+
 def init_db():
     """Инициализация базы данных (создание таблиц)"""
     try:
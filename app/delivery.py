@@ -0,0 +1,450 @@
+"""
+Доставка транскрипций во внешний API и вебхуков через outbox.
+
+Транскрипции сначала сохраняются в таблицу delivery_outbox (в той же БД),
+а фоновый отправитель забирает их пачками и отправляет через общий пул
+keep-alive соединений, повторяя неудачные попытки с экспоненциальной
+задержкой и джиттером. Отправитель можно запустить отдельно:
+    python -m app.delivery
+"""
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import random
+import socket
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import get_db_session
+
+
+@dataclass
+class DeliveryResult:
+    """Результат одной попытки доставки"""
+    id: int
+    ok: bool
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    latency_ms: float = 0.0
+    retryable: bool = True
+
+
+def compute_backoff(attempt: int, base: float, cap: float) -> float:
+    """Экспоненциальная задержка с полным джиттером (attempt начинается с 1)"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+def sign_webhook(secret: str, timestamp: int, body: bytes) -> str:
+    """HMAC-SHA256 подпись тела вебхука (формат заголовка: t=<ts>,v1=<hex>)"""
+    message = f"{timestamp}.".encode("utf-8") + body
+    signature = hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def check_callback_target(url: str) -> Optional[str]:
+    """
+    Защита от SSRF: ValueError, если адрес вебхука ведет во внутреннюю сеть.
+    Хост должен быть в CALLBACK_ALLOWED_HOSTS (если список задан) или
+    разрешаться только в публичные адреса - не loopback, link-local,
+    частные, зарезервированные или multicast.
+    Возвращает проверенный IP, к которому нужно подключаться (см. pin_request),
+    или None для хоста из списка разрешенных
+    """
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    if parsed.scheme not in ("http", "https") or not host:
+        raise ValueError(f"Invalid callback_url: {url}")
+
+    if settings.CALLBACK_ALLOWED_HOSTS:
+        if host not in settings.CALLBACK_ALLOWED_HOSTS:
+            raise ValueError(f"Callback host is not allowed: {host}")
+        return
+
+    try:
+        infos = socket.getaddrinfo(host, parsed.port or (443 if parsed.scheme == "https" else 80),
+                                   proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"Cannot resolve callback host: {host}")
+
+    addresses = []
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"Callback host resolves to a non-public address: {host}")
+        addresses.append(str(address))
+    if not addresses:
+        raise ValueError(f"Cannot resolve callback host: {host}")
+    return addresses[0]
+
+
+def pin_request(request: Dict[str, Any], address: str) -> Dict[str, Any]:
+    """
+    Запрос на уже проверенный IP вместо имени: повторного разрешения DNS
+    при подключении нет, поэтому DNS rebinding не подменит адрес.
+    Имя остается в Host, а для https - в SNI и проверке сертификата
+    """
+    url = httpx.URL(request["url"])
+    extensions = {"sni_hostname": url.host} if url.scheme == "https" else {}
+    return {
+        **request,
+        "url": url.copy_with(host=address),
+        "headers": {**request.get("headers", {}), "Host": url.netloc.decode("ascii")},
+        "extensions": extensions
+    }
+
+
+def is_retryable_status(status_code: int) -> bool:
+    """Ошибки клиента (кроме 408/429) повторять бессмысленно"""
+    return status_code >= 500 or status_code in (408, 429)
+
+
+class OutboxRepository:
+    """Работа с таблицей delivery_outbox"""
+
+    def enqueue(self, db, kind: str, target_url: str, payload: Dict[str, Any]) -> int:
+        """Добавление доставки в outbox"""
+        result = db.execute(text("""
+            INSERT INTO delivery_outbox (kind, target_url, payload, status, next_attempt_at, created_at)
+            VALUES (:kind, :target_url, CAST(:payload AS JSONB), 'pending', NOW(), NOW())
+            RETURNING id
+        """), {
+            'kind': kind,
+            'target_url': target_url,
+            'payload': json.dumps(payload, ensure_ascii=False)
+        })
+        return result.scalar()
+
+    def claim_batch(self, db, batch_size: int, lease_seconds: int,
+                    max_attempts: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Захват пачки готовых к отправке записей.
+        Записи арендуются (next_attempt_at сдвигается на lease_seconds), поэтому
+        несколько отправителей не берут одно и то же, а при падении процесса
+        записи снова станут доступны после окончания аренды.
+
+        Попытка засчитывается при захвате: запись, на которой отправитель
+        падает, после max_attempts аренд переводится в dead
+        """
+        max_attempts = max_attempts or settings.DELIVERY_MAX_ATTEMPTS
+        db.execute(text("""
+            UPDATE delivery_outbox
+            SET status = 'dead', last_error = 'Lease expired without a recorded result'
+            WHERE status = 'pending' AND next_attempt_at <= NOW() AND attempts >= :max_attempts
+        """), {'max_attempts': max_attempts})
+
+        rows = db.execute(text("""
+            UPDATE delivery_outbox
+            SET next_attempt_at = NOW() + make_interval(secs => :lease_seconds),
+                attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM delivery_outbox
+                WHERE status = 'pending' AND next_attempt_at <= NOW()
+                ORDER BY next_attempt_at
+                LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, kind, target_url, payload, attempts
+        """), {'batch_size': batch_size, 'lease_seconds': lease_seconds}).fetchall()
+
+        return [{
+            'id': row[0],
+            'kind': row[1],
+            'target_url': row[2],
+            'payload': row[3] if isinstance(row[3], dict) else json.loads(row[3]),
+            'attempts': row[4]
+        } for row in rows]
+
+    def record_results(self, db, rows: List[Dict[str, Any]], results: List[DeliveryResult]):
+        """Сохранение результатов пачки одним запросом на каждый исход"""
+        # Номер попытки уже увеличен при захвате
+        attempts_by_id = {row['id']: row['attempts'] for row in rows}
+        delivered, retry, dead = [], [], []
+
+        for result in results:
+            attempt = attempts_by_id[result.id]
+            params = {
+                'id': result.id,
+                'attempts': attempt,
+                'status_code': result.status_code,
+                'error': (result.error or '')[:1000] or None,
+                'latency_ms': result.latency_ms
+            }
+            if result.ok:
+                delivered.append(params)
+            elif not result.retryable or attempt >= settings.DELIVERY_MAX_ATTEMPTS:
+                dead.append(params)
+            else:
+                params['delay'] = compute_backoff(
+                    attempt, settings.DELIVERY_BACKOFF_BASE_SECONDS, settings.DELIVERY_BACKOFF_MAX_SECONDS
+                )
+                retry.append(params)
+
+        if delivered:
+            db.execute(text("""
+                UPDATE delivery_outbox
+                SET status = 'delivered', attempts = :attempts, last_status_code = :status_code,
+                    last_error = NULL, latency_ms = :latency_ms, delivered_at = NOW()
+                WHERE id = :id
+            """), delivered)
+        if retry:
+            db.execute(text("""
+                UPDATE delivery_outbox
+                SET attempts = :attempts, last_status_code = :status_code, last_error = :error,
+                    latency_ms = :latency_ms, next_attempt_at = NOW() + make_interval(secs => :delay)
+                WHERE id = :id
+            """), retry)
+        if dead:
+            db.execute(text("""
+                UPDATE delivery_outbox
+                SET status = 'dead', attempts = :attempts, last_status_code = :status_code,
+                    last_error = :error, latency_ms = :latency_ms
+                WHERE id = :id
+            """), dead)
+
+        finished_ids = [params['id'] for params in delivered + dead]
+        if finished_ids:
+            self._record_webhook_metrics(db, finished_ids)
+
+    def _record_webhook_metrics(self, db, ids: List[int]):
+        """Число попыток и задержка доставки завершенных вебхуков в performance_metrics"""
+        db.execute(text("""
+            INSERT INTO performance_metrics (file_uuid, metric_name, metric_value, unit, created_at)
+            SELECT o.payload->>'file_id', m.metric_name, m.metric_value, m.unit, NOW()
+            FROM delivery_outbox o
+            CROSS JOIN LATERAL (VALUES
+                ('webhook_attempts', o.attempts::float, 'count'),
+                ('webhook_delivery_latency',
+                    EXTRACT(EPOCH FROM COALESCE(o.delivered_at, NOW()) - o.created_at)::float, 'seconds'),
+                ('webhook_request_latency', COALESCE(o.latency_ms, 0) / 1000.0, 'seconds')
+            ) AS m(metric_name, metric_value, unit)
+            WHERE o.id = ANY(:ids) AND o.kind = 'webhook'
+        """), {'ids': ids})
+
+    def pending_count(self, db) -> int:
+        """Количество ожидающих доставок"""
+        return db.execute(text(
+            "SELECT COUNT(*) FROM delivery_outbox WHERE status = 'pending'"
+        )).scalar() or 0
+
+
+class DeliveryService:
+    """Фоновый отправитель outbox с общим пулом HTTP соединений"""
+
+    def __init__(self):
+        self.repository = OutboxRepository()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._webhook_client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Общий клиент: соединения переиспользуются между доставками"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=settings.EXTERNAL_API_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.DELIVERY_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.DELIVERY_MAX_CONNECTIONS,
+                    keepalive_expiry=60
+                )
+            )
+        return self._client
+
+    @property
+    def webhook_client(self) -> httpx.AsyncClient:
+        """
+        Клиент вебхуков: запросы идут на проверенный IP (pin_request), поэтому
+        соединения не переиспользуются - TLS-соединение с SNI одного хоста
+        не достанется другому хосту с тем же адресом
+        """
+        if self._webhook_client is None or self._webhook_client.is_closed:
+            self._webhook_client = httpx.AsyncClient(
+                timeout=settings.EXTERNAL_API_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.DELIVERY_MAX_CONNECTIONS,
+                    max_keepalive_connections=0
+                ),
+                trust_env=False
+            )
+        return self._webhook_client
+
+    def enqueue_external_api(self, transcription_id: str, text_content: str) -> bool:
+        """Постановка транскрипции в outbox внешнего API"""
+        payload = {
+            "transcription_id": transcription_id,
+            "text": text_content,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "service": settings.APP_NAME
+        }
+        try:
+            with get_db_session() as db:
+                delivery_id = self.repository.enqueue(db, 'external_api', settings.EXTERNAL_API_URL, payload)
+            print(f"📮 [Delivery] Transcription {transcription_id} queued for external API (#{delivery_id})")
+            return True
+        except Exception as e:
+            print(f"❌ [Delivery] Failed to queue delivery: {e}")
+            return False
+
+    def enqueue_webhook(self, callback_url: str, event: str, data: Dict[str, Any]) -> bool:
+        """Постановка уведомления о завершении транскрипции в outbox"""
+        payload = {
+            "event": event,
+            **data,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "service": settings.APP_NAME
+        }
+        try:
+            with get_db_session() as db:
+                delivery_id = self.repository.enqueue(db, 'webhook', callback_url, payload)
+            print(f"📮 [Delivery] Webhook '{event}' queued for {callback_url} (#{delivery_id})")
+            return True
+        except Exception as e:
+            print(f"❌ [Delivery] Failed to queue webhook: {e}")
+            return False
+
+    def build_request(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Параметры HTTP запроса для записи outbox"""
+        if row['kind'] != 'webhook':
+            return {"url": row['target_url'], "json": row['payload']}
+
+        # Вебхуки подписываются при каждой попытке, чтобы метка времени была свежей
+        body = json.dumps(row['payload'], ensure_ascii=False).encode("utf-8")
+        timestamp = int(time.time())
+        return {
+            "url": row['target_url'],
+            "content": body,
+            "headers": {
+                "Content-Type": "application/json",
+                "X-Webhook-Id": str(row['id']),
+                "X-Webhook-Event": row['payload'].get('event', ''),
+                "X-Webhook-Signature": sign_webhook(settings.WEBHOOK_SECRET, timestamp, body)
+            }
+        }
+
+    async def send(self, row: Dict[str, Any]) -> DeliveryResult:
+        """Одна попытка доставки"""
+        client, request = self.client, self.build_request(row)
+        if row['kind'] == 'webhook':
+            # Адрес проверяется при каждой попытке (DNS мог смениться после приема),
+            # подключение идет ровно к проверенному IP
+            try:
+                address = await asyncio.to_thread(check_callback_target, row['target_url'])
+            except ValueError as e:
+                return DeliveryResult(id=row['id'], ok=False, error=str(e), retryable=False)
+            if address:
+                client, request = self.webhook_client, pin_request(request, address)
+
+        start = time.perf_counter()
+        try:
+            response = await client.post(**request)
+            latency_ms = (time.perf_counter() - start) * 1000
+            if 200 <= response.status_code < 300:
+                return DeliveryResult(id=row['id'], ok=True, status_code=response.status_code, latency_ms=latency_ms)
+            return DeliveryResult(
+                id=row['id'],
+                ok=False,
+                status_code=response.status_code,
+                error=f"HTTP {response.status_code}",
+                latency_ms=latency_ms,
+                retryable=is_retryable_status(response.status_code)
+            )
+        except Exception as e:
+            return DeliveryResult(
+                id=row['id'],
+                ok=False,
+                error=f"{type(e).__name__}: {e}",
+                latency_ms=(time.perf_counter() - start) * 1000
+            )
+
+    async def send_batch(self, rows: List[Dict[str, Any]]) -> List[DeliveryResult]:
+        """Параллельная отправка пачки с ограничением конкурентности"""
+        semaphore = asyncio.Semaphore(settings.DELIVERY_CONCURRENCY)
+
+        async def send_limited(row):
+            async with semaphore:
+                return await self.send(row)
+
+        return await asyncio.gather(*(send_limited(row) for row in rows))
+
+    def _claim(self) -> List[Dict[str, Any]]:
+        with get_db_session() as db:
+            return self.repository.claim_batch(db, settings.DELIVERY_BATCH_SIZE, settings.DELIVERY_LEASE_SECONDS)
+
+    def _record(self, rows, results):
+        with get_db_session() as db:
+            self.repository.record_results(db, rows, results)
+
+    async def process_batch(self) -> int:
+        """Захват, отправка и фиксация одной пачки, возвращает ее размер"""
+        rows = await asyncio.to_thread(self._claim)
+        if not rows:
+            return 0
+
+        results = await self.send_batch(rows)
+        await asyncio.to_thread(self._record, rows, results)
+
+        delivered = sum(1 for result in results if result.ok)
+        print(f"📮 [Delivery] Batch of {len(rows)}: {delivered} delivered, {len(rows) - delivered} failed")
+        return len(rows)
+
+    async def run(self):
+        """Цикл отправителя"""
+        print("📮 [Delivery] Outbox sender started")
+        while True:
+            try:
+                processed = await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ [Delivery] Batch error: {e}")
+                processed = 0
+
+            # Полная пачка - сразу берем следующую, иначе ждем
+            if processed < settings.DELIVERY_BATCH_SIZE:
+                await asyncio.sleep(settings.DELIVERY_POLL_INTERVAL_SECONDS)
+
+    def start(self):
+        """Запуск отправителя в текущем event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Остановка отправителя и закрытие пула соединений"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for client in (self._client, self._webhook_client):
+            if client is not None:
+                await client.aclose()
+        self._client = self._webhook_client = None
+
+
+delivery_service = DeliveryService()
+
+
+if __name__ == "__main__":
+    async def _main():
+        try:
+            await delivery_service.run()
+        finally:
+            await delivery_service.stop()
+
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,363 @@
+"""
+Фоновая очистка диска: квоты и TTL для директорий uploads и outputs.
+
+Запуск отдельно от API:
+    python -m app.janitor
+"""
+import heapq
+import os
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.metrics import JANITOR_FILES_REMOVED, JANITOR_RECLAIMED_BYTES
+from app.redis_client import redis_client
+
+LEASE_KEY = "janitor:lease"
+
+
+@dataclass
+class DirectoryPolicy:
+    """Правила очистки директории"""
+    name: str
+    root: Path
+    quota_bytes: int = 0      # 0 - без квоты
+    ttl_seconds: int = 0      # 0 - без TTL
+    # Доля квоты, до которой освобождаем место при превышении
+    low_watermark: float = 0.9
+    # Файлы, которые нельзя удалять ни по TTL, ни по квоте (путь -> True)
+    protect: Optional[Callable[[str], bool]] = None
+
+
+@dataclass
+class _DirectoryState:
+    """Инкрементальное состояние обхода одной директории-политики"""
+    pending: Deque[Path] = field(default_factory=deque)
+    dir_sizes: Dict[Path, int] = field(default_factory=dict)
+    # Кандидаты на вытеснение: min-куча по -last_access, в вершине самый свежий файл
+    candidates: List[Tuple[float, str, int]] = field(default_factory=list)
+    passes: int = 0
+
+
+class DiskJanitor:
+    """
+    Очистка директорий по TTL и квоте.
+
+    Дерево обходится инкрементально: за цикл сканируется не более
+    JANITOR_DIRS_PER_CYCLE директорий, размеры хранятся по директориям,
+    поэтому полный обход не требуется на каждом цикле. При превышении квоты
+    первыми удаляются файлы, которые дольше всего не скачивали
+    (время последнего доступа = mtime, обновляется при скачивании).
+
+    Очистку выполняет один процесс - владелец аренды в Redis, остальные
+    процессы API только применяют свои отметки о скачиваниях.
+    """
+
+    def __init__(self, policies: List[DirectoryPolicy], dirs_per_cycle: int = 64, max_candidates: int = 10000,
+                 redis=None):
+        self.policies = policies
+        self.redis = redis
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        self.dirs_per_cycle = dirs_per_cycle
+        self.max_candidates = max_candidates
+        self._state = {policy.name: _DirectoryState() for policy in policies}
+        self._accessed: Dict[str, float] = {}
+        self._accessed_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {
+            policy.name: {
+                'reclaimed_bytes_ttl': 0,
+                'reclaimed_bytes_quota': 0,
+                'files_removed': 0,
+                'tracked_bytes': 0,
+                'quota_bytes': policy.quota_bytes,
+                'full_passes': 0
+            } for policy in policies
+        }
+
+    #  Учет доступа
+
+    def record_access(self, file_id: str):
+        """Отметка о скачивании транскрипции (применяется в фоне)"""
+        with self._accessed_lock:
+            self._accessed[file_id] = time.time()
+
+    def _apply_accesses(self):
+        """Обновляем mtime скачанных файлов, чтобы они вытеснялись последними"""
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+
+        if not accessed:
+            return
+
+        from app.transcribition import transcription_service
+
+        for file_id, accessed_at in accessed.items():
+            stored = transcription_service.transcript_store.find(file_id)
+            # Квоты и TTL относятся к локальному диску, общие хранилища не трогаем
+            if stored and stored.path:
+                try:
+                    os.utime(stored.path, (accessed_at, accessed_at))
+                except OSError:
+                    pass
+
+    #  Цикл очистки
+
+    def run_cycle(self) -> Dict[str, int]:
+        """Один инкрементальный проход, возвращает освобожденные байты по директориям"""
+        self._apply_accesses()
+
+        reclaimed = {}
+        for policy in self.policies:
+            state = self._state[policy.name]
+            reclaimed[policy.name] = self._scan(policy, state) + self._enforce_quota(policy, state)
+            self.stats[policy.name]['tracked_bytes'] = sum(state.dir_sizes.values())
+            self.stats[policy.name]['full_passes'] = state.passes
+        return reclaimed
+
+    def _scan(self, policy: DirectoryPolicy, state: _DirectoryState) -> int:
+        """Сканирование следующей порции директорий с удалением просроченных файлов"""
+        if not state.pending:
+            # Новый полный проход: кандидаты собираются заново, чтобы не копить дубликаты
+            if state.dir_sizes:
+                state.passes += 1
+            state.candidates = []
+            state.pending.append(policy.root)
+
+        now = time.time()
+        reclaimed = 0
+
+        for _ in range(self.dirs_per_cycle):
+            if not state.pending:
+                break
+            directory = state.pending.popleft()
+            dir_size = 0
+
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                state.dir_sizes.pop(directory, None)
+                continue
+
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        state.pending.append(Path(entry.path))
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+
+                if policy.ttl_seconds and now - stat.st_mtime > policy.ttl_seconds:
+                    if self._remove(policy, entry.path, "ttl"):
+                        reclaimed += stat.st_size
+                        continue
+
+                dir_size += stat.st_size
+                self._add_candidate(state, stat.st_mtime, entry.path, stat.st_size)
+
+            state.dir_sizes[directory] = dir_size
+
+        if reclaimed:
+            self.stats[policy.name]['reclaimed_bytes_ttl'] += reclaimed
+            JANITOR_RECLAIMED_BYTES.labels(policy.name, "ttl").inc(reclaimed)
+            print(f"🧹 [Janitor] {policy.name}: removed expired files, reclaimed {reclaimed} bytes")
+        return reclaimed
+
+    def _add_candidate(self, state: _DirectoryState, last_access: float, path: str, size: int):
+        """Ограниченная куча самых давно не скачиваемых файлов"""
+        item = (-last_access, path, size)
+        if len(state.candidates) < self.max_candidates:
+            heapq.heappush(state.candidates, item)
+        elif item > state.candidates[0]:
+            heapq.heapreplace(state.candidates, item)
+
+    def _enforce_quota(self, policy: DirectoryPolicy, state: _DirectoryState) -> int:
+        """Вытеснение давно не скачиваемых файлов при превышении квоты"""
+        if not policy.quota_bytes:
+            return 0
+
+        total = sum(state.dir_sizes.values())
+        if total <= policy.quota_bytes:
+            return 0
+
+        target = policy.quota_bytes * policy.low_watermark
+        # Самые старые - с наибольшим -last_access, т.е. в конце отсортированного списка
+        victims = sorted(state.candidates)
+        reclaimed = 0
+
+        while victims and total > target:
+            neg_access, path, size = victims.pop()
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            # Файл скачали после сканирования - не трогаем
+            if stat.st_mtime > -neg_access:
+                continue
+            if self._remove(policy, path, "quota"):
+                total -= stat.st_size
+                reclaimed += stat.st_size
+                parent = Path(path).parent
+                if parent in state.dir_sizes:
+                    state.dir_sizes[parent] = max(state.dir_sizes[parent] - stat.st_size, 0)
+
+        state.candidates = victims
+        heapq.heapify(state.candidates)
+
+        if reclaimed:
+            self.stats[policy.name]['reclaimed_bytes_quota'] += reclaimed
+            JANITOR_RECLAIMED_BYTES.labels(policy.name, "quota").inc(reclaimed)
+            print(f"🧹 [Janitor] {policy.name}: over quota, evicted {reclaimed} bytes")
+        return reclaimed
+
+    def _remove(self, policy: DirectoryPolicy, path: str, reason: str) -> bool:
+        """Удаление файла (reason - ttl или quota)"""
+        if policy.protect and policy.protect(path):
+            return False
+        try:
+            os.remove(path)
+            self.stats[policy.name]['files_removed'] += 1
+            JANITOR_FILES_REMOVED.labels(policy.name, reason).inc()
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"⚠️ [Janitor] Could not remove {path}: {e}")
+            return False
+
+    def _export_metrics(self, reclaimed: Dict[str, int]):
+        """
+        Запись освобожденного места в system_metrics одним запросом
+        (счетчики Prometheus обновляются сразу при удалении)
+        """
+        if not settings.ANALYTICS_ENABLED or not any(reclaimed.values()):
+            return
+
+        from app.analytics.repository import AnalyticsRepository
+        from app.database import get_db_session
+
+        try:
+            with get_db_session() as db:
+                AnalyticsRepository(db).add_system_metrics([{
+                    'metric_type': f'janitor_reclaimed_bytes_{name}',
+                    'metric_value': value,
+                    'service': 'janitor'
+                } for name, value in reclaimed.items() if value])
+        except Exception as e:
+            print(f"⚠️ [Janitor] Error exporting metrics: {e}")
+
+    #  Фоновый поток
+
+    def start(self):
+        """Запуск фонового потока очистки"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="disk-janitor", daemon=True)
+        self._thread.start()
+        print("🧹 [Janitor] Disk janitor started")
+
+    def stop(self):
+        """Остановка фонового потока"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _acquire_lease(self) -> bool:
+        """Аренда очистки: один процесс сканирует и удаляет, пока продлевает аренду"""
+        client = self.redis.redis_client if self.redis else None
+        if not client:
+            return True
+        ttl = max(int(settings.JANITOR_INTERVAL_SECONDS) * 3, 30)
+        try:
+            if client.set(LEASE_KEY, self.owner, nx=True, ex=ttl):
+                return True
+            if client.get(LEASE_KEY) == self.owner:
+                client.expire(LEASE_KEY, ttl)
+                return True
+            return False
+        except Exception as e:
+            print(f"⚠️ [Janitor] Lease error: {e}")
+            return False
+
+    def _release_lease(self):
+        client = self.redis.redis_client if self.redis else None
+        if not client:
+            return
+        try:
+            if client.get(LEASE_KEY) == self.owner:
+                client.delete(LEASE_KEY)
+        except Exception as e:
+            print(f"⚠️ [Janitor] Lease release error: {e}")
+
+    def tick(self) -> Optional[Dict[str, int]]:
+        """Цикл фонового потока (None - очистку выполняет другой процесс)"""
+        if not self._acquire_lease():
+            self._apply_accesses()
+            return None
+        reclaimed = self.run_cycle()
+        self._export_metrics(reclaimed)
+        return reclaimed
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"⚠️ [Janitor] Cycle error: {e}")
+            self._stop.wait(settings.JANITOR_INTERVAL_SECONDS)
+        self._release_lease()
+
+
+def upload_in_flight(path: str) -> bool:
+    """Загрузка ждет воркера или обрабатывается (режим очереди)"""
+    if not settings.QUEUE_ENABLED:
+        return False
+
+    from app.job_queue import transcription_queue
+
+    # Имя загрузки - {file_id}{расширение}
+    return transcription_queue.is_active(Path(path).stem)
+
+
+def build_default_policies() -> List[DirectoryPolicy]:
+    """Политики для uploads и outputs из настроек"""
+    return [
+        DirectoryPolicy(
+            name="uploads",
+            root=settings.upload_dir_path,
+            quota_bytes=settings.UPLOAD_QUOTA_MB * 1024 * 1024,
+            ttl_seconds=settings.UPLOAD_TTL_HOURS * 3600,
+            protect=upload_in_flight
+        ),
+        DirectoryPolicy(
+            name="outputs",
+            root=settings.output_dir_path,
+            quota_bytes=settings.OUTPUT_QUOTA_MB * 1024 * 1024,
+            ttl_seconds=settings.OUTPUT_TTL_DAYS * 24 * 3600
+        ),
+    ]
+
+
+disk_janitor = DiskJanitor(
+    build_default_policies(),
+    dirs_per_cycle=settings.JANITOR_DIRS_PER_CYCLE,
+    max_candidates=settings.JANITOR_MAX_CANDIDATES,
+    redis=redis_client
+)
+
+
+if __name__ == "__main__":
+    print("🧹 [Janitor] Running standalone, press Ctrl+C to stop")
+    try:
+        disk_janitor._run()
+    except KeyboardInterrupt:
+        disk_janitor._release_lease()
@@ -0,0 +1,184 @@
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+
+from app.config import settings
+from app.redis_client import AsyncRedisClient, RedisClient, async_redis_client, redis_client
+
+Message = Tuple[str, Dict[str, str]]
+
+
+class TranscriptionQueue:
+    """
+    Очередь задач транскрипции на Redis Streams.
+
+    API добавляет задачи в поток, воркеры читают их через consumer group,
+    подтверждают (XACK) после обработки и забирают (XAUTOCLAIM) сообщения,
+    зависшие у упавших воркеров.
+    """
+
+    def __init__(self, client: RedisClient, async_client: Optional[AsyncRedisClient] = None):
+        self.client = client
+        self.async_client = async_client
+        self.stream = settings.QUEUE_STREAM
+        self.group = settings.QUEUE_GROUP
+        self.dead_letter_stream = f"{settings.QUEUE_STREAM}:dead"
+        self._group_ready = False
+
+    @property
+    def redis(self) -> Optional[redis.Redis]:
+        return self.client.redis_client
+
+    @property
+    def available(self) -> bool:
+        return self.redis is not None
+
+    def ensure_group(self):
+        """Создание consumer group (и самого потока), если их еще нет"""
+        if self._group_ready or not self.available:
+            return
+        try:
+            self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+            print(f"✅ [Queue] Consumer group '{self.group}' created on '{self.stream}'")
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def enqueue(self, job: Dict[str, Any]) -> Optional[str]:
+        """Постановка задачи в очередь, возвращает ID сообщения"""
+        if not self.available:
+            return None
+
+        try:
+            self.ensure_group()
+            message_id = self.redis.xadd(
+                self.stream,
+                {
+                    "payload": json.dumps(job),
+                    "enqueued_at": datetime.now(timezone.utc).isoformat()
+                },
+                maxlen=settings.QUEUE_MAXLEN,
+                approximate=True
+            )
+            self.set_job_status(job["file_id"], "queued", message_id=message_id)
+            print(f"📬 [Queue] Job {job['file_id']} enqueued as {message_id}")
+            return message_id
+        except Exception as e:
+            print(f"❌ [Queue] Enqueue error: {e}")
+            return None
+
+    def read(self, consumer: str, count: int = 1, block_ms: int = 5000) -> List[Message]:
+        """Чтение новых сообщений для воркера"""
+        self.ensure_group()
+        response = self.redis.xreadgroup(
+            self.group, consumer, {self.stream: ">"}, count=count, block=block_ms
+        )
+        messages = []
+        for _stream, entries in response or []:
+            messages.extend(entries)
+        return messages
+
+    def reclaim_stale(self, consumer: str, min_idle_ms: int, count: int = 10) -> List[Message]:
+        """Забираем сообщения, которые слишком долго висят без подтверждения"""
+        self.ensure_group()
+        response = self.redis.xautoclaim(
+            self.stream, self.group, consumer, min_idle_ms, start_id="0-0", count=count
+        )
+        # Redis 7 возвращает [next_id, messages, deleted_ids], Redis 6.2 - [next_id, messages]
+        messages = response[1] if len(response) > 1 else []
+        # Удаленные из потока сообщения приходят как None
+        return [(message_id, fields) for message_id, fields in messages if fields]
+
+    def heartbeat(self, consumer: str, message_id: str):
+        """Сброс времени простоя сообщения, чтобы его не забрали у живого воркера"""
+        self.redis.xclaim(self.stream, self.group, consumer, 0, [message_id], justid=True)
+
+    def ack(self, message_id: str):
+        """Подтверждение обработки сообщения"""
+        self.redis.xack(self.stream, self.group, message_id)
+
+    def delivery_count(self, message_id: str) -> int:
+        """Сколько раз сообщение уже выдавалось воркерам"""
+        pending = self.redis.xpending_range(
+            self.stream, self.group, min=message_id, max=message_id, count=1
+        )
+        return pending[0]["times_delivered"] if pending else 0
+
+    def dead_letter(self, message_id: str, fields: Dict[str, str], reason: str):
+        """Перенос сообщения в dead-letter поток и подтверждение оригинала"""
+        self.redis.xadd(
+            self.dead_letter_stream,
+            {**fields, "original_id": message_id, "reason": reason},
+            maxlen=settings.QUEUE_MAXLEN,
+            approximate=True
+        )
+        self.ack(message_id)
+
+    def set_job_status(self, file_id: str, status: str, **extra) -> bool:
+        """Сохранение статуса задачи"""
+        if not self.available:
+            return False
+
+        try:
+            key = f"job:{file_id}"
+            mapping = {
+                "status": status,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                **{k: str(v) for k, v in extra.items() if v is not None}
+            }
+            pipe = self.redis.pipeline()
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, settings.QUEUE_JOB_STATUS_TTL)
+            pipe.execute()
+            return True
+        except Exception as e:
+            print(f"❌ [Queue] Status update error: {e}")
+            return False
+
+    def get_job_status(self, file_id: str) -> Optional[Dict[str, str]]:
+        """Получение статуса задачи"""
+        if not self.available:
+            return None
+
+        try:
+            status = self.redis.hgetall(f"job:{file_id}")
+            return status or None
+        except Exception as e:
+            print(f"❌ [Queue] Status read error: {e}")
+            return None
+
+    def is_active(self, file_id: str) -> bool:
+        """Задача ждет воркера или обрабатывается"""
+        if not self.available:
+            return False
+
+        try:
+            return self.redis.hget(f"job:{file_id}", "status") in ("queued", "processing")
+        except Exception as e:
+            print(f"❌ [Queue] Status read error: {e}")
+            # Статус неизвестен - безопаснее считать задачу активной
+            return True
+
+    async def get_job_status_async(self, file_id: str) -> Optional[Dict[str, str]]:
+        """Получение статуса задачи из обработчиков API (без блокировки event loop)"""
+        if self.async_client is None:
+            return self.get_job_status(file_id)
+        return await self.async_client.hgetall(f"job:{file_id}") or None
+
+    def depth(self) -> Dict[str, int]:
+        """Длина потока и количество неподтвержденных сообщений"""
+        if not self.available:
+            return {"length": 0, "pending": 0}
+
+        self.ensure_group()
+        summary = self.redis.xpending(self.stream, self.group)
+        return {
+            "length": self.redis.xlen(self.stream),
+            "pending": summary.get("pending", 0) if summary else 0
+        }
+
+
+transcription_queue = TranscriptionQueue(redis_client, async_redis_client)
@@ -1,27 +1,114 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, status, Depends
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, status, Depends, Request, Query
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+import asyncio
+import os
+import time
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
 import traceback
 
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
 
-from app.analytics.service import AnalyticsService
+from app.analytics.async_repository import AsyncAnalyticsRepository
+from app.analytics.collector import system_metrics_collector
+from app.analytics.export import EXPORT_FORMATS, ExportError, analytics_exporter
+from app.analytics.events import TranscriptionStarted
+from app.analytics.histograms import latency_histograms
+from app.analytics.leaderboard import word_leaderboard
+from app.analytics.olap import REPORTS, OlapUnavailable, olap_query_service, parquet_snapshotter
+from app.analytics.overview_cache import overview_cache
+from app.analytics.partitions import system_metrics_maintenance
+from app.analytics.writer import analytics_writer
 from app.config import settings
-from app.models import TranscriptionResponse, ErrorResponse
+from app.models import TranscriptionResponse, TranscriptionListResponse, SearchResponse, ErrorResponse
 from app.transcribition import transcription_service
-from app.database import get_db, check_db_connection, engine
-from app.redis_client import redis_client
+from app.database import get_async_db, async_engine
+from app.redis_client import async_redis_client
+from app.job_queue import transcription_queue
+from app.pipeline import (
+    get_audio_duration, transcribe_with_fallback, finalize_transcription,
+    record_transcription_error, validate_callback_url, notify_callback
+)
+from app.tracing import start_trace, end_trace, span, apply_trace_headers
+from app.storage import RangeNotSatisfiable, parse_accept_encoding, parse_byte_range, content_etag, etag_matches
+from app.janitor import disk_janitor
+from app.delivery import delivery_service
+from app.metrics import (
+    HTTP_REQUESTS, HTTP_REQUEST_DURATION, INFLIGHT_JOBS, UPLOAD_BYTES,
+    mark_process_dead, record_cache, render_metrics
+)
+
+# Транскрипция после сохранения не меняется
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и остановка фоновых сервисов процесса"""
+    await async_redis_client.check()
+    if settings.SYSTEM_METRICS_ENABLED:
+        system_metrics_collector.start()
+    if settings.ANALYTICS_ENABLED:
+        analytics_writer.start()
+        overview_cache.start()
+        latency_histograms.start()
+        word_leaderboard.start()
+    if settings.SYSTEM_METRICS_ENABLED or settings.ANALYTICS_ENABLED:
+        # Секции нужны сборщику даже с выключенной аналитикой
+        system_metrics_maintenance.start()
+    if settings.OLAP_SNAPSHOT_ENABLED:
+        parquet_snapshotter.start()
+    if settings.JANITOR_ENABLED:
+        disk_janitor.start()
+    if settings.DELIVERY_ENABLED:
+        delivery_service.start()
+
+    yield
+
+    await delivery_service.stop()
+    disk_janitor.stop()
+    overview_cache.stop()
+    system_metrics_maintenance.stop()
+    parquet_snapshotter.stop()
+    latency_histograms.stop()
+    system_metrics_collector.stop()
+    analytics_writer.stop()
+    word_leaderboard.stop()
+    await async_engine.dispose()
+    await async_redis_client.close()
+    mark_process_dead(os.getpid())
+
 
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.VERSION,
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    lifespan=lifespan
 )
 
+@app.middleware("http")
+async def prometheus_middleware(request: Request, call_next):
+    """Счетчики и задержки HTTP запросов по шаблону маршрута"""
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = route.path if route else "unmatched"
+        HTTP_REQUESTS.labels(request.method, route_path, str(status_code)).inc()
+        HTTP_REQUEST_DURATION.labels(request.method, route_path).observe(time.perf_counter() - started)
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -39,7 +126,9 @@ async def root():
         "endpoints": {
             "transcribe": "POST /transcribe",
             "download": "GET /transcriptions/{file_id}/download",
-            "health": "GET /health"
+            "status": "GET /transcriptions/{file_id}/status",
+            "health": "GET /health",
+            "metrics": "GET /metrics"
         }
     }
 
@@ -47,15 +136,18 @@ async def root():
 @app.post("/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(
         background_tasks: BackgroundTasks,
+        response: Response,
         file: UploadFile = File(..., description="Audio file to transcribe"),
         language: str = Form("ru", description="Language code (e.g., 'ru', 'en')"),
-        db: Session = Depends(get_db)
+        callback_url: Optional[str] = Form(None, description="URL for a signed completion webhook")
 ):
     """
     Транскрибирование аудиофайла в текст
     """
     file_id = None
-    analytics_service = None
+    finalized = False
+    request_started = time.perf_counter()
+    request_trace, trace_token = start_trace()
 
     try:
         print(f"\n🎤 Starting transcription request")
@@ -91,12 +183,19 @@ async def transcribe_audio(
                 detail=error_msg
             )
 
+        try:
+            callback_url = await asyncio.to_thread(validate_callback_url, callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
         # Генерируем ID для транскрипции
         transcription_id = str(uuid.uuid4())
         print(f"Transcription ID: {transcription_id}")
 
-        file_content = await file.read()
+        with span("upload_read"):
+            file_content = await file.read()
         file_size = len(file_content)
+        UPLOAD_BYTES.inc(file_size)
         print(f"📏 File size: {file_size} bytes")
 
         import tempfile
@@ -111,143 +210,106 @@ async def transcribe_audio(
 
         # Сохраняем загруженный файл
         audio_path, file_id = await transcription_service.save_upload_file(file)
+        request_trace.file_id = file_id
         print(f"✅ File saved. File ID: {file_id}, Path: {audio_path}")
 
         # Удаляем временный файл
         if os.path.exists(temp_path):
             os.unlink(temp_path)
 
-        analytics_service = AnalyticsService(db)
-        if settings.ANALYTICS_ENABLED and analytics_service:
-            try:
-                print(f"📊 Attempting to record transcription start for file_id: {file_id}")
-
-                from pydub import AudioSegment
-                try:
-                    audio = AudioSegment.from_file(audio_path)
-                    duration = len(audio) / 1000.0  # в секундах
-                    print(f"⏱️ Audio duration: {duration:.2f} seconds")
-                except Exception as e:
-                    print(f"⚠️ Could not get audio duration: {e}")
-                    duration = 0.0
-
-                record_data = {
-                    'file_uuid': file_id,
-                    'filename': filename,
-                    'file_size': file_size,
-                    'duration': duration,
-                    'language': language,
-                    'transcription_id': transcription_id
-                }
-                print(f"📊 Record data: {record_data}")
-
-                # Сохраняем запись и получаем ID
-                record_uuid = analytics_service.record_transcription_start(record_data)
-                print(f"📊 Database record created: UUID={record_uuid}")
-
-            except Exception as e:
-                print(f"❌ Failed to record start in database: {e}")
-                traceback.print_exc()
+        # В режиме очереди длительность определяет воркер
+        duration = 0.0 if settings.QUEUE_ENABLED else await asyncio.to_thread(get_audio_duration, audio_path, language)
+
+        if settings.ANALYTICS_ENABLED:
+            started_event = TranscriptionStarted(
+                file_uuid=file_id,
+                filename=filename,
+                file_size=file_size,
+                duration=duration,
+                language=language,
+                model=settings.WHISPER_MODEL,
+                transcription_id=transcription_id
+            )
+            if settings.QUEUE_ENABLED:
+                # Завершение пишет буфер воркера: запись старта должна быть в БД
+                # до постановки задачи, иначе UPDATE завершения не найдет строку
+                await asyncio.to_thread(analytics_writer.write_now, started_event)
+                print(f"📊 Transcription start recorded for analytics: {file_id}")
+            else:
+                analytics_writer.emit(started_event)
+                print(f"📊 Transcription start queued for analytics: {file_id}")
         else:
             print("📊 Analytics is disabled, skipping database recording")
 
+        # Создаем URL для скачивания
+        download_url = f"/transcriptions/{file_id}/download"
+        print(f"🔗 Download URL: {download_url}")
+
+        # Режим очереди: инференс выполняет воркер, API только ставит задачу
+        if settings.QUEUE_ENABLED:
+            # XADD синхронного клиента - в пуле потоков, event loop не ждет Redis
+            message_id = await asyncio.to_thread(transcription_queue.enqueue, {
+                'file_id': file_id,
+                'transcription_id': transcription_id,
+                'audio_file': audio_path.name,
+                'filename': filename,
+                'language': language,
+                'callback_url': callback_url
+            })
+            if not message_id:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Transcription queue is unavailable"
+                )
+
+            apply_trace_headers(response, request_trace)
+            return TranscriptionResponse(
+                status="queued",
+                message="Audio queued for transcription",
+                transcription_id=transcription_id,
+                filename=filename,
+                text_length=0,
+                download_url=download_url,
+                status_url=f"/transcriptions/{file_id}/status",
+                external_api_status="pending" if settings.EXTERNAL_API_ENABLED else None,
+                created_at=datetime.now(timezone.utc)
+            )
+
         # Транскрибируем аудио
-        text = ""
         start_time = datetime.now(timezone.utc)
 
         try:
-            text = transcription_service.transcribe_audio(audio_path, language)
-            print(f"✅ Transcription completed. Text length: {len(text)} chars")
-
-            # Если текст пустой, пробуем другой язык
-            if not text or len(text.strip()) == 0:
-                print(f"⚠️ Текст пустой! Пробуем автоопределение языка...")
-                try:
-                    # Пробуем без указания языка
-                    text = transcription_service.transcribe_audio(audio_path, "auto")
-                    print(f"🔁 Результат с автоопределением: {len(text)} chars")
-
-                    # Если все еще пусто
-                    if not text or len(text.strip()) == 0:
-                        print(f"⚠️ Все еще пусто! Пробуем английский...")
-                        text = transcription_service.transcribe_audio(audio_path, "en")
-                        print(f"🔁 Результат на английском: {len(text)} chars")
-
-                        # Если все еще пусто, создаем сообщение об ошибке
-                        if not text or len(text.strip()) == 0:
-                            text = "Текст не распознан. Возможно, аудио слишком тихое, поврежденное или содержит только музыку/шум."
-                except Exception as e:
-                    print(f"⚠️ Ошибка при повторной попытке транскрипции: {e}")
-                    text = "Ошибка транскрипции. Проверьте аудиофайл."
-
+            with INFLIGHT_JOBS.track_inprogress():
+                # Инференс в пуле потоков: event loop продолжает обслуживать другие запросы
+                text = await asyncio.to_thread(transcribe_with_fallback, transcription_service, audio_path, language)
         except Exception as e:
             print(f"❌ Transcription error: {e}")
-            if settings.ANALYTICS_ENABLED and file_id and analytics_service:
-                try:
-                    analytics_service.record_transcription_error(file_id, str(e))
-                except Exception:
-                    pass
+            record_transcription_error(file_id, str(e))
+            await asyncio.to_thread(notify_callback, callback_url, "transcription.failed", {
+                'file_id': file_id,
+                'transcription_id': transcription_id,
+                'status': 'failed',
+                'error': str(e)
+            })
             raise HTTPException(status_code=500, detail=str(e))
 
         # Рассчитываем время обработки
         processing_time = (datetime.now(timezone.utc) - start_time).total_seconds()
 
-        # Завершение транскрипции
-        if settings.ANALYTICS_ENABLED and analytics_service and file_id:
-            try:
-                print(f"📊 Attempting to record transcription completion for file_uuid: {file_id}")
-
-                success = analytics_service.record_transcription_complete(file_id, {
-                    'text_length': len(text),
-                    'processing_time': processing_time,
-                    'confidence_score': 0.95,
-                    'status': 'completed'
-                })
-                if success:
-                    print(f"📊 Database updated with completion")
-                else:
-                    print(f"⚠️ Failed to update database with completion (no rows affected)")
-            except Exception as e:
-                print(f"⚠️ Failed to record completion in database: {e}")
-                traceback.print_exc()
-        else:
-            print("📊 Analytics is disabled, skipping database update")
-
-        # Статистика слов
-        if settings.ANALYTICS_ENABLED and text and len(text.strip()) > 0 and analytics_service and file_id:
-            try:
-                import re
-                words = re.findall(r'\b\w+\b', text.lower())
-                from collections import Counter
-                word_counts = Counter(words)
-
-                word_stats = [{
-                    'word': word,
-                    'count': count,
-                    'language': language
-                } for word, count in word_counts.items() if len(word) > 2]
-
-                if word_stats:
-                    analytics_service.add_word_statistics(file_id, word_stats)
-                    print(f"📊 Added {len(word_stats)} word statistics")
-            except Exception as e:
-                print(f"⚠️ Error collecting word statistics: {e}")
-
-        # Добавляем метрику производительности
-        if settings.ANALYTICS_ENABLED and analytics_service and file_id:
-            try:
-                analytics_service.add_performance_metric(file_id, 'transcription_time', processing_time)
-                print(f"📊 Added performance metric: transcription_time = {processing_time:.2f}s")
-            except Exception as e:
-                print(f"⚠️ Error adding performance metric: {e}")
-
-        # Сохраняем текст в файл
-        text_file_path = transcription_service.save_transcription_text(file_id, text)
-        print(f"💾 Text saved to: {text_file_path}")
+        # Аналитика завершения и сохранение текста
+        await asyncio.to_thread(
+            finalize_transcription,
+            transcription_service, file_id, text, language, processing_time, duration
+        )
+        finalized = True
 
-        # Создаем URL для скачивания
-        download_url = f"/transcriptions/{file_id}/download"
-        print(f"🔗 Download URL: {download_url}")
+        await asyncio.to_thread(notify_callback, callback_url, "transcription.completed", {
+            'file_id': file_id,
+            'transcription_id': transcription_id,
+            'status': 'completed',
+            'text_length': len(text),
+            'download_url': download_url
+        })
 
         # Отправляем во внешний API (для симуляции)
         if settings.EXTERNAL_API_ENABLED:
@@ -266,7 +328,7 @@ async def transcribe_audio(
             audio_path
         )
 
-        response = TranscriptionResponse(
+        result = TranscriptionResponse(
             status="success",
             message="Audio successfully transcribed",
             transcription_id=transcription_id,
@@ -277,8 +339,12 @@ async def transcribe_audio(
             created_at=datetime.now(timezone.utc)
         )
 
+        latency_histograms.observe(
+            'end_to_end', time.perf_counter() - request_started, language=language, duration=duration
+        )
+        apply_trace_headers(response, request_trace)
         print(f"✅ Request completed successfully")
-        return response
+        return result
 
     except HTTPException:
         raise
@@ -286,18 +352,32 @@ async def transcribe_audio(
         print(f"❌ Unexpected error: {e}")
         traceback.print_exc()
 
-        # ЗАПИСЬ ОБЩЕЙ ОШИБКИ В БАЗУ
-        if settings.ANALYTICS_ENABLED and file_id and analytics_service:
-            try:
-                print(f"📊 Attempting to record error for file_id: {file_id}")
-                analytics_service.record_transcription_error(file_id, f"Endpoint error: {str(e)}")
-            except Exception as db_error:
-                print(f"⚠️ Failed to record error in database: {db_error}")
+        # Транскрипция уже сохранена и учтена как completed: ошибка после
+        # finalize (callback, фоновые задачи) не переводит запись в failed
+        if not finalized:
+            # ЗАПИСЬ ОБЩЕЙ ОШИБКИ В БАЗУ
+            record_transcription_error(file_id, f"Endpoint error: {str(e)}")
+
+        if file_id and not finalized:
+            await asyncio.to_thread(notify_callback, callback_url, "transcription.failed", {
+                'file_id': file_id,
+                'status': 'failed',
+                'error': str(e)
+            })
 
         raise HTTPException(
             status_code=500,
             detail=f"Transcription failed: {str(e)}"
         )
+    finally:
+        end_trace(request_trace, trace_token)
+
+
+@app.get("/metrics")
+def metrics():
+    """Метрики в формате Prometheus"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 
 @app.get("/health")
@@ -313,8 +393,8 @@ async def health_check():
 
         # Проверка базы данных
         try:
-            with engine.connect() as conn:
-                result = conn.execute(text("SELECT 1"))
+            async with async_engine.connect() as conn:
+                result = await conn.execute(text("SELECT 1"))
                 db_ok = result.scalar() == 1
                 health_data["services"]["database"] = {
                     "status": "connected" if db_ok else "disconnected",
@@ -332,8 +412,8 @@ async def health_check():
         # Проверка Redis
         try:
             if settings.REDIS_ENABLED:
-                if redis_client.redis_client:
-                    redis_ok = redis_client.redis_client.ping()
+                if async_redis_client.redis_client:
+                    redis_ok = await async_redis_client.ping()
                     health_data["services"]["redis"] = {
                         "status": "connected" if redis_ok else "disconnected",
                         "ok": redis_ok,
@@ -381,6 +461,13 @@ async def health_check():
 
             print(f"📁 Upload directory exists: {upload_dir_ok}")
             print(f"📁 Output directory exists: {output_dir_ok}")
+
+            if settings.JANITOR_ENABLED:
+                health_data["services"]["disk_janitor"] = {
+                    "status": "running",
+                    "ok": True,
+                    **disk_janitor.stats
+                }
         except Exception as e:
             health_data["services"]["upload_dir"] = {
                 "status": "error",
@@ -394,6 +481,14 @@ async def health_check():
             }
             print(f"❌ Directory check error: {e}")
 
+        # Буфер аналитики
+        if settings.ANALYTICS_ENABLED:
+            health_data["services"]["analytics_writer"] = {
+                "status": "running",
+                "ok": True,
+                **analytics_writer.snapshot_stats()
+            }
+
         # Определяем общий статус
         required_services_ok = (
                 health_data["services"].get("database", {}).get("ok", False) and
@@ -425,29 +520,247 @@ async def health_check():
             }
         )
 
+@app.get("/transcriptions", response_model=TranscriptionListResponse)
+async def list_transcriptions(
+        limit: int = Query(50, ge=1, le=500, description="Page size"),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        status_filter: Optional[str] = Query(None, alias="status", description="started, completed, failed"),
+        language: Optional[str] = Query(None, description="Language code"),
+        created_from: Optional[datetime] = Query(None, description="Created at or after (ISO 8601)"),
+        created_to: Optional[datetime] = Query(None, description="Created before (ISO 8601)"),
+        filename_prefix: Optional[str] = Query(None, max_length=255, description="Filename prefix"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    История транскрипций, новые первыми.
+    Пагинация по курсору: следующая страница запрашивается с cursor=next_cursor
+    """
+    try:
+        page = await AsyncAnalyticsRepository(db).list_transcriptions(
+            limit, cursor,
+            status=status_filter,
+            language=language,
+            created_from=_naive_utc(created_from),
+            created_to=_naive_utc(created_to),
+            filename_prefix=filename_prefix
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for item in page['items']:
+        if item['status'] == 'completed':
+            item['download_url'] = f"/transcriptions/{item['id']}/download"
+    return TranscriptionListResponse(items=page['items'], next_cursor=page['next_cursor'], limit=limit)
+
+
+@app.get("/search", response_model=SearchResponse)
+async def search_transcriptions(
+        q: str = Query(..., min_length=1, max_length=256, description="Search query (websearch syntax)"),
+        limit: int = Query(20, ge=1, le=100, description="Page size"),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        language: Optional[str] = Query(None, description="Language code"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Полнотекстовый поиск по транскрипциям.
+    Поддерживается синтаксис websearch: "точная фраза", OR, -исключение
+    """
+    try:
+        page = await AsyncAnalyticsRepository(db).search_transcriptions(q, limit, cursor, language=language)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for item in page['items']:
+        item['download_url'] = f"/transcriptions/{item['id']}/download"
+    return SearchResponse(query=q, items=page['items'], next_cursor=page['next_cursor'], limit=limit)
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Время в UTC без часового пояса, как в столбцах TIMESTAMP"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 @app.get("/transcriptions/{file_id}/download")
-async def download_transcription(file_id: str):
+async def download_transcription(file_id: str, request: Request):
     """
-    Скачивание файла с транскрипцией
+    Скачивание файла с транскрипцией.
+
+    Транскрипции неизменяемы, поэтому ответ кэшируется клиентом навсегда
+    (ETag по хэшу содержимого, If-None-Match -> 304). Поддерживаются
+    запросы диапазонов (Range) и горячий слой свежих транскрипций в Redis.
+    Если клиент принимает кодировку, в которой файл лежит в хранилище,
+    сжатые байты отдаются как есть с Content-Encoding. Большие файлы из
+    S3 скачиваются напрямую по временной ссылке (307), минуя API.
     """
-    file_path = transcription_service.output_dir / f"{file_id}_transcription.txt"
+    store = transcription_service.transcript_store
+    if_none_match = request.headers.get("if-none-match")
+    range_header = request.headers.get("range")
+    accepted = parse_accept_encoding(request.headers.get("accept-encoding"))
+
+    # Метаданные из Redis позволяют ответить 304 без обращения к диску.
+    # Без If-None-Match текст горячего слоя читается вместе с ними одним MGET
+    meta, text_content = await async_redis_client.get_cached_transcript(file_id, include_text=not if_none_match)
+    record_cache("transcript_meta", meta is not None)
+    if meta and etag_matches(if_none_match, meta["etag"]):
+        disk_janitor.record_access(file_id)
+        return _not_modified(meta["etag"])
+
+    if meta and if_none_match:
+        text_content = await async_redis_client.get_cached_transcription(file_id)
+    if meta:
+        record_cache("transcript_hot", text_content is not None)
+    raw, encoding = None, "identity"
+
+    if text_content is not None:
+        data = text_content.encode("utf-8")
+    else:
+        # Хранилище может быть сетевым (Postgres, S3) - не блокируем event loop
+        stored = await asyncio.to_thread(store.find, file_id)
+        if not stored:
+            raise HTTPException(
+                status_code=404,
+                detail="Transcription file not found"
+            )
 
-    if not file_path.exists():
-        raise HTTPException(
-            status_code=404,
-            detail="Transcription file not found"
+        passthrough = not range_header and (stored.encoding == "identity" or stored.encoding in accepted)
+        if passthrough and settings.STORAGE_REDIRECT_MIN_BYTES \
+                and (stored.size or 0) >= settings.STORAGE_REDIRECT_MIN_BYTES:
+            url = store.presigned_url(stored, settings.STORAGE_PRESIGN_SECONDS)
+            if url:
+                # Ссылка временная, сам редирект не кэшируется
+                return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
+
+        if passthrough and meta and stored.encoding != "identity":
+            # ETag уже известен: сжатые байты идут клиенту потоком, без чтения целиком в память
+            disk_janitor.record_access(file_id)
+            headers = _download_headers(file_id, f"{meta['etag']}-{stored.encoding}")
+            headers["Content-Encoding"] = stored.encoding
+            if stored.size is not None:
+                headers["Content-Length"] = str(stored.size)
+            return StreamingResponse(
+                store.iter_bytes(stored),
+                media_type="text/plain; charset=utf-8",
+                headers=headers
+            )
+
+        raw, encoding = await asyncio.to_thread(store.read_bytes, stored), stored.encoding
+        data = store.decompress(raw, encoding)
+
+        if not meta:
+            meta = {"etag": content_etag(data), "size": len(data)}
+            await async_redis_client.cache_file_info(file_id, meta, ttl=settings.TRANSCRIPT_META_TTL)
+            if etag_matches(if_none_match, meta["etag"]):
+                disk_janitor.record_access(file_id)
+                return _not_modified(meta["etag"])
+
+    # Скачанные файлы вытесняются очисткой диска последними
+    disk_janitor.record_access(file_id)
+
+    etag = meta["etag"]
+    headers = _download_headers(file_id, etag)
+
+    # Диапазоны считаются по распакованному тексту; If-Range с чужим тегом отдает весь файл
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if range_header and (not if_range or if_range.strip('"') == etag):
+        try:
+            # Неподдерживаемая форма Range игнорируется - ниже отдается весь файл
+            byte_range = parse_byte_range(range_header, len(data))
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=416,
+                headers={"Content-Range": f"bytes */{len(data)}"}
+            )
+
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        return Response(
+            content=data[start:end + 1],
+            status_code=206,
+            media_type="text/plain; charset=utf-8",
+            headers=headers
         )
 
-    return FileResponse(
-        path=file_path,
-        filename=f"transcription_{file_id}.txt",
-        media_type="text/plain"
+    if raw is not None and encoding != "identity" and encoding in accepted:
+        headers["Content-Encoding"] = encoding
+        headers["ETag"] = f'"{etag}-{encoding}"'
+        data = raw
+
+    return Response(
+        content=data,
+        media_type="text/plain; charset=utf-8",
+        headers=headers
     )
 
 
+def _download_headers(file_id: str, etag: str) -> dict:
+    """Заголовки ответа со скачиваемой транскрипцией"""
+    return {
+        "Content-Disposition": f'attachment; filename="transcription_{file_id}.txt"',
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{etag}"',
+        "Vary": "Accept-Encoding"
+    }
+
+
+def _not_modified(etag: str) -> Response:
+    """Ответ 304 для неизменившейся транскрипции"""
+    return Response(
+        status_code=304,
+        headers={
+            "ETag": f'"{etag}"',
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL
+        }
+    )
+
+
+@app.get("/transcriptions/{file_id}/status")
+async def get_transcription_status(file_id: str):
+    """
+    Статус задачи транскрипции (режим очереди)
+    """
+    job_status = await transcription_queue.get_job_status_async(file_id)
+
+    if not job_status:
+        # Задача могла быть обработана синхронно или статус уже истек
+        if await asyncio.to_thread(transcription_service.transcript_store.exists, file_id):
+            job_status = {"status": "completed"}
+        else:
+            raise HTTPException(
+                status_code=404,
+                detail="Transcription job not found"
+            )
+
+    return {
+        "file_id": file_id,
+        **job_status,
+        "download_url": f"/transcriptions/{file_id}/download" if job_status.get("status") == "completed" else None
+    }
+
+
+@app.get("/transcriptions/{file_id}/keywords")
+async def get_transcription_keywords(
+        file_id: str,
+        limit: int = Query(10, ge=1, le=100),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """Ключевые слова транскрипции из TF-IDF индекса (посчитаны при записи)"""
+    keywords = await AsyncAnalyticsRepository(db).get_document_keywords(file_id, limit)
+    if keywords is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Transcription is not indexed"
+        )
+    return {"file_id": file_id, "keywords": keywords}
+
+
 @app.get("/analytics/overview")
-async def get_analytics_overview(db: Session = Depends(get_db)):
-    """Получение обзора аналитики"""
+async def get_analytics_overview(request: Request):
+    """Получение обзора аналитики (из кэша, обновляемого в фоне)"""
     if not settings.ANALYTICS_ENABLED:
         raise HTTPException(
             status_code=400,
@@ -455,30 +768,95 @@ async def get_analytics_overview(db: Session = Depends(get_db)):
         )
 
     try:
-        analytics_service = AnalyticsService(db)
-        overview = analytics_service.get_system_overview()
-
-        return {
-            "status": "success",
-            "data": overview,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
+        snapshot = await overview_cache.get_or_build()
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get analytics: {str(e)}"
         )
 
+    headers = {
+        "ETag": f'"{snapshot.etag}"',
+        "Cache-Control": overview_cache.cache_control,
+        "Age": str(max(0, int(snapshot.age)))
+    }
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+
+@app.get("/analytics/trending-terms")
+async def get_trending_terms(
+        hours: int = Query(24, ge=1, le=24 * 30),
+        limit: int = Query(20, ge=1, le=200),
+        language: Optional[str] = Query(None),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """Трендовые термины корпуса: чаще всего попадали в ключевые слова за последние hours часов"""
+    terms = await AsyncAnalyticsRepository(db).get_trending_terms(hours, limit, language=language)
+    return {"hours": hours, "terms": terms}
+
+
+@app.get("/analytics/export")
+async def export_analytics(
+        table: str = Query(..., description="Table to export"),
+        date_from: Optional[datetime] = Query(None, alias="from", description="Rows at or after (ISO 8601)"),
+        date_to: Optional[datetime] = Query(None, alias="to", description="Rows before (ISO 8601)"),
+        export_format: str = Query("csv", alias="format", description="csv or parquet")
+):
+    """
+    Потоковая выгрузка таблицы аналитики в CSV или Parquet.
+    Строки читаются серверным курсором порциями, память не зависит от размера выгрузки
+    """
+    try:
+        analytics_exporter.validate(table, export_format)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    slot = analytics_exporter.acquire()
+    if slot is None:
+        raise HTTPException(status_code=429, detail="Too many exports in progress")
+
+    media_type, extension = EXPORT_FORMATS[export_format]
+    # Синхронный генератор выполняется в пуле потоков, event loop не блокируется.
+    # Фоновая задача освобождает слот и при отключении клиента до первой порции
+    return StreamingResponse(
+        analytics_exporter.stream(table, export_format, _naive_utc(date_from), _naive_utc(date_to), slot=slot),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'},
+        background=BackgroundTask(slot.release)
+    )
+
+
+@app.get("/analytics/reports/{report}")
+async def get_analytics_report(
+        report: str,
+        days: int = Query(30, ge=1, le=3650),
+        limit: int = Query(100, ge=1, le=10000)
+):
+    """
+    Тяжелые аналитические отчеты по снимкам Parquet (DuckDB), без нагрузки на Postgres.
+    Данные отстают от БД не больше чем на OLAP_SNAPSHOT_SECONDS
+    """
+    if report not in REPORTS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown report. Available: {', '.join(sorted(REPORTS))}"
+        )
+    try:
+        rows = await asyncio.to_thread(olap_query_service.run, report, days, limit)
+    except OlapUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"report": report, "days": days, "rows": rows}
+
 
 @app.get("/analytics/test")
-async def test_analytics(db: Session = Depends(get_db)):
+async def test_analytics(db: AsyncSession = Depends(get_async_db)):
     """Тестовый endpoint для аналитики"""
     try:
-        from sqlalchemy import text
-
         # Простой запрос для проверки
-        result = db.execute(text("SELECT COUNT(*) FROM transcription_records"))
-        count = result.fetchone()[0]
+        count = await AsyncAnalyticsRepository(db).count_transcriptions()
 
         return {
             "status": "success",
@@ -493,7 +871,7 @@ async def test_analytics(db: Session = Depends(get_db)):
 
 
 @app.exception_handler(HTTPException)
-async def http_exception_handler(exc):
+async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
         content=ErrorResponse(
@@ -0,0 +1,199 @@
+"""
+Метрики Prometheus (GET /metrics).
+
+В мультипроцессном режиме (uvicorn/gunicorn с несколькими воркерами)
+задайте PROMETHEUS_MULTIPROC_DIR - каждый процесс пишет значения в файлы
+этой директории, а /metrics собирает их вместе. Директорию нужно очищать
+при старте сервиса.
+"""
+import contextlib
+import os
+import time
+from typing import Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+#  HTTP
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status",
+    ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency",
+    ["method", "route"], buckets=STAGE_BUCKETS
+)
+
+#  Транскрипция
+UPLOAD_BYTES = Counter("transcription_upload_bytes_total", "Uploaded audio bytes")
+AUDIO_SECONDS = Counter("transcription_audio_seconds_total", "Seconds of audio transcribed", ["model"])
+TRANSCRIPTIONS = Counter("transcriptions_total", "Finished transcriptions", ["model", "status"])
+REALTIME_FACTOR = Histogram(
+    "transcription_realtime_factor", "Processing time divided by audio duration",
+    ["model"], buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+)
+INFLIGHT_JOBS = Gauge(
+    "transcription_inflight_jobs", "Transcriptions being processed right now",
+    multiprocess_mode="livesum"
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "whisper_model_load_seconds", "Time spent loading the Whisper model",
+    ["model"], multiprocess_mode="max"
+)
+
+#  Кэши
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["cache", "result"])
+
+#  Очистка диска
+JANITOR_RECLAIMED_BYTES = Counter(
+    "janitor_reclaimed_bytes_total", "Bytes freed by the disk janitor", ["directory", "reason"]
+)
+JANITOR_FILES_REMOVED = Counter(
+    "janitor_files_removed_total", "Files removed by the disk janitor (reason: ttl or quota eviction)",
+    ["directory", "reason"]
+)
+
+#  БД и Redis
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Database statement latency",
+    ["operation"], buckets=LATENCY_BUCKETS
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled database connection",
+    ["pool"], buckets=LATENCY_BUCKETS + (30,)
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total", "Pool checkouts that gave up waiting", ["pool"]
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Connections checked out of the pool",
+    ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_capacity", "Maximum connections of the pool (pool_size + max_overflow)",
+    ["pool"], multiprocess_mode="livesum"
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds", "Redis command latency",
+    ["command"], buckets=LATENCY_BUCKETS
+)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_transcription(model: str, status: str, processing_time: float = 0.0, duration: float = 0.0):
+    """Итог транскрипции: счетчики и real-time factor"""
+    TRANSCRIPTIONS.labels(model, status).inc()
+    if status == "completed" and duration and duration > 0:
+        AUDIO_SECONDS.labels(model).inc(duration)
+        REALTIME_FACTOR.labels(model).observe(processing_time / duration)
+
+
+class QueueCollector:
+    """Глубина очереди транскрипции считается в момент сбора метрик"""
+
+    def describe(self):
+        # Без describe реестр вызывает collect при регистрации, до инициализации Redis
+        return [GaugeMetricFamily("transcription_queue_depth", "Messages in the transcription stream", labels=["state"])]
+
+    def collect(self):
+        from app.job_queue import transcription_queue
+
+        depth = GaugeMetricFamily("transcription_queue_depth", "Messages in the transcription stream", labels=["state"])
+        try:
+            values = transcription_queue.depth()
+            depth.add_metric(["length"], values["length"])
+            depth.add_metric(["pending"], values["pending"])
+        except Exception:
+            pass
+        yield depth
+
+
+if not MULTIPROCESS:
+    REGISTRY.register(QueueCollector())
+
+
+def instrument_engine(engine):
+    """Время выполнения SQL запросов через события SQLAlchemy"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_QUERY_DURATION.labels(operation).observe(time.perf_counter() - started)
+
+
+def instrument_pool(engine, name: str, capacity: int):
+    """
+    Метрики занятости пула через публичные события checkout/checkin.
+    Загрузка пула = db_pool_connections_in_use / db_pool_capacity
+    """
+    from sqlalchemy import event
+
+    DB_POOL_CAPACITY.labels(name).set(capacity)
+    in_use = DB_POOL_IN_USE.labels(name)
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        in_use.inc()
+
+    @event.listens_for(engine.pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        in_use.dec()
+
+
+@contextlib.contextmanager
+def time_checkout(name: str):
+    """
+    Время получения соединения из пула и таймауты ожидания.
+    Оборачивает engine.connect() / session.connection() у вызывающего кода
+    """
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+    started = time.perf_counter()
+    try:
+        yield
+    except PoolTimeoutError:
+        DB_POOL_CHECKOUT_TIMEOUTS.labels(name).inc()
+        raise
+    finally:
+        DB_POOL_CHECKOUT_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Текст метрик в формате exposition"""
+    if MULTIPROCESS:
+        # Реестр на каждый сбор: значения всех процессов читаются из файлов
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(QueueCollector())
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Удаление livesum-гейджей завершившегося процесса"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
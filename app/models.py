@@ -1,11 +1,12 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
 class TranscriptionRequest(BaseModel):
     filename: Optional[str] = None
     language: Optional[str] = "ru"
+    callback_url: Optional[str] = None
 
     model_config = ConfigDict(
         from_attributes=True,
@@ -20,6 +21,7 @@ class TranscriptionResponse(BaseModel):
     filename: str
     text_length: int
     download_url: Optional[str] = None
+    status_url: Optional[str] = None
     external_api_status: Optional[str] = None
     created_at: datetime
 
@@ -29,6 +31,67 @@ class TranscriptionResponse(BaseModel):
     )
 
 
+class TranscriptionListItem(BaseModel):
+    id: str
+    transcription_id: Optional[str] = None
+    filename: str
+    language: Optional[str] = None
+    model: Optional[str] = None
+    status: Optional[str] = None
+    duration: Optional[float] = None
+    text_length: int = 0
+    processing_time: Optional[float] = None
+    error_message: Optional[str] = None
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    download_url: Optional[str] = None
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        extra="ignore",
+        protected_namespaces=(),
+    )
+
+
+class TranscriptionListResponse(BaseModel):
+    items: List[TranscriptionListItem]
+    next_cursor: Optional[str] = None
+    limit: int
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        extra="ignore",
+    )
+
+
+class SearchHit(BaseModel):
+    id: str
+    transcription_id: Optional[str] = None
+    filename: str
+    language: Optional[str] = None
+    created_at: Optional[datetime] = None
+    rank: float
+    snippet: str = ""  # фрагменты текста, совпадения выделены <mark>
+    download_url: Optional[str] = None
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        extra="ignore",
+    )
+
+
+class SearchResponse(BaseModel):
+    query: str
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+    limit: int
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        extra="ignore",
+    )
+
+
 class ErrorResponse(BaseModel):
     error: str
     detail: Optional[str] = None
@@ -0,0 +1,163 @@
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.analytics.events import (
+    TranscriptionCompleted,
+    TranscriptionFailed,
+    WordStatisticsRecorded,
+    PerformanceMetricRecorded
+)
+from app.analytics.histograms import latency_histograms
+from app.analytics.writer import analytics_writer
+from app.config import settings
+from app.metrics import record_transcription
+from app.tracing import span
+
+EMPTY_TEXT_MESSAGE = "Текст не распознан. Возможно, аудио слишком тихое, поврежденное или содержит только музыку/шум."
+RETRY_ERROR_MESSAGE = "Ошибка транскрипции. Проверьте аудиофайл."
+
+
+def get_audio_duration(audio_path: Path, language: Optional[str] = None) -> float:
+    """Длительность аудио в секундах (0.0, если определить не удалось)"""
+    from pydub import AudioSegment
+    try:
+        started = time.perf_counter()
+        with span("decode"):
+            audio = AudioSegment.from_file(audio_path)
+        duration = len(audio) / 1000.0
+        latency_histograms.observe('decode', time.perf_counter() - started, language=language, duration=duration)
+        print(f"⏱️ Audio duration: {duration:.2f} seconds")
+        return duration
+    except Exception as e:
+        print(f"⚠️ Could not get audio duration: {e}")
+        return 0.0
+
+
+def transcribe_with_fallback(service, audio_path: Path, language: str) -> str:
+    """
+    Транскрибирование с повторными попытками при пустом результате.
+    Ошибка первой попытки пробрасывается вызывающему коду.
+    """
+    text = service.transcribe_audio(audio_path, language)
+    print(f"✅ Transcription completed. Text length: {len(text)} chars")
+
+    if text and len(text.strip()) > 0:
+        return text
+
+    # Если текст пустой, пробуем другой язык
+    print(f"⚠️ Текст пустой! Пробуем автоопределение языка...")
+    try:
+        text = service.transcribe_audio(audio_path, "auto")
+        print(f"🔁 Результат с автоопределением: {len(text)} chars")
+
+        if not text or len(text.strip()) == 0:
+            print(f"⚠️ Все еще пусто! Пробуем английский...")
+            text = service.transcribe_audio(audio_path, "en")
+            print(f"🔁 Результат на английском: {len(text)} chars")
+
+            if not text or len(text.strip()) == 0:
+                text = EMPTY_TEXT_MESSAGE
+    except Exception as e:
+        print(f"⚠️ Ошибка при повторной попытке транскрипции: {e}")
+        text = RETRY_ERROR_MESSAGE
+
+    return text
+
+
+def collect_word_statistics(text: str, language: str) -> List[Dict[str, Any]]:
+    """Подсчет слов в тексте транскрипции"""
+    words = re.findall(r'\b\w+\b', text.lower())
+    word_counts = Counter(words)
+
+    return [{
+        'word': word,
+        'count': count,
+        'language': language
+    } for word, count in word_counts.items() if len(word) > 2]
+
+
+def finalize_transcription(
+        service,
+        file_id: str,
+        text: str,
+        language: str,
+        processing_time: float,
+        duration: Optional[float] = None
+) -> Path:
+    """
+    Завершение транскрипции: события аналитики и сохранение текста.
+    Общая часть для API и воркеров очереди, в БД ничего не пишет синхронно.
+    """
+    latency_histograms.observe('inference', processing_time, language=language, duration=duration)
+    record_transcription(settings.WHISPER_MODEL, 'completed', processing_time, duration or 0.0)
+
+    if settings.ANALYTICS_ENABLED and file_id:
+        with span("analytics_enqueue"):
+            _emit_completed(file_id, text, language, processing_time, duration)
+        print(f"📊 Analytics events queued (transcription_time = {processing_time:.2f}s)")
+    else:
+        print("📊 Analytics is disabled, skipping database update")
+
+    # Сохраняем текст в файл
+    started = time.perf_counter()
+    text_file_path = service.save_transcription_text(file_id, text)
+    latency_histograms.observe('save', time.perf_counter() - started, language=language, duration=duration)
+    print(f"💾 Text saved to: {text_file_path}")
+    return text_file_path
+
+
+def _emit_completed(file_id: str, text: str, language: str, processing_time: float, duration: Optional[float]):
+    """События аналитики успешной транскрипции"""
+    analytics_writer.emit(TranscriptionCompleted(
+        file_uuid=file_id,
+        text_length=len(text),
+        processing_time=processing_time,
+        confidence_score=0.95,
+        duration=duration,
+        transcript_text=text[:settings.SEARCH_MAX_TEXT_CHARS] if settings.SEARCH_INDEX_ENABLED else None
+    ))
+    analytics_writer.emit(PerformanceMetricRecorded(
+        file_uuid=file_id,
+        metric_name='transcription_time',
+        value=processing_time
+    ))
+
+    if text and len(text.strip()) > 0:
+        word_stats = collect_word_statistics(text, language)
+        if word_stats:
+            analytics_writer.emit(WordStatisticsRecorded(file_uuid=file_id, words=word_stats))
+
+
+def record_transcription_error(file_id: Optional[str], error_message: str) -> bool:
+    """Событие об ошибке транскрипции"""
+    record_transcription(settings.WHISPER_MODEL, 'failed')
+    if not settings.ANALYTICS_ENABLED or not file_id:
+        return False
+    return analytics_writer.emit(TranscriptionFailed(file_uuid=file_id, error_message=error_message))
+
+
+def validate_callback_url(callback_url: Optional[str]) -> Optional[str]:
+    """
+    Проверка адреса вебхука, возвращает нормализованный URL или None.
+    Разрешает имя хоста (блокирующий вызов) - из обработчиков через to_thread
+    """
+    if not callback_url or not callback_url.strip():
+        return None
+
+    from app.delivery import check_callback_target
+
+    callback_url = callback_url.strip()
+    check_callback_target(callback_url)
+    return callback_url
+
+
+def notify_callback(callback_url: Optional[str], event: str, data: Dict[str, Any]) -> bool:
+    """Постановка вебхука о завершении/ошибке транскрипции в outbox"""
+    if not callback_url:
+        return False
+
+    from app.delivery import delivery_service
+    return delivery_service.enqueue_webhook(callback_url, event, data)
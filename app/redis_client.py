@@ -1,74 +1,126 @@
 import redis
-from typing import Optional
+import redis.asyncio
+from typing import Any, Dict, List, Optional, Tuple
 import json
 from app.config import settings
 import time
 
+from app.metrics import REDIS_COMMAND_DURATION
+
+
+def _observe(command: str, started: float):
+    REDIS_COMMAND_DURATION.labels(command).observe(time.perf_counter() - started)
+
+
+def _connection_params() -> Dict[str, Any]:
+    """Параметры подключения, общие для sync и async клиентов"""
+    params = {
+        'host': settings.REDIS_HOST,
+        'port': settings.REDIS_PORT,
+        'db': settings.REDIS_DB,
+        'decode_responses': True,
+        'socket_connect_timeout': settings.REDIS_SOCKET_TIMEOUT,
+        'socket_timeout': settings.REDIS_SOCKET_TIMEOUT,
+        'retry_on_timeout': True,
+        'max_connections': settings.REDIS_MAX_CONNECTIONS,
+        # Когда пул занят, команда ждет свободное соединение, а не открывает новое
+        'timeout': settings.REDIS_POOL_TIMEOUT
+    }
+    # Добавляем пароль только если он указан
+    if settings.REDIS_PASSWORD:
+        params['password'] = settings.REDIS_PASSWORD
+    return params
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    """Pipeline, измеряющий время выполнения всей пачки команд"""
+
+    def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            _observe("PIPELINE", started)
+
+
+class InstrumentedRedis(redis.Redis):
+    """Redis клиент, измеряющий время каждой команды"""
+
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            _observe(str(args[0]).upper() if args else "UNKNOWN", started)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedAsyncPipeline(redis.asyncio.client.Pipeline):
+    """Асинхронный pipeline, измеряющий время выполнения всей пачки команд"""
+
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            _observe("PIPELINE", started)
+
+
+class InstrumentedAsyncRedis(redis.asyncio.Redis):
+    """Асинхронный Redis клиент, измеряющий время каждой команды"""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            _observe(str(args[0]).upper() if args else "UNKNOWN", started)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedAsyncPipeline:
+        return InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
 class RedisClient:
-    """Клиент для работы с Redis"""
+    """
+    Синхронный клиент для работы с Redis (воркеры, фоновые потоки).
+    Соединения открываются при первой команде, а не при импорте
+    """
 
     def __init__(self):
         self.redis_client: Optional[redis.Redis] = None
         self._connect()
 
     def _connect(self):
-        """Подключение к Redis"""
-        try:
-            print(f"🔴 [Redis] Checking connection...")
-            print(f"🔴 [Redis] Enabled: {settings.REDIS_ENABLED}")
-
-            # Если Redis отключен, выходим
-            if not settings.REDIS_ENABLED:
-                print("🔴 [Redis] Disabled in settings, skipping connection")
-                return
-
-            print(f"🔴 [Redis] Attempting to connect to {settings.REDIS_HOST}:{settings.REDIS_PORT}...")
-
-            connection_params = {
-                'host': settings.REDIS_HOST,
-                'port': settings.REDIS_PORT,
-                'db': settings.REDIS_DB,
-                'decode_responses': True,
-                'socket_connect_timeout': 3,
-                'socket_timeout': 3,
-                'retry_on_timeout': True
-            }
-
-            # Добавляем пароль только если он указан
-            if settings.REDIS_PASSWORD:
-                connection_params['password'] = settings.REDIS_PASSWORD
-                print(f"🔴 [Redis] Using password authentication")
-
-            self.redis_client = redis.Redis(**connection_params)
-
-            # Тестируем подключение
-            start_time = time.time()
-            response = self.redis_client.ping()
-            elapsed = time.time() - start_time
-
-            if response:
-                print(f"✅ [Redis] Connected successfully! Ping: {elapsed:.2f}s")
-                # Выводим базовую информацию
-                try:
-                    info = self.redis_client.info('server')
-                    print(f"✅ [Redis] Version: {info.get('redis_version')}")
-                    print(f"✅ [Redis] Mode: {info.get('redis_mode')}")
-                except:
-                    pass
-            else:
-                print(f"❌ [Redis] Ping failed")
-                self.redis_client = None
+        """Создание клиента с пулом соединений (без обращения к серверу)"""
+        if not settings.REDIS_ENABLED:
+            print("🔴 [Redis] Disabled in settings, skipping connection")
+            return
 
-        except redis.ConnectionError as e:
-            print(f"❌ [Redis] Connection error: {e}")
-            print(f"   Trying host: {settings.REDIS_HOST}:{settings.REDIS_PORT}")
-            self.redis_client = None
+        pool = redis.BlockingConnectionPool(**_connection_params())
+        self.redis_client = InstrumentedRedis(connection_pool=pool)
+
+    def check(self) -> bool:
+        """Проверка подключения с выводом версии сервера"""
+        if not self.redis_client:
+            return False
+
+        try:
+            started = time.perf_counter()
+            if not self.redis_client.ping():
+                print(f"❌ [Redis] Ping failed")
+                return False
+            info = self.redis_client.info('server')
+            print(f"✅ [Redis] Connected to {settings.REDIS_HOST}:{settings.REDIS_PORT} "
+                  f"(version {info.get('redis_version')}, ping {time.perf_counter() - started:.3f}s)")
+            return True
         except redis.AuthenticationError as e:
             print(f"❌ [Redis] Authentication failed: {e}")
-            self.redis_client = None
+            return False
         except Exception as e:
-            print(f"❌ [Redis] Unexpected error: {type(e).__name__}: {e}")
-            self.redis_client = None
+            print(f"❌ [Redis] Connection error: {type(e).__name__}: {e}")
+            return False
 
     def set(self, key: str, value: str, ttl: Optional[int] = None) -> bool:
         """Сохранение значения в Redis"""
@@ -165,5 +217,196 @@ class RedisClient:
         """Получение информации о файле из кэша"""
         return self.get_json(f"file_info:{file_id}")
 
+    def cache_transcript(self, file_id: str, meta: dict, meta_ttl: int,
+                         text: Optional[str] = None, text_ttl: int = 3600) -> bool:
+        """Метаданные и текст транскрипции одним pipeline"""
+        if not self.redis_client:
+            return False
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(f"file_info:{file_id}", meta_ttl, json.dumps(meta))
+            if text is not None:
+                pipe.setex(f"transcription:{file_id}", text_ttl, text)
+            pipe.execute()
+            return True
+        except Exception as e:
+            print(f"❌ Redis cache_transcript error: {e}")
+            return False
+
+
+class AsyncRedisClient:
+    """
+    Асинхронный клиент Redis (redis.asyncio) для обработчиков API.
+
+    Пул ограничен REDIS_MAX_CONNECTIONS соединений. Операции над
+    несколькими ключами выполняются за один сетевой обмен: MGET или pipeline
+    без транзакции. Ошибки Redis не пробрасываются: кэш недоступен - запрос
+    обслуживается из хранилища
+    """
+
+    def __init__(self):
+        self.redis_client: Optional[redis.asyncio.Redis] = None
+        if settings.REDIS_ENABLED:
+            pool = redis.asyncio.BlockingConnectionPool(**_connection_params())
+            self.redis_client = InstrumentedAsyncRedis(connection_pool=pool)
+
+    async def check(self) -> bool:
+        """Проверка подключения с выводом версии сервера"""
+        if not self.redis_client:
+            return False
+
+        try:
+            started = time.perf_counter()
+            info = await self.redis_client.info('server')
+            print(f"✅ [Redis] Async pool ready: {settings.REDIS_HOST}:{settings.REDIS_PORT} "
+                  f"(version {info.get('redis_version')}, {time.perf_counter() - started:.3f}s, "
+                  f"max {settings.REDIS_MAX_CONNECTIONS} connections)")
+            return True
+        except Exception as e:
+            print(f"❌ [Redis] Async connection error: {type(e).__name__}: {e}")
+            return False
+
+    async def ping(self) -> bool:
+        if not self.redis_client:
+            return False
+
+        try:
+            return bool(await self.redis_client.ping())
+        except Exception as e:
+            print(f"❌ Redis ping error: {e}")
+            return False
+
+    async def close(self):
+        """Закрытие соединений пула (остановка процесса)"""
+        if self.redis_client:
+            await self.redis_client.connection_pool.disconnect()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Получение значения из Redis"""
+        if not self.redis_client:
+            return None
+
+        try:
+            value = await self.redis_client.get(key)
+            return value if value else None
+        except Exception as e:
+            print(f"❌ Redis get error: {e}")
+            return None
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None) -> bool:
+        """Сохранение значения в Redis"""
+        if not self.redis_client:
+            return False
+
+        try:
+            if ttl:
+                await self.redis_client.setex(key, ttl, value)
+            else:
+                await self.redis_client.set(key, value)
+            return True
+        except Exception as e:
+            print(f"❌ Redis set error: {e}")
+            return False
+
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """Значения нескольких ключей одной командой MGET"""
+        if not self.redis_client or not keys:
+            return [None] * len(keys)
+
+        try:
+            return [value if value else None for value in await self.redis_client.mget(keys)]
+        except Exception as e:
+            print(f"❌ Redis mget error: {e}")
+            return [None] * len(keys)
+
+    async def get_json(self, key: str) -> Optional[dict]:
+        """Получение JSON из Redis"""
+        return _loads(await self.get(key))
+
+    async def set_json(self, key: str, value: dict, ttl: Optional[int] = None) -> bool:
+        """Сохранение JSON в Redis"""
+        return await self.set(key, json.dumps(value), ttl)
+
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        if not self.redis_client:
+            return {}
+
+        try:
+            return await self.redis_client.hgetall(key)
+        except Exception as e:
+            print(f"❌ Redis hgetall error: {e}")
+            return {}
+
+    async def increment_many(self, counters: Dict[str, int], ttl: Optional[int] = None) -> Optional[List[int]]:
+        """Приращение нескольких счетчиков одним pipeline"""
+        if not self.redis_client:
+            return None
+        if not counters:
+            return []
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, amount in counters.items():
+                pipe.incrby(key, amount)
+                if ttl:
+                    pipe.expire(key, ttl)
+            results = await pipe.execute()
+            return results[::2] if ttl else results
+        except Exception as e:
+            print(f"❌ Redis increment_many error: {e}")
+            return None
+
+    async def zincrby_many(self, updates: Dict[str, Dict[str, float]], ttl: Optional[int] = None) -> bool:
+        """Приращение элементов нескольких sorted set-ов ({ключ: {элемент: приращение}}) одним pipeline"""
+        if not self.redis_client:
+            return False
+        if not updates:
+            return True
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, members in updates.items():
+                for member, amount in members.items():
+                    pipe.zincrby(key, amount, member)
+                if ttl:
+                    pipe.expire(key, ttl)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            print(f"❌ Redis zincrby_many error: {e}")
+            return False
+
+    async def cache_file_info(self, file_id: str, info: dict, ttl: int = 3600) -> bool:
+        """Кэширование информации о файле"""
+        return await self.set_json(f"file_info:{file_id}", info, ttl)
+
+    async def get_cached_file_info(self, file_id: str) -> Optional[dict]:
+        """Получение информации о файле из кэша"""
+        return await self.get_json(f"file_info:{file_id}")
+
+    async def get_cached_transcription(self, file_id: str) -> Optional[str]:
+        """Получение транскрипции из кэша"""
+        return await self.get(f"transcription:{file_id}")
+
+    async def get_cached_transcript(self, file_id: str,
+                                    include_text: bool = True) -> Tuple[Optional[dict], Optional[str]]:
+        """Метаданные и текст транскрипции из горячего слоя одной командой MGET"""
+        if not include_text:
+            return await self.get_cached_file_info(file_id), None
+        meta, text = await self.mget([f"file_info:{file_id}", f"transcription:{file_id}"])
+        meta = _loads(meta)
+        # Текст без метаданных не используется (ETag неизвестен)
+        return meta, text if meta else None
+
+
+def _loads(value: Optional[str]) -> Optional[dict]:
+    try:
+        return json.loads(value) if value else None
+    except ValueError as e:
+        print(f"❌ Redis get_json error: {e}")
+        return None
+
 
 redis_client = RedisClient()
+async_redis_client = AsyncRedisClient()
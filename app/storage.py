@@ -0,0 +1,481 @@
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.config import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+# Кодировка (как в Content-Encoding) -> расширение файла
+ENCODING_SUFFIXES = {
+    "zstd": ".zst",
+    "gzip": ".gz",
+    "identity": "",
+}
+
+# Размер порции потокового чтения
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class StoredTranscript:
+    """Транскрипция в хранилище"""
+    path: Optional[Path] = None  # только для файловой системы
+    encoding: str = "identity"
+    size: Optional[int] = None   # размер в хранилище (сжатых байт)
+    key: str = ""                # ключ объекта в хранилище
+
+
+def parse_accept_encoding(header: Optional[str]) -> set:
+    """Кодировки, которые принимает клиент (q=0 означает отказ)"""
+    accepted = set()
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(token)
+    return accepted
+
+
+class TranscriptBackend(ABC):
+    """
+    Базовое хранилище текстов транскрипций.
+
+    Тексты сжимаются одинаково во всех реализациях (zstd или gzip), поэтому
+    сжатые байты можно отдавать клиенту как есть с Content-Encoding.
+    Реализации: TranscriptStore (файловая система), PostgresTranscriptStore,
+    S3TranscriptStore. С общим хранилищем (Postgres, S3) реплики API
+    взаимозаменяемы: скачивание работает на любой из них.
+    """
+
+    name = "base"
+
+    def __init__(self, compression: str = "zstd", level: Optional[int] = None):
+        self.level = level
+        self.encoding = self._resolve_encoding(compression)
+
+    def _resolve_encoding(self, compression: str) -> str:
+        compression = (compression or "identity").lower()
+        if compression in ("none", "off", "false", ""):
+            return "identity"
+        if compression == "zstd" and zstandard is None:
+            print("⚠️ zstandard is not installed, falling back to gzip")
+            return "gzip"
+        if compression not in ENCODING_SUFFIXES:
+            raise ValueError(f"Unsupported transcript compression: {compression}")
+        return compression
+
+    def _lookup_encodings(self):
+        """Порядок поиска: текущая кодировка, затем остальные"""
+        encodings = [self.encoding] + [e for e in ENCODING_SUFFIXES if e != self.encoding]
+        return [e for e in encodings if e != "zstd" or zstandard is not None]
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.level or 3).compress(data)
+        if encoding == "gzip":
+            return gzip.compress(data, compresslevel=self.level or 6)
+        return data
+
+    def decompress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "zstd":
+            return zstandard.ZstdDecompressor().decompress(data)
+        if encoding == "gzip":
+            return gzip.decompress(data)
+        return data
+
+    #  Запись
+
+    def write(self, file_id: str, text: str):
+        """Запись сжатого текста, возвращает расположение в хранилище"""
+        payload = self.compress(text.encode("utf-8"), self.encoding)
+        return self.write_stream(file_id, [payload], self.encoding)
+
+    @abstractmethod
+    def write_stream(self, file_id: str, chunks: Iterable[bytes], encoding: str):
+        """Потоковая запись уже закодированных байт (encoding - их кодировка)"""
+
+    #  Чтение
+
+    @abstractmethod
+    def find(self, file_id: str) -> Optional[StoredTranscript]:
+        """Расположение и размер транскрипции (None - нет в хранилище)"""
+
+    @abstractmethod
+    def iter_bytes(self, stored: StoredTranscript, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """Потоковое чтение байт в том виде, в каком они лежат в хранилище"""
+
+    def read_bytes(self, stored: StoredTranscript) -> bytes:
+        return b"".join(self.iter_bytes(stored))
+
+    def exists(self, file_id: str) -> bool:
+        return self.find(file_id) is not None
+
+    def read_raw(self, file_id: str) -> Optional[Tuple[bytes, str]]:
+        """Байты в том виде, в каком они лежат в хранилище, и их кодировка"""
+        stored = self.find(file_id)
+        if not stored:
+            return None
+        return self.read_bytes(stored), stored.encoding
+
+    def read_text(self, file_id: str) -> Optional[str]:
+        """Распакованный текст транскрипции"""
+        raw = self.read_raw(file_id)
+        if raw is None:
+            return None
+        data, encoding = raw
+        return self.decompress(data, encoding).decode("utf-8")
+
+    def presigned_url(self, stored: StoredTranscript, expires: int) -> Optional[str]:
+        """Временная прямая ссылка на объект (None - хранилище отдает только через API)"""
+        return None
+
+
+class TranscriptStore(TranscriptBackend):
+    """
+    Хранилище текстов транскрипций на файловой системе.
+
+    Файлы раскладываются по поддиректориям по префиксу хэша ID
+    (outputs/3f/a2/<id>_transcription.txt.zst), чтобы в одной директории
+    не накапливались миллионы файлов, и сжимаются zstd или gzip.
+    """
+
+    name = "filesystem"
+
+    def __init__(self, root: Path, compression: str = "zstd", shard_depth: int = 2, level: Optional[int] = None):
+        super().__init__(compression, level)
+        self.root = Path(root)
+        self.shard_depth = shard_depth
+
+    def shard_dir(self, file_id: str) -> Path:
+        """Директория шарда для ID"""
+        digest = hashlib.sha1(file_id.encode("utf-8")).hexdigest()
+        parts = [digest[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return self.root.joinpath(*parts)
+
+    def path_for(self, file_id: str, encoding: Optional[str] = None) -> Path:
+        """Путь к файлу транскрипции в заданной кодировке"""
+        suffix = ENCODING_SUFFIXES[encoding or self.encoding]
+        return self.shard_dir(file_id) / f"{file_id}_transcription.txt{suffix}"
+
+    def legacy_path(self, file_id: str) -> Path:
+        """Путь в старой плоской раскладке (до шардирования)"""
+        return self.root / f"{file_id}_transcription.txt"
+
+    def write_stream(self, file_id: str, chunks: Iterable[bytes], encoding: str) -> Path:
+        """Атомарная запись"""
+        file_path = self.path_for(file_id, encoding)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Пишем во временный файл и переименовываем, чтобы читатели не увидели неполный файл
+        fd, tmp_path = tempfile.mkstemp(dir=file_path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, file_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        return file_path
+
+    def find(self, file_id: str) -> Optional[StoredTranscript]:
+        """Поиск файла транскрипции (текущая кодировка, другие кодировки, старая раскладка)"""
+        candidates = [(self.path_for(file_id, encoding), encoding) for encoding in self._lookup_encodings()]
+        candidates.append((self.legacy_path(file_id), "identity"))
+
+        for path, encoding in candidates:
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                continue
+            return StoredTranscript(path=path, encoding=encoding, size=size, key=str(path))
+        return None
+
+    def iter_bytes(self, stored: StoredTranscript, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        with open(stored.path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def read_bytes(self, stored: StoredTranscript) -> bytes:
+        return stored.path.read_bytes()
+
+
+class PostgresTranscriptStore(TranscriptBackend):
+    """
+    Хранилище транскрипций в таблице transcript_blobs (BYTEA).
+
+    Данные уже сжаты, поэтому столбец хранится без сжатия TOAST (STORAGE EXTERNAL):
+    потоковое чтение порциями substring() не распаковывает значение целиком.
+    """
+
+    name = "postgres"
+
+    def write_stream(self, file_id: str, chunks: Iterable[bytes], encoding: str) -> str:
+        """
+        Порции склеиваются в памяти и пишутся одним UPSERT: дописывание
+        data || chunk переписывало бы TOAST-значение целиком на каждую порцию.
+        Сжатые транскрипции небольшие, write() и так держит их в памяти
+        """
+        from app.database import get_db_session
+
+        payload = b"".join(chunks)
+        with get_db_session() as db:
+            db.execute(text("""
+                INSERT INTO transcript_blobs (file_id, encoding, size, data)
+                VALUES (:file_id, :encoding, :size, :data)
+                ON CONFLICT (file_id) DO UPDATE
+                SET encoding = EXCLUDED.encoding,
+                    size = EXCLUDED.size,
+                    data = EXCLUDED.data,
+                    created_at = CURRENT_TIMESTAMP
+            """), {'file_id': file_id, 'encoding': encoding, 'size': len(payload), 'data': payload})
+        return f"postgres:transcript_blobs/{file_id}"
+
+    def find(self, file_id: str) -> Optional[StoredTranscript]:
+        from app.database import get_db_session
+
+        with get_db_session() as db:
+            row = db.execute(
+                text("SELECT encoding, size FROM transcript_blobs WHERE file_id = :file_id"),
+                {'file_id': file_id}
+            ).fetchone()
+        if not row:
+            return None
+        return StoredTranscript(encoding=row[0], size=row[1], key=file_id)
+
+    def iter_bytes(self, stored: StoredTranscript, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        from app.database import get_db_session
+
+        # Каждая порция - отдельная короткая сессия: медленный клиент не держит соединение пула
+        offset = 0
+        while True:
+            with get_db_session() as db:
+                chunk = db.execute(
+                    text("SELECT substring(data FROM :start FOR :length) FROM transcript_blobs WHERE file_id = :file_id"),
+                    {'file_id': stored.key, 'start': offset + 1, 'length': chunk_size}
+                ).scalar()
+            if not chunk:
+                return
+            chunk = bytes(chunk)
+            yield chunk
+            offset += len(chunk)
+            if len(chunk) < chunk_size:
+                return
+
+
+class _ChunkReader(io.RawIOBase):
+    """Файловый объект поверх итератора порций (для потоковой загрузки в S3)"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def _is_not_found(error: Exception) -> bool:
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class S3TranscriptStore(TranscriptBackend):
+    """
+    Хранилище транскрипций в S3-совместимом объектном хранилище (AWS S3, MinIO).
+
+    Объекты сохраняются с Content-Encoding и Content-Disposition, поэтому
+    временная ссылка (presigned URL) отдает файл клиенту напрямую, минуя API.
+    """
+
+    name = "s3"
+
+    def __init__(self, bucket: str, client=None, prefix: str = "transcripts/",
+                 compression: str = "zstd", level: Optional[int] = None):
+        super().__init__(compression, level)
+        if client is None:
+            client = _s3_client()
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def key_for(self, file_id: str, encoding: Optional[str] = None) -> str:
+        suffix = ENCODING_SUFFIXES[encoding or self.encoding]
+        return f"{self.prefix}{file_id}_transcription.txt{suffix}"
+
+    def write_stream(self, file_id: str, chunks: Iterable[bytes], encoding: str) -> str:
+        key = self.key_for(file_id, encoding)
+        extra = {
+            "ContentType": "text/plain; charset=utf-8",
+            "ContentDisposition": f'attachment; filename="transcription_{file_id}.txt"',
+            "CacheControl": "public, max-age=31536000, immutable"
+        }
+        if encoding != "identity":
+            extra["ContentEncoding"] = encoding
+        # upload_fileobj переключается на multipart-загрузку для больших объектов
+        self.client.upload_fileobj(_ChunkReader(chunks), self.bucket, key, ExtraArgs=extra)
+        return f"s3://{self.bucket}/{key}"
+
+    def find(self, file_id: str) -> Optional[StoredTranscript]:
+        for encoding in self._lookup_encodings():
+            key = self.key_for(file_id, encoding)
+            try:
+                head = self.client.head_object(Bucket=self.bucket, Key=key)
+            except Exception as e:
+                if _is_not_found(e):
+                    continue
+                raise
+            return StoredTranscript(encoding=encoding, size=head.get("ContentLength"), key=key)
+        return None
+
+    def iter_bytes(self, stored: StoredTranscript, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        body = self.client.get_object(Bucket=self.bucket, Key=stored.key)["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def presigned_url(self, stored: StoredTranscript, expires: int) -> Optional[str]:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": stored.key},
+            ExpiresIn=expires
+        )
+
+
+def _s3_client():
+    if boto3 is None:
+        raise RuntimeError("boto3 is required for STORAGE_BACKEND=s3")
+    return boto3.client(
+        "s3",
+        endpoint_url=settings.S3_ENDPOINT_URL or None,
+        region_name=settings.S3_REGION,
+        aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+        aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None
+    )
+
+
+def create_transcript_store(backend: Optional[str] = None) -> TranscriptBackend:
+    """Хранилище транскрипций по настройке STORAGE_BACKEND"""
+    backend = (backend or settings.STORAGE_BACKEND).lower()
+    if backend == "filesystem":
+        return TranscriptStore(
+            settings.output_dir_path,
+            compression=settings.OUTPUT_COMPRESSION,
+            shard_depth=settings.OUTPUT_SHARD_DEPTH,
+            level=settings.OUTPUT_COMPRESSION_LEVEL
+        )
+    if backend == "postgres":
+        return PostgresTranscriptStore(settings.OUTPUT_COMPRESSION, settings.OUTPUT_COMPRESSION_LEVEL)
+    if backend == "s3":
+        return S3TranscriptStore(
+            settings.S3_BUCKET,
+            prefix=settings.S3_PREFIX,
+            compression=settings.OUTPUT_COMPRESSION,
+            level=settings.OUTPUT_COMPRESSION_LEVEL
+        )
+    raise ValueError(f"Unsupported storage backend: {backend}")
+
+
+def content_etag(data: bytes) -> str:
+    """Сильный ETag по хэшу содержимого (без кавычек)"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """
+    Проверка If-None-Match. Слабое сравнение: тег сжатого представления
+    ("<hash>-zstd") совпадает с хэшем исходного текста.
+    """
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        if tag == etag or tag.split("-", 1)[0] == etag:
+            return True
+    return False
+
+
+class RangeNotSatisfiable(ValueError):
+    """Корректный диапазон за пределами файла (ответ 416)"""
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбор заголовка Range (поддерживается один диапазон байт).
+    Возвращает (start, end) включительно. None - форма не поддерживается
+    (другие единицы, несколько диапазонов, пустой файл) или заголовок
+    некорректен: Range игнорируется и отдается весь файл (RFC 9110).
+    RangeNotSatisfiable - диапазон не пересекается с файлом.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec or size == 0:
+        return None
+
+    start_str, _, end_str = spec.strip().partition("-")
+    if not (start_str.isdigit() or start_str == "") or not (end_str.isdigit() or end_str == ""):
+        return None
+
+    if start_str == "":
+        if end_str == "":
+            return None
+        # bytes=-500: последние 500 байт
+        length = int(end_str)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+
+    start = int(start_str)
+    if end_str and int(end_str) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    end = int(end_str) if end_str else size - 1
+    return start, min(end, size - 1)
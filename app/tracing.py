@@ -0,0 +1,168 @@
+"""
+Легкие спаны для замеров этапов транскрипции.
+
+Трасса привязывается к текущему контексту (contextvars), поэтому спаны
+внутри TranscriptionService, пайплайна и репозитория попадают в трассу
+запроса без передачи параметров. Вне трассы span() ничего не делает.
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Span:
+    __slots__ = ("name", "start", "duration", "attributes", "thread_id")
+
+    def __init__(self, name: str, start: float, duration: float, attributes: Dict[str, Any]):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.attributes = attributes
+        self.thread_id = threading.get_ident()
+
+
+class Trace:
+    """Спаны одного запроса или задачи воркера"""
+
+    def __init__(self, trace_id: Optional[str] = None, file_id: Optional[str] = None, persist: bool = True):
+        self.trace_id = trace_id or str(uuid.uuid4())
+        self.file_id = file_id
+        self.persist = persist
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, started: float, duration: float, **attributes):
+        with self._lock:
+            self.spans.append(Span(name, started - self.origin, duration, attributes))
+
+    def durations(self) -> Dict[str, float]:
+        """Суммарная длительность по имени спана"""
+        totals: Dict[str, float] = {}
+        for item in self.spans:
+            totals[item.name] = totals.get(item.name, 0.0) + item.duration
+        return totals
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing (миллисекунды)"""
+        return ", ".join(
+            f"{name.replace('.', '-')};dur={duration * 1000:.1f}"
+            for name, duration in self.durations().items()
+        )
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Формат Trace Event (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        return {
+            "traceEvents": [{
+                "name": item.name,
+                "ph": "X",
+                "ts": round((self.started_at + item.start) * 1_000_000),
+                "dur": round(item.duration * 1_000_000),
+                "pid": pid,
+                "tid": item.thread_id,
+                "args": {"trace_id": self.trace_id, "file_id": self.file_id, **item.attributes}
+            } for item in self.spans],
+            "displayTimeUnit": "ms"
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def start_trace(trace_id: Optional[str] = None, file_id: Optional[str] = None,
+                persist: bool = True) -> Tuple[Trace, Token]:
+    """Начало трассы в текущем контексте (парная функция - end_trace)"""
+    current = Trace(trace_id, file_id, persist)
+    return current, _current_trace.set(current)
+
+
+def end_trace(current: Trace, token: Token):
+    """Завершение трассы: спаны сохраняются и экспортируются"""
+    _current_trace.reset(token)
+    finish_trace(current)
+
+
+@contextlib.contextmanager
+def trace(trace_id: Optional[str] = None, file_id: Optional[str] = None, persist: bool = True):
+    """Трасса на время блока"""
+    current, token = start_trace(trace_id, file_id, persist)
+    try:
+        yield current
+    finally:
+        end_trace(current, token)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """Замер этапа в текущей трассе"""
+    current = _current_trace.get()
+    if current is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add(name, started, time.perf_counter() - started, **attributes)
+
+
+def traced(name: str):
+    """Декоратор: вызов функции как спан"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def apply_trace_headers(response, current: Trace):
+    """Server-Timing и X-Trace-Id в ответе (отключается TRACE_HEADERS_ENABLED=false)"""
+    if not settings.TRACE_HEADERS_ENABLED:
+        return
+    response.headers["X-Trace-Id"] = current.trace_id
+    timing = current.server_timing()
+    if timing:
+        response.headers["Server-Timing"] = timing
+
+
+def finish_trace(current: Trace):
+    """Спаны в performance_metrics (через буфер аналитики) и в файл трассы"""
+    if not current.spans:
+        return
+
+    if current.persist and current.file_id and settings.ANALYTICS_ENABLED:
+        from app.analytics.events import PerformanceMetricRecorded
+        from app.analytics.writer import analytics_writer
+
+        for name, duration in current.durations().items():
+            analytics_writer.emit(PerformanceMetricRecorded(
+                file_uuid=current.file_id,
+                metric_name=f"span.{name}",
+                value=duration
+            ))
+
+    if settings.TRACE_EXPORT_DIR:
+        try:
+            export_dir = Path(settings.TRACE_EXPORT_DIR)
+            export_dir.mkdir(parents=True, exist_ok=True)
+            path = export_dir / f"{current.trace_id}.json"
+            path.write_text(json.dumps(current.to_chrome_trace(), default=str), encoding="utf-8")
+        except Exception as e:
+            print(f"⚠️ Failed to export trace {current.trace_id}: {e}")
@@ -1,11 +1,22 @@
+import asyncio
+import threading
+import time
 import uuid
 from pathlib import Path
 from datetime import datetime, timezone
-import httpx
-import whisper
 import os
 from typing import Tuple
 from app.config import settings
+from app.metrics import MODEL_LOAD_SECONDS
+from app.redis_client import redis_client
+from app.storage import content_etag, create_transcript_store
+from app.tracing import span
+
+# Модель нужна только процессам, которые выполняют инференс
+try:
+    import whisper
+except ImportError:
+    whisper = None
 
 
 class TranscriptionService:
@@ -13,6 +24,9 @@ class TranscriptionService:
 
     def __init__(self):
         self.model = None
+        # Whisper ставит хуки kv-кэша на модули модели, параллельные вызовы
+        # transcribe на одной модели небезопасны - инференс выполняется по очереди
+        self._inference_lock = threading.Lock()
         self.upload_dir = settings.upload_dir_path
         self.output_dir = settings.output_dir_path
         self.external_api_url = settings.EXTERNAL_API_URL
@@ -23,12 +37,21 @@ class TranscriptionService:
         self.upload_dir.mkdir(exist_ok=True)
         self.output_dir.mkdir(exist_ok=True)
 
+        # Файловая система, Postgres или S3 (STORAGE_BACKEND)
+        self.transcript_store = create_transcript_store()
+
     def load_model(self):
         """Загрузка модели Whisper"""
         if self.model is None:
+            if whisper is None:
+                raise RuntimeError("openai-whisper is not installed")
             print(f"🤖 Loading Whisper model: {settings.WHISPER_MODEL}")
-            self.model = whisper.load_model(settings.WHISPER_MODEL, device=settings.WHISPER_DEVICE)
-            print("✅ Whisper model loaded")
+            started = time.perf_counter()
+            with span("model_load", model=settings.WHISPER_MODEL):
+                self.model = whisper.load_model(settings.WHISPER_MODEL, device=settings.WHISPER_DEVICE)
+            elapsed = time.perf_counter() - started
+            MODEL_LOAD_SECONDS.labels(settings.WHISPER_MODEL).set(elapsed)
+            print(f"✅ Whisper model loaded in {elapsed:.1f}s")
         return self.model
 
     async def save_upload_file(self, file) -> Tuple[Path, str]:
@@ -42,8 +65,9 @@ class TranscriptionService:
 
         # Сохраняем файл
         content = await file.read()
-        with open(file_path, 'wb') as f:
-            f.write(content)
+        with span("upload_write", bytes=len(content)):
+            with open(file_path, 'wb') as f:
+                f.write(content)
 
         print(f"💾 File saved: {file_path}")
         return file_path, file_id
@@ -57,15 +81,17 @@ class TranscriptionService:
         start_time = datetime.now(timezone.utc)
 
         try:
-            # Загружаем модель если еще не загружена
-            model = self.load_model()
-
-            # Транскрибируем
-            result = model.transcribe(
-                str(audio_path),
-                language=language if language != "auto" else None,
-                fp16=False
-            )
+            with self._inference_lock:
+                # Загружаем модель если еще не загружена
+                model = self.load_model()
+
+                # Транскрибируем
+                with span("inference", language=language):
+                    result = model.transcribe(
+                        str(audio_path),
+                        language=language if language != "auto" else None,
+                        fp16=False
+                    )
 
             text = result.get("text", "").strip()
             processing_time = (datetime.now(timezone.utc) - start_time).total_seconds()
@@ -78,50 +104,45 @@ class TranscriptionService:
             print(f"❌ Transcription error: {e}")
             raise Exception(f"Transcription failed: {str(e)}")
 
-    def save_transcription_text(self, file_id: str, text: str) -> Path:
+    def save_transcription_text(self, file_id: str, text: str):
         """
-        Сохранение текста транскрипции в файл
+        Сохранение сжатого текста транскрипции в хранилище,
+        возвращает расположение (путь к файлу или адрес объекта)
         """
-        filename = f"{file_id}_transcription.txt"
-        file_path = self.output_dir / filename
+        with span("save", bytes=len(text)):
+            location = self.transcript_store.write(file_id, text)
+        print(f"💾 Transcription saved: {location}")
 
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(text)
+        with span("cache"):
+            self.cache_transcript(file_id, text)
+        return location
+
+    def cache_transcript(self, file_id: str, text: str) -> dict:
+        """
+        Горячий слой в Redis: метаданные (ETag, размер) и текст свежих транскрипций,
+        чтобы повторные скачивания не читали диск
+        """
+        data = text.encode('utf-8')
+        meta = {"etag": content_etag(data), "size": len(data)}
 
-        print(f"💾 Transcription saved: {file_path}")
-        return file_path
+        redis_client.cache_transcript(
+            file_id, meta, settings.TRANSCRIPT_META_TTL,
+            text=text if len(data) <= settings.TRANSCRIPT_HOT_MAX_BYTES else None,
+            text_ttl=settings.TRANSCRIPT_HOT_TTL
+        )
+        return meta
 
     async def send_to_external_api(self, transcription_id: str, text: str) -> bool:
         """
-        Отправка транскрипции во внешний API
+        Постановка транскрипции в outbox внешнего API.
+        Саму отправку (пачками, с повторами) выполняет app.delivery
         """
         if not self.external_api_enabled:
             print("⚠️ External API is disabled")
             return False
 
-        print(f"🌍 Sending to external API: {self.external_api_url}")
-
-        try:
-            async with httpx.AsyncClient(timeout=self.external_api_timeout) as client:
-                payload = {
-                    "transcription_id": transcription_id,
-                    "text": text,
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                    "service": settings.APP_NAME
-                }
-
-                response = await client.post(self.external_api_url, json=payload)
-
-                if response.status_code == 200:
-                    print(f"✅ Successfully sent to external API")
-                    return True
-                else:
-                    print(f"❌ External API error: {response.status_code}")
-                    return False
-
-        except Exception as e:
-            print(f"❌ External API error: {e}")
-            return False
+        from app.delivery import delivery_service
+        return await asyncio.to_thread(delivery_service.enqueue_external_api, transcription_id, text)
 
     async def cleanup_files(self, audio_path: Path):
         """
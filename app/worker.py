@@ -0,0 +1,234 @@
+"""
+Воркер транскрипции: читает задачи из Redis Stream и выполняет инференс Whisper.
+
+Запуск:
+    python -m app.worker [--name worker-1]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import threading
+import traceback
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.analytics.collector import system_metrics_collector
+from app.analytics.histograms import latency_histograms
+from app.analytics.leaderboard import word_leaderboard
+from app.analytics.partitions import system_metrics_maintenance
+from app.analytics.writer import analytics_writer
+from app.config import settings
+from app.job_queue import TranscriptionQueue, transcription_queue
+from app.metrics import INFLIGHT_JOBS
+from app.pipeline import (
+    get_audio_duration, transcribe_with_fallback, finalize_transcription,
+    record_transcription_error, notify_callback
+)
+from app.tracing import trace
+from app.transcribition import transcription_service
+
+
+def process_job(job: Dict[str, Any], enqueued_at: Optional[datetime] = None) -> int:
+    """Обработка одной задачи, возвращает длину текста"""
+    with trace(trace_id=job.get("transcription_id"), file_id=job["file_id"]):
+        return _run_job(job, enqueued_at)
+
+
+def _run_job(job: Dict[str, Any], enqueued_at: Optional[datetime]) -> int:
+    file_id = job["file_id"]
+    language = job.get("language", "ru")
+    audio_path = transcription_service.upload_dir / job["audio_file"]
+
+    if not audio_path.exists():
+        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+    duration = get_audio_duration(audio_path, language)
+    start_time = datetime.now(timezone.utc)
+
+    try:
+        with INFLIGHT_JOBS.track_inprogress():
+            text = transcribe_with_fallback(transcription_service, audio_path, language)
+    except Exception as e:
+        print(f"❌ Transcription error: {e}")
+        record_transcription_error(file_id, str(e))
+        raise
+
+    processing_time = (datetime.now(timezone.utc) - start_time).total_seconds()
+    finalize_transcription(
+        transcription_service, file_id, text, language, processing_time, duration=duration
+    )
+
+    if enqueued_at:
+        # От постановки в очередь до готового текста, включая ожидание воркера
+        latency_histograms.observe(
+            'end_to_end', (datetime.now(timezone.utc) - enqueued_at).total_seconds(),
+            language=language, duration=duration
+        )
+
+    if settings.EXTERNAL_API_ENABLED:
+        asyncio.run(transcription_service.send_to_external_api(job["transcription_id"], text))
+
+    asyncio.run(transcription_service.cleanup_files(audio_path))
+    return len(text)
+
+
+def _parse_job(fields: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Задача из сообщения (None - сообщение повреждено)"""
+    try:
+        job = json.loads(fields["payload"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not isinstance(job, dict) or not job.get("file_id"):
+        return None
+    return job
+
+
+def _parse_enqueued_at(fields: Dict[str, str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(fields["enqueued_at"])
+    except (KeyError, ValueError):
+        return None
+
+
+class TranscriptionWorker:
+    """Потребитель очереди транскрипции"""
+
+    def __init__(self, queue: TranscriptionQueue, name: str):
+        self.queue = queue
+        self.name = name
+        self._stop = threading.Event()
+
+    def stop(self, *_args):
+        """Мягкая остановка: текущая задача дорабатывается до конца"""
+        print(f"🛑 [Worker {self.name}] Stopping after current job...")
+        self._stop.set()
+
+    def run(self):
+        """Основной цикл воркера"""
+        print(f"🚀 [Worker {self.name}] Listening on '{self.queue.stream}' (group '{self.queue.group}')")
+
+        while not self._stop.is_set():
+            try:
+                # Сначала подбираем задачи упавших воркеров, затем новые
+                messages = self.queue.reclaim_stale(self.name, settings.WORKER_CLAIM_IDLE_MS, count=1)
+                if messages:
+                    print(f"♻️ [Worker {self.name}] Reclaimed stale message {messages[0][0]}")
+                else:
+                    messages = self.queue.read(self.name, count=1, block_ms=settings.WORKER_BLOCK_MS)
+
+                for message_id, fields in messages:
+                    self.handle(message_id, fields)
+            except Exception as e:
+                print(f"❌ [Worker {self.name}] Queue error: {e}")
+                self._stop.wait(5)
+
+        print(f"👋 [Worker {self.name}] Stopped")
+
+    def handle(self, message_id: str, fields: Dict[str, str]):
+        """Обработка одного сообщения с heartbeat и подтверждением"""
+        deliveries = self.queue.delivery_count(message_id)
+
+        # Поврежденное сообщение не обработается ни с какой попытки - сразу в dead-letter
+        job = _parse_job(fields)
+        if job is None:
+            reason = "Malformed job payload"
+            print(f"☠️ [Worker {self.name}] {message_id}: {reason}, moving to dead-letter stream")
+            self.queue.dead_letter(message_id, fields, reason)
+            return
+
+        file_id = job["file_id"]
+        if deliveries > settings.WORKER_MAX_DELIVERIES:
+            reason = f"Delivered {deliveries} times without acknowledgement"
+            print(f"☠️ [Worker {self.name}] {file_id}: {reason}, moving to dead-letter stream")
+            self.queue.dead_letter(message_id, fields, reason)
+            self.queue.set_job_status(file_id, "failed", error=reason)
+            record_transcription_error(file_id, reason)
+            self._notify(job, "failed", error=reason)
+            return
+
+        self.queue.set_job_status(file_id, "processing", worker=self.name, attempt=deliveries)
+
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(message_id, heartbeat_stop), daemon=True
+        )
+        heartbeat.start()
+
+        try:
+            text_length = process_job(job, _parse_enqueued_at(fields))
+            self.queue.set_job_status(file_id, "completed", text_length=text_length)
+            self._notify(job, "completed", text_length=text_length,
+                         download_url=f"/transcriptions/{file_id}/download")
+            print(f"✅ [Worker {self.name}] Job {file_id} completed")
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.set_job_status(file_id, "failed", error=str(e)[:500])
+            self._notify(job, "failed", error=str(e))
+            print(f"❌ [Worker {self.name}] Job {file_id} failed: {e}")
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+
+        self.queue.ack(message_id)
+
+    def _notify(self, job: Dict[str, Any], status: str, **data):
+        """Вебхук клиенту, если он передал callback_url"""
+        notify_callback(job.get("callback_url"), f"transcription.{status}", {
+            'file_id': job["file_id"],
+            'transcription_id': job.get("transcription_id"),
+            'status': status,
+            **data
+        })
+
+    def _heartbeat(self, message_id: str, stop: threading.Event):
+        """Периодически продлеваем владение сообщением, пока идет инференс"""
+        while not stop.wait(settings.WORKER_HEARTBEAT_SECONDS):
+            try:
+                self.queue.heartbeat(self.name, message_id)
+            except Exception as e:
+                print(f"⚠️ [Worker {self.name}] Heartbeat error: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcription queue worker")
+    parser.add_argument(
+        "--name",
+        default=settings.WORKER_NAME or f"{socket.gethostname()}-{os.getpid()}",
+        help="Consumer name inside the group"
+    )
+    args = parser.parse_args()
+
+    if not transcription_queue.available or not transcription_queue.client.check():
+        raise SystemExit("❌ Redis is not available, worker cannot start")
+
+    # Модель загружаем заранее, чтобы первая задача не ждала
+    transcription_service.load_model()
+
+    if settings.SYSTEM_METRICS_ENABLED:
+        system_metrics_collector.service = "transcription-worker"
+        system_metrics_collector.start()
+        # Проход обслуживания выполняет один процесс (advisory lock), API или воркер
+        system_metrics_maintenance.start()
+    if settings.ANALYTICS_ENABLED:
+        analytics_writer.start()
+        latency_histograms.start()
+        word_leaderboard.start()
+
+    worker = TranscriptionWorker(transcription_queue, args.name)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    try:
+        worker.run()
+    finally:
+        system_metrics_collector.stop()
+        system_metrics_maintenance.stop()
+        latency_histograms.stop()
+        analytics_writer.stop()
+        word_leaderboard.stop()
+
+
+if __name__ == "__main__":
+    main()
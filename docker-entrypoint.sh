@@ -13,6 +13,10 @@ fi
 # Функция для запуска API
 start_api() {
     echo "🌐 Starting FastAPI server on port 8000..."
+    # Метрики прошлых запусков в мультипроцессном режиме не нужны
+    if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+        rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    fi
     uvicorn app.main:app --host 0.0.0.0 --port 8000 &
     API_PID=$!
     echo "✅ API started (PID: $API_PID)"
@@ -97,6 +101,7 @@ echo ""
 if [ "$MODE" = "api" ] || [ "$MODE" = "all" ]; then
     echo "🌐 API Documentation: http://localhost:8000/docs"
     echo "🌐 API Health check: http://localhost:8000/health"
+    echo "🌐 API Metrics: http://localhost:8000/metrics"
 fi
 
 if [ "$MODE" = "demo" ] || [ "$MODE" = "all" ]; then
@@ -15,7 +15,64 @@ CREATE TABLE IF NOT EXISTS transcription_records (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     completed_at TIMESTAMP,
     transcription_id VARCHAR(255),
-    file_uuid VARCHAR(255)
+    file_uuid VARCHAR(255),
+    model VARCHAR(50),
+    transcript_text TEXT
+);
+
+ALTER TABLE transcription_records ADD COLUMN IF NOT EXISTS model VARCHAR(50);
+ALTER TABLE transcription_records ADD COLUMN IF NOT EXISTS transcript_text TEXT;
+
+-- Поисковый вектор текста: словарь выбирается по языку записи
+ALTER TABLE transcription_records ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        to_tsvector(
+            CASE language WHEN 'ru' THEN 'russian'::regconfig WHEN 'en' THEN 'english'::regconfig ELSE 'simple'::regconfig END,
+            COALESCE(transcript_text, '')
+        )
+    ) STORED;
+
+-- Тексты транскрипций (STORAGE_BACKEND=postgres). Данные уже сжаты zstd/gzip,
+-- поэтому TOAST не сжимает их повторно и substring() читает порции без распаковки
+CREATE TABLE IF NOT EXISTS transcript_blobs (
+    file_id VARCHAR(255) PRIMARY KEY,
+    encoding VARCHAR(10) NOT NULL DEFAULT 'identity',
+    size INTEGER NOT NULL,
+    data BYTEA NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE transcript_blobs ALTER COLUMN data SET STORAGE EXTERNAL;
+
+-- Инкрементальный TF-IDF индекс (app/analytics/keywords.py).
+-- Разреженные векторы документов - строки word_statistics
+CREATE TABLE IF NOT EXISTS indexed_documents (
+    file_uuid VARCHAR(255) PRIMARY KEY,
+    language VARCHAR(10) NOT NULL,
+    term_count INTEGER NOT NULL DEFAULT 0,
+    indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS corpus_documents (
+    language VARCHAR(10) PRIMARY KEY,
+    documents BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS term_document_frequency (
+    term VARCHAR(100) NOT NULL,
+    language VARCHAR(10) NOT NULL,
+    df BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (term, language)
+);
+
+CREATE TABLE IF NOT EXISTS document_keywords (
+    file_uuid VARCHAR(255) NOT NULL,
+    term VARCHAR(100) NOT NULL,
+    language VARCHAR(10) NOT NULL,
+    score FLOAT NOT NULL,
+    position INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (file_uuid, term)
 );
 
 -- Таблица для метрик производительности
@@ -28,15 +85,58 @@ CREATE TABLE IF NOT EXISTS performance_metrics (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Таблица для системных метрик
+-- Таблица для системных метрик (минутные значения, секции по дням).
+-- Новые секции создает и старые удаляет app.analytics.partitions.
+-- На существующей базе со старой несекционированной system_metrics
+-- CREATE TABLE IF NOT EXISTS ничего не меняет: секции ниже пропускаются,
+-- таблицу нужно перевести командой python -m app.analytics.partitions --migrate
 CREATE TABLE IF NOT EXISTS system_metrics (
-    id SERIAL PRIMARY KEY,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    id BIGSERIAL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     metric_type VARCHAR(50) NOT NULL,
     metric_value FLOAT NOT NULL,
     service VARCHAR(50) DEFAULT 'transcription',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Часовые агрегаты системных метрик (долгое хранение, секции по месяцам)
+CREATE TABLE IF NOT EXISTS system_metrics_hourly (
+    hour TIMESTAMP NOT NULL,
+    metric_type VARCHAR(50) NOT NULL,
+    service VARCHAR(50) NOT NULL DEFAULT 'transcription',
+    avg_value DOUBLE PRECISION NOT NULL,
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (hour, metric_type, service)
+) PARTITION BY RANGE (hour);
+
+-- Секции на ближайшие дни, чтобы запись работала до первого запуска обслуживания,
+-- и секция по умолчанию на случай, если обслуживание не запускалось дольше
+DO $$
+DECLARE
+    day DATE;
+    month DATE := date_trunc('month', CURRENT_DATE)::date;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('system_metrics')) <> 'p' THEN
+        RAISE WARNING 'system_metrics is not partitioned, run: python -m app.analytics.partitions --migrate';
+        RETURN;
+    END IF;
+
+    CREATE TABLE IF NOT EXISTS system_metrics_default PARTITION OF system_metrics DEFAULT;
+    FOR offset_days IN 0..3 LOOP
+        day := CURRENT_DATE + offset_days;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF system_metrics FOR VALUES FROM (%L) TO (%L)',
+            'system_metrics_p' || to_char(day, 'YYYYMMDD'), day, day + 1
+        );
+    END LOOP;
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF system_metrics_hourly FOR VALUES FROM (%L) TO (%L)',
+        'system_metrics_hourly_p' || to_char(month, 'YYYYMM'), month, (month + INTERVAL '1 month')::date
+    );
+END $$;
 
 -- Таблица для статистики слов
 CREATE TABLE IF NOT EXISTS word_statistics (
@@ -48,12 +148,87 @@ CREATE TABLE IF NOT EXISTS word_statistics (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Агрегаты транскрипций по часам/дням (обновляются при смене статуса записи)
+CREATE TABLE IF NOT EXISTS transcription_rollups_hourly (
+    bucket TIMESTAMP NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    language VARCHAR(10) NOT NULL DEFAULT 'unknown',
+    model VARCHAR(50) NOT NULL DEFAULT 'unknown',
+    count BIGINT NOT NULL DEFAULT 0,
+    processing_time_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    processing_time_min DOUBLE PRECISION,
+    processing_time_max DOUBLE PRECISION,
+    text_length_sum BIGINT NOT NULL DEFAULT 0,
+    text_length_max INTEGER,
+    duration_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, status, language, model)
+);
+
+CREATE TABLE IF NOT EXISTS transcription_rollups_daily (
+    bucket TIMESTAMP NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    language VARCHAR(10) NOT NULL DEFAULT 'unknown',
+    model VARCHAR(50) NOT NULL DEFAULT 'unknown',
+    count BIGINT NOT NULL DEFAULT 0,
+    processing_time_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    processing_time_min DOUBLE PRECISION,
+    processing_time_max DOUBLE PRECISION,
+    text_length_sum BIGINT NOT NULL DEFAULT 0,
+    text_length_max INTEGER,
+    duration_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, status, language, model)
+);
+
+-- Гистограммы задержек этапов пайплайна по часам (корзины см. app/analytics/histograms.py)
+CREATE TABLE IF NOT EXISTS latency_histograms (
+    bucket TIMESTAMP NOT NULL,
+    stage VARCHAR(50) NOT NULL,
+    model VARCHAR(50) NOT NULL,
+    language VARCHAR(10) NOT NULL,
+    duration_bucket VARCHAR(20) NOT NULL,
+    counts BIGINT[] NOT NULL,
+    total DOUBLE PRECISION NOT NULL DEFAULT 0,
+    min_value DOUBLE PRECISION,
+    max_value DOUBLE PRECISION,
+    PRIMARY KEY (bucket, stage, model, language, duration_bucket)
+);
+
+-- Накопительные счетчики слов (обновляются через INSERT ... ON CONFLICT)
+CREATE TABLE IF NOT EXISTS word_totals (
+    word VARCHAR(100) NOT NULL,
+    language VARCHAR(10) NOT NULL DEFAULT 'unknown',
+    count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (word, language)
+);
+
+-- Outbox исходящих доставок (внешний API)
+CREATE TABLE IF NOT EXISTS delivery_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(20) NOT NULL DEFAULT 'external_api',
+    target_url TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_status_code INTEGER,
+    last_error TEXT,
+    latency_ms FLOAT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    delivered_at TIMESTAMP
+);
+
 -- Индексы для производительности
-CREATE INDEX IF NOT EXISTS idx_transcription_records_created_at ON transcription_records(created_at);
-CREATE INDEX IF NOT EXISTS idx_transcription_records_status ON transcription_records(status);
+-- Keyset-пагинация GET /transcriptions: порядок (created_at, id) с фильтрами
+CREATE INDEX IF NOT EXISTS idx_transcription_records_created_id ON transcription_records(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_transcription_records_status_created ON transcription_records(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_transcription_records_language_created ON transcription_records(language, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_transcription_records_filename_prefix ON transcription_records(filename text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_transcription_records_search ON transcription_records USING GIN (search_vector);
 CREATE INDEX IF NOT EXISTS idx_transcription_records_file_uuid ON transcription_records(file_uuid);
 CREATE INDEX IF NOT EXISTS idx_performance_metrics_file_uuid ON performance_metrics(file_uuid);
-CREATE INDEX IF NOT EXISTS idx_system_metrics_timestamp ON system_metrics(timestamp);
-CREATE INDEX IF NOT EXISTS idx_system_metrics_metric_type ON system_metrics(metric_type);
+CREATE INDEX IF NOT EXISTS idx_system_metrics_type_timestamp ON system_metrics(metric_type, timestamp);
 CREATE INDEX IF NOT EXISTS idx_word_statistics_file_uuid ON word_statistics(file_uuid);
-
+CREATE INDEX IF NOT EXISTS idx_document_keywords_created ON document_keywords(created_at);
+CREATE INDEX IF NOT EXISTS idx_word_totals_count ON word_totals(count DESC);
+CREATE INDEX IF NOT EXISTS idx_delivery_outbox_pending ON delivery_outbox(next_attempt_at) WHERE status = 'pending';
@@ -147,11 +147,22 @@ if uploaded_file and file_size <= max_size:
 st.header("📈 Аналитика")
 
 try:
-    response = requests.get(f"{api_url}/analytics/overview", timeout=10)
-
-    if response.status_code == 200:
+    # Условный запрос: при неизменившемся обзоре API отвечает 304 без тела
+    cached_overview = st.session_state.get("analytics_overview")
+    headers = {"If-None-Match": cached_overview["etag"]} if cached_overview else {}
+    response = requests.get(f"{api_url}/analytics/overview", headers=headers, timeout=10)
+
+    analytics_data = None
+    if response.status_code == 304 and cached_overview:
+        analytics_data = cached_overview["data"]
+    elif response.status_code == 200:
         analytics_data = response.json()
+        st.session_state["analytics_overview"] = {
+            "etag": response.headers.get("ETag"),
+            "data": analytics_data
+        }
 
+    if analytics_data:
         if analytics_data.get('status') == 'success':
             data = analytics_data.get('data', {})
 
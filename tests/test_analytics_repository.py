@@ -0,0 +1,130 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.repository import AnalyticsRepository, decode_cursor, decode_search_cursor
+from app.analytics.rollups import resolve_range
+
+
+def test_word_statistics_single_statement():
+    """Статистика слов пишется одним запросом с агрегированными счетчиками"""
+    db = MagicMock()
+    repository = AnalyticsRepository(db)
+
+    assert repository.add_word_statistics("file-1", [
+        {'word': 'привет', 'count': 2, 'language': 'ru'},
+        {'word': 'мир', 'count': 1, 'language': 'ru'},
+        {'word': 'привет', 'count': 3, 'language': 'ru'},
+        {'word': 'hello', 'count': 1, 'language': None},
+    ])
+
+    assert db.execute.call_count == 1
+    db.commit.assert_called_once()
+    params = db.execute.call_args[0][1]
+    totals = dict(zip(zip(params['words'], params['languages']), params['counts']))
+    assert totals == {('привет', 'ru'): 5, ('мир', 'ru'): 1, ('hello', 'unknown'): 1}
+    assert set(params['file_uuids']) == {"file-1"}
+
+
+def test_word_statistics_empty_is_noop():
+    db = MagicMock()
+    assert AnalyticsRepository(db).add_word_statistics("file-1", [])
+    db.execute.assert_not_called()
+
+
+def test_status_change_updates_rollups():
+    """Смена статуса записи и обновление агрегатов выполняются одним запросом"""
+    db = MagicMock()
+    AnalyticsRepository(db).complete_transcription_records([{
+        'file_uuid': 'file-1', 'text_length': 10, 'processing_time': 1.5,
+        'confidence_score': None, 'duration': None, 'completed_at': None
+    }])
+
+    assert db.execute.call_count == 1
+    sql = str(db.execute.call_args[0][0])
+    assert "UPDATE transcription_records" in sql
+    assert "INSERT INTO transcription_rollups_hourly" in sql
+    assert "INSERT INTO transcription_rollups_daily" in sql
+
+
+def test_leaving_completed_subtracts_metrics():
+    """Уход из completed снимает со старого агрегата и счетчик, и суммы метрик"""
+    db = MagicMock()
+    AnalyticsRepository(db).fail_transcription_records([{
+        'file_uuid': 'file-1', 'error_message': 'boom', 'completed_at': None
+    }])
+
+    sql = str(db.execute.call_args[0][0])
+    assert "processing_time AS old_processing_time" in sql
+    assert "CASE WHEN old_status = 'completed' THEN -old_processing_time END" in sql
+    assert "CASE WHEN old_status = 'completed' THEN -old_duration END" in sql
+    # Снятие не портит min/max агрегата
+    assert "MIN(processing_time) FILTER (WHERE delta > 0)" in sql
+
+
+def test_rollup_range_is_day_aligned():
+    """Диапазон пересчета выравнивается по суткам"""
+    now = datetime(2024, 3, 10, 15, 30, tzinfo=timezone.utc)
+
+    assert resolve_range(2, None, None, now=now) == (datetime(2024, 3, 9), datetime(2024, 3, 11))
+    assert resolve_range(2, "2024-01-01T12:00", "2024-01-05", now=now) == (
+        datetime(2024, 1, 1), datetime(2024, 1, 5)
+    )
+
+
+def test_transcription_history_keyset_page():
+    """Следующая страница продолжается после (created_at, id) последней записи"""
+    db = MagicMock()
+    created = [datetime(2024, 5, 10, 12, 0, 3 - i) for i in range(3)]
+    db.execute.return_value.fetchall.return_value = [
+        (f"file-{i}", f"tr-{i}", f"call_{i}.mp3", "ru", "base", "completed",
+         10.0, 120, 1.5, None, created[i], created[i])
+        for i in range(3)
+    ]
+    repository = AnalyticsRepository(db)
+
+    page = repository.list_transcriptions(limit=2, status="completed", filename_prefix="call_%")
+
+    assert [item['id'] for item in page['items']] == ["file-0", "file-1"]
+    assert decode_cursor(page['next_cursor']) == (created[1], "file-1")
+    params = db.execute.call_args[0][1]
+    assert params['limit'] == 3
+    assert params['filename_prefix'] == "call\\_\\%%"
+
+    repository.list_transcriptions(limit=2, cursor=page['next_cursor'])
+    query, params = db.execute.call_args[0]
+    assert "(created_at, id) < (:cursor_created_at, :cursor_id)" in str(query)
+    assert (params['cursor_created_at'], params['cursor_id']) == (created[1], "file-1")
+
+
+def test_transcription_history_invalid_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_search_ranked_page_with_cursor():
+    """Поиск по GIN-индексу, следующая страница продолжается после (rank, id)"""
+    db = MagicMock()
+    db.execute.return_value.fetchall.return_value = [
+        ("file-1", "tr-1", "a.mp3", "ru", datetime(2024, 5, 10), 0.25, "<mark>договор</mark> подписан"),
+        ("file-2", "tr-2", "b.mp3", "ru", datetime(2024, 5, 9), 0.125, "о <mark>договоре</mark>")
+    ]
+    repository = AnalyticsRepository(db)
+
+    page = repository.search_transcriptions("договор", limit=1, language="ru")
+
+    assert page['items'][0]['snippet'] == "<mark>договор</mark> подписан"
+    assert decode_search_cursor(page['next_cursor']) == (0.25, "file-1")
+    query, params = db.execute.call_args[0]
+    assert "search_vector @@" in str(query) and "ts_headline" in str(query)
+    assert params == {'q': "договор", 'limit': 2, 'language': "ru"}
+
+    repository.search_transcriptions("договор", limit=1, cursor=page['next_cursor'])
+    params = db.execute.call_args[0][1]
+    assert (params['cursor_rank'], params['cursor_id']) == (0.25, "file-1")
@@ -0,0 +1,117 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.events import (
+    TranscriptionStarted,
+    TranscriptionCompleted,
+    WordStatisticsRecorded,
+    PerformanceMetricRecorded
+)
+from app.analytics.writer import AnalyticsWriter
+
+
+def _writer(**kwargs) -> AnalyticsWriter:
+    options = dict(max_buffer=100, batch_size=50, flush_interval=0.05, critical_overflow=0)
+    options.update(kwargs)
+    return AnalyticsWriter(**options)
+
+
+def test_batch_is_one_transaction(mocker):
+    """События нескольких транскрипций пишутся одной транзакцией"""
+    get_db_session = mocker.patch("app.database.get_db_session")
+    repository = mocker.patch("app.analytics.repository.AnalyticsRepository").return_value
+    writer = _writer()
+
+    for file_id in ("a", "b"):
+        writer.emit(TranscriptionStarted(file_uuid=file_id, filename=f"{file_id}.mp3"))
+        writer.emit(TranscriptionCompleted(file_uuid=file_id, text_length=10, processing_time=1.5))
+        writer.emit(PerformanceMetricRecorded(file_uuid=file_id, metric_name='transcription_time', value=1.5))
+        writer.emit(WordStatisticsRecorded(file_uuid=file_id, words=[{'word': 'слово', 'count': 2, 'language': 'ru'}]))
+
+    assert writer.flush() == 8
+    assert get_db_session.call_count == 1
+
+    started = repository.insert_transcription_records.call_args[0][0]
+    assert [row['file_uuid'] for row in started] == ["a", "b"]
+    assert len(repository.complete_transcription_records.call_args[0][0]) == 2
+    assert len(repository.insert_performance_metrics.call_args[0][0]) == 2
+    words = repository.insert_word_statistics.call_args[0][0]
+    assert {(row['file_uuid'], row['word'], row['count']) for row in words} == {("a", "слово", 2), ("b", "слово", 2)}
+    assert writer.stats['written'] == 8
+
+
+def test_full_buffer_drops_events():
+    """При переполнении буфера события отбрасываются и считаются"""
+    writer = _writer(max_buffer=2)
+
+    assert writer.emit(PerformanceMetricRecorded(file_uuid="a", metric_name='m', value=1))
+    assert writer.emit(TranscriptionStarted(file_uuid="a"))
+    assert not writer.emit(PerformanceMetricRecorded(file_uuid="b", metric_name='m', value=1))
+    assert not writer.emit(TranscriptionStarted(file_uuid="b"))
+
+    assert writer.dropped == {'PerformanceMetricRecorded': 1, 'TranscriptionStarted': 1}
+    assert writer.pending == 2
+
+
+def test_critical_events_overflow_without_blocking(mocker):
+    """Critical события при полной очереди уходят в резерв сразу, без ожидания, и пишутся после очереди"""
+    mocker.patch("app.database.get_db_session")
+    repository = mocker.patch("app.analytics.repository.AnalyticsRepository").return_value
+    writer = _writer(max_buffer=1, critical_overflow=2)
+
+    started = time.perf_counter()
+    assert writer.emit(TranscriptionStarted(file_uuid="a"))
+    assert writer.emit(TranscriptionStarted(file_uuid="b"))
+    assert writer.emit(TranscriptionStarted(file_uuid="c"))
+    assert not writer.emit(TranscriptionStarted(file_uuid="d"))
+    assert time.perf_counter() - started < 0.05
+
+    assert writer.snapshot_stats()['pending'] == 3
+    assert writer.flush() == 3
+    started_rows = repository.insert_transcription_records.call_args[0][0]
+    assert [row['file_uuid'] for row in started_rows] == ["a", "b", "c"]
+    assert writer.dropped == {'TranscriptionStarted': 1}
+
+
+def test_concurrent_emit_counts_every_event():
+    """Счетчики не теряют приращения при emit из многих потоков"""
+    writer = _writer(max_buffer=100000)
+
+    def emit_many():
+        for _ in range(2000):
+            writer.emit(PerformanceMetricRecorded(file_uuid="a", metric_name='m', value=1))
+
+    threads = [threading.Thread(target=emit_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert writer.stats['enqueued'] == 16000
+
+
+def test_write_now_bypasses_queue(mocker):
+    """Старт в режиме очереди пишется сразу, мимо буфера"""
+    mocker.patch("app.database.get_db_session")
+    repository = mocker.patch("app.analytics.repository.AnalyticsRepository").return_value
+    writer = _writer()
+
+    assert writer.write_now(TranscriptionStarted(file_uuid="a", filename="a.mp3"))
+
+    assert [row['file_uuid'] for row in repository.insert_transcription_records.call_args[0][0]] == ["a"]
+    assert writer.pending == 0
+    assert writer.stats['written'] == 1
+
+
+def test_write_now_falls_back_to_queue(mocker):
+    """Ошибка БД при синхронной записи - событие остается в буфере для повтора"""
+    mocker.patch("app.database.get_db_session", side_effect=ConnectionError("db down"))
+    writer = _writer()
+
+    assert writer.write_now(TranscriptionStarted(file_uuid="a")) is False
+    assert writer.pending == 1
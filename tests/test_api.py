@@ -3,6 +3,7 @@ import json
 import io
 import traceback
 import asyncio
+import contextlib
 from pathlib import Path
 from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
@@ -14,8 +15,9 @@ import os
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.main import app
-from app.services import TranscriptionService
+from app.transcribition import TranscriptionService, whisper
 from app.models import TranscriptionResponse
+from app.storage import TranscriptStore, StoredTranscript
 
 # Создаем тестового клиента
 client = TestClient(app)
@@ -66,6 +68,46 @@ class TestTranscriptionAPI:
         assert result["text_length"] > 0
         assert "download_url" in result
 
+    def test_error_after_finalize_not_recorded_as_failure(self, mock_transcription_service):
+        """Ошибка после сохранения транскрипции не переводит запись в failed"""
+        files = {"file": ("test_audio.mp3", io.BytesIO(TEST_AUDIO_CONTENT), "audio/mp3")}
+
+        with patch('app.main.finalize_transcription') as finalize, \
+                patch('app.main.notify_callback', side_effect=RuntimeError("callback down")) as notify, \
+                patch('app.main.record_transcription_error') as record_error:
+            response = client.post("/transcribe", files=files, data={"language": "ru"})
+
+        assert response.status_code == 500
+        finalize.assert_called_once()
+        record_error.assert_not_called()
+        assert [call.args[1] for call in notify.call_args_list] == ["transcription.completed"]
+
+    def test_queue_mode_enqueues_off_event_loop(self, mock_transcription_service):
+        """Режим очереди: XADD выполняется в пуле потоков, ответ - queued"""
+        offloaded = []
+        to_thread = asyncio.to_thread
+
+        async def spy_to_thread(func, *args, **kwargs):
+            offloaded.append(func)
+            return await to_thread(func, *args, **kwargs)
+
+        files = {"file": ("test_audio.mp3", io.BytesIO(TEST_AUDIO_CONTENT), "audio/mp3")}
+        with patch('app.main.settings.QUEUE_ENABLED', True), \
+                patch('app.main.settings.ANALYTICS_ENABLED', True), \
+                patch('app.main.analytics_writer') as writer, \
+                patch('app.main.transcription_queue') as queue, \
+                patch('app.main.asyncio.to_thread', side_effect=spy_to_thread):
+            queue.enqueue.return_value = "1-0"
+            response = client.post("/transcribe", files=files, data={"language": "ru"})
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "queued"
+        queue.enqueue.assert_called_once()
+        assert queue.enqueue in offloaded
+        # Старт записан в БД до постановки задачи, а не оставлен в буфере API
+        assert offloaded.index(writer.write_now) < offloaded.index(queue.enqueue)
+        writer.emit.assert_not_called()
+
     def test_transcribe_invalid_file_extension(self):
         """Тест с недопустимым расширением файла"""
         files = {
@@ -104,6 +146,33 @@ class TestTranscriptionAPI:
         assert download_response.headers["content-type"].startswith("text/plain")
         assert "transcription_" in download_response.headers["content-disposition"]
 
+    def test_download_conditional_request(self, mock_transcription_service):
+        """Повторный запрос с If-None-Match возвращает 304"""
+        response = client.get(f"/transcriptions/{TEST_UUID}/download")
+
+        assert response.status_code == 200
+        assert "immutable" in response.headers["cache-control"]
+        etag = response.headers["etag"]
+
+        cached_response = client.get(
+            f"/transcriptions/{TEST_UUID}/download",
+            headers={"If-None-Match": etag}
+        )
+
+        assert cached_response.status_code == 304
+        assert cached_response.headers["etag"] == etag
+
+    def test_download_byte_range(self, mock_transcription_service):
+        """Запрос диапазона байт возвращает 206 и часть текста"""
+        response = client.get(
+            f"/transcriptions/{TEST_UUID}/download",
+            headers={"Range": "bytes=0-9"}
+        )
+
+        assert response.status_code == 206
+        assert response.content == TEST_TRANSCRIPTION_TEXT.encode("utf-8")[:10]
+        assert response.headers["content-range"].startswith("bytes 0-9/")
+
     def test_download_nonexistent_transcription(self):
         """Тест скачивания несуществующей транскрипции"""
         response = client.get(f"/transcriptions/{TEST_UUID}/download")
@@ -186,9 +255,10 @@ class TestTranscriptionService:
         file_path, file_id = asyncio.run(service.save_upload_file(mock_file))
 
         assert file_path.exists()
-        assert file_path.suffix == ".wav"
+        assert file_path.suffix == ".mp3"
 
-    @patch('app.services.whisper.load_model')
+    @pytest.mark.skipif(whisper is None, reason="openai-whisper not installed")
+    @patch('app.transcribition.whisper.load_model')
     def test_transcribe_audio_success(self, mock_load_model, tmp_path):
         """Тест успешного транскрибирования аудио"""
         service = TranscriptionService()
@@ -216,14 +286,16 @@ class TestTranscriptionService:
     def test_transcribe_audio_file_not_found(self):
         """Тест транскрибирования несуществующего файла"""
         service = TranscriptionService()
+        service.model = MagicMock()
+        service.model.transcribe.side_effect = FileNotFoundError("/nonexistent/file.wav")
 
-        with pytest.raises(FileNotFoundError):
+        with pytest.raises(Exception, match="Transcription failed"):
             service.transcribe_audio(Path("/nonexistent/file.wav"), "ru")
 
     def test_save_transcription_text(self, tmp_path):
         """Тест сохранения текста транскрипции"""
         service = TranscriptionService()
-        service.output_dir = tmp_path
+        service.transcript_store = TranscriptStore(tmp_path, compression="gzip", shard_depth=2)
 
         file_id = TEST_UUID
         text = TEST_TRANSCRIPTION_TEXT
@@ -232,57 +304,56 @@ class TestTranscriptionService:
         file_path = service.save_transcription_text(file_id, text)
 
         assert file_path.exists()
-        assert file_path.name == f"{file_id}_transcription.txt"
-        assert file_path.parent == tmp_path
+        assert file_path.name == f"{file_id}_transcription.txt.gz"
+        # Файл лежит в поддиректории шарда, а не в корне outputs
+        assert file_path.parent.parent.parent == tmp_path
 
         # Проверяем содержимое
-        with open(file_path, "r", encoding="utf-8") as f:
-            assert f.read() == text
+        assert service.transcript_store.read_text(file_id) == text
 
-    @patch('app.services.httpx.AsyncClient')
-    def test_send_to_external_api_success(self, mock_async_client):
-        """Тест успешной отправки во внешний API"""
+    def test_send_to_external_api_success(self):
+        """Транскрипция ставится в outbox внешнего API"""
         service = TranscriptionService()
+        service.external_api_enabled = True
+        db = MagicMock()
+        db.execute.return_value.scalar.return_value = 1
+
+        with patch('app.delivery.get_db_session', return_value=contextlib.nullcontext(db)):
+            result = asyncio.run(service.send_to_external_api(TEST_UUID, TEST_TRANSCRIPTION_TEXT))
+
+        assert result is True
+        params = db.execute.call_args.args[1]
+        assert params['kind'] == 'external_api'
+        payload = json.loads(params['payload'])
+        assert payload['transcription_id'] == TEST_UUID
+        assert payload['text'] == TEST_TRANSCRIPTION_TEXT
+
+    def test_send_to_external_api_disabled(self):
+        """Внешний API выключен - в outbox ничего не пишется"""
+        service = TranscriptionService()
+        service.external_api_enabled = False
 
-        # Мокаем успешный ответ
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"success": True}
-
-        mock_client_instance = AsyncMock()
-        mock_client_instance.__aenter__.return_value = mock_client_instance
-        mock_client_instance.__aexit__.return_value = None
-        mock_client_instance.post.return_value = mock_response
-
-        mock_async_client.return_value = mock_client_instance
-
-        # Отправляем
-        result = asyncio.run(service.send_to_external_api(TEST_UUID, TEST_TRANSCRIPTION_TEXT))
-
-        assert result["status"] == "success"
-        assert result["external_api_response"]["status_code"] == 200
+        with patch('app.delivery.get_db_session') as get_session:
+            assert asyncio.run(service.send_to_external_api(TEST_UUID, TEST_TRANSCRIPTION_TEXT)) is False
+        get_session.assert_not_called()
 
     def test_cleanup_files(self, tmp_path):
         """Тест очистки временных файлов"""
         service = TranscriptionService()
 
-        # Создаем тестовые файлы
-        file1 = tmp_path / "file1.txt"
-        file2 = tmp_path / "file2.txt"
-        file1.write_text("test1")
-        file2.write_text("test2")
+        audio_file = tmp_path / "audio.mp3"
+        audio_file.write_bytes(TEST_AUDIO_CONTENT)
 
-        # Очищаем
-        service.cleanup_files(file1, file2)
+        asyncio.run(service.cleanup_files(audio_file))
 
-        # Проверяем что файлы удалены
-        assert not file1.exists()
-        assert not file2.exists()
+        assert not audio_file.exists()
+        # Повторная очистка уже удаленного файла не падает
+        asyncio.run(service.cleanup_files(audio_file))
 
 
 # Фикстуры pytest
 @pytest.fixture
-def mock_transcription_service():
+def mock_transcription_service(tmp_path):
     """Фикстура для мока сервиса транскрибирования"""
     with patch('app.main.transcription_service') as mock_service:
         # Настраиваем мок
@@ -303,12 +374,15 @@ def mock_transcription_service():
         )
         mock_service.cleanup_files = MagicMock()
 
-        # Мокаем проверку существования файла для скачивания
-        mock_output_dir = MagicMock()
-        mock_file = MagicMock()
-        mock_file.exists.return_value = True
-        mock_output_dir.__truediv__.return_value = mock_file
-        mock_service.output_dir = mock_output_dir
+        # Мокаем хранилище: любой запрошенный файл существует
+        transcript_file = tmp_path / f"{TEST_UUID}_transcription.txt"
+        transcript_file.write_text(TEST_TRANSCRIPTION_TEXT, encoding="utf-8")
+        mock_service.transcript_store.find.return_value = StoredTranscript(
+            path=transcript_file, encoding="identity", size=transcript_file.stat().st_size
+        )
+        mock_service.transcript_store.read_bytes.side_effect = lambda stored: stored.path.read_bytes()
+        mock_service.transcript_store.decompress.side_effect = lambda data, encoding: data
+        mock_service.transcript_store.presigned_url.return_value = None
 
         yield mock_service
 
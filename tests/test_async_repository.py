@@ -0,0 +1,37 @@
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.async_repository import AsyncAnalyticsRepository
+from app.config import settings
+
+
+class FakeAsyncSession:
+    """run_sync вызывает функцию с синхронной сессией, как AsyncSession"""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.session, *args, **kwargs)
+
+
+def test_queries_run_through_run_sync():
+    session = MagicMock()
+    session.execute.return_value.fetchall.return_value = [("ru", 5), ("en", 2)]
+    repository = AsyncAnalyticsRepository(FakeAsyncSession(session))
+
+    distribution = asyncio.run(repository.get_language_distribution())
+
+    assert distribution == {"ru": 5, "en": 2}
+    assert "transcription_rollups_daily" in str(session.execute.call_args[0][0])
+
+
+def test_async_database_url():
+    assert settings._async_database_url("postgresql://u:p@db:5432/app") == "postgresql+asyncpg://u:p@db:5432/app"
+    assert settings._async_database_url("postgresql+psycopg2://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert settings._async_database_url("sqlite:///test.db") == "sqlite:///test.db"
@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.collector import SystemMetricsCollector
+
+
+def test_ring_buffer_is_bounded():
+    """Буфер хранит только последние семплы"""
+    collector = SystemMetricsCollector(sample_interval=1, flush_interval=60, buffer_size=3)
+    for _ in range(5):
+        collector.sample()
+
+    assert len(collector._buffer) == 3
+    assert set(collector.latest()) == {'cpu_usage', 'memory_usage', 'memory_available'}
+    assert collector.recent(60)['memory_usage']['max'] <= 100
+
+
+def test_flush_writes_one_aggregated_batch(mocker):
+    """Накопленные семплы записываются одной пачкой средних значений"""
+    collector = SystemMetricsCollector(sample_interval=1, flush_interval=60, buffer_size=10)
+    collector._pending = [
+        {'cpu_usage': 10.0, 'memory_usage': 40.0, 'memory_available': 100.0},
+        {'cpu_usage': 30.0, 'memory_usage': 60.0, 'memory_available': 300.0},
+    ]
+    session = mocker.MagicMock()
+    mocker.patch("app.database.get_db_session").return_value.__enter__.return_value = session
+    add_system_metrics = mocker.patch("app.analytics.repository.AnalyticsRepository.add_system_metrics")
+
+    assert collector.flush() == 3
+    metrics = {m['metric_type']: m['metric_value'] for m in add_system_metrics.call_args[0][0]}
+    assert metrics == {'cpu_usage': 20.0, 'memory_usage': 50.0, 'memory_available': 200.0}
+    assert add_system_metrics.call_count == 1
+    assert collector.flush() == 0
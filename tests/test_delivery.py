@@ -0,0 +1,288 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.pipeline import validate_callback_url
+from app.delivery import (
+    DeliveryResult, DeliveryService, OutboxRepository, compute_backoff, is_retryable_status, sign_webhook
+)
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Локальная заглушка внешнего API: /ok -> 200, /fail -> 503, /bad -> 400"""
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        _StandInHandler.received.append((self.path, json.loads(body), self.client_address[1]))
+
+        status = {"/ok": 200, "/fail": 503, "/bad": 400}.get(self.path, 404)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_server():
+    """Локальный HTTP сервер вместо внешнего API"""
+    _StandInHandler.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _row(row_id: int, url: str) -> dict:
+    return {
+        "id": row_id,
+        "kind": "external_api",
+        "target_url": url,
+        "payload": {"transcription_id": f"t-{row_id}", "text": "текст"},
+        "attempts": 0
+    }
+
+
+class TestDeliveryService:
+    """Тесты отправителя outbox"""
+
+    def test_send_batch_results(self, stand_in_server):
+        """Успешные, повторяемые и неповторяемые ошибки в одной пачке"""
+        service = DeliveryService()
+        rows = [
+            _row(1, f"{stand_in_server}/ok"),
+            _row(2, f"{stand_in_server}/fail"),
+            _row(3, f"{stand_in_server}/bad"),
+        ]
+
+        async def run():
+            try:
+                return await service.send_batch(rows)
+            finally:
+                await service.stop()
+
+        results = {result.id: result for result in asyncio.run(run())}
+
+        assert results[1].ok and results[1].status_code == 200
+        assert not results[2].ok and results[2].retryable
+        assert not results[3].ok and not results[3].retryable
+        assert {path for path, _, _ in _StandInHandler.received} == {"/ok", "/fail", "/bad"}
+
+    def test_connections_are_reused(self, stand_in_server):
+        """Последовательные доставки идут через одно keep-alive соединение"""
+        service = DeliveryService()
+
+        async def run():
+            try:
+                for row_id in range(3):
+                    await service.send(_row(row_id, f"{stand_in_server}/ok"))
+            finally:
+                await service.stop()
+
+        asyncio.run(run())
+
+        client_ports = {port for _, _, port in _StandInHandler.received}
+        assert len(_StandInHandler.received) == 3
+        assert len(client_ports) == 1
+
+    def test_unreachable_target_is_retryable(self):
+        """Недоступный сервер - повторяемая ошибка"""
+        service = DeliveryService()
+
+        async def run():
+            try:
+                return await service.send(_row(1, "http://127.0.0.1:9/unreachable"))
+            finally:
+                await service.stop()
+
+        result = asyncio.run(run())
+
+        assert not result.ok
+        assert result.retryable
+        assert result.error
+
+
+def test_webhook_request_is_signed():
+    """Вебхук отправляется с HMAC подписью тела"""
+    service = DeliveryService()
+    row = _row(7, "http://example.test/hook")
+    row["kind"] = "webhook"
+    row["payload"]["event"] = "transcription.completed"
+
+    request = service.build_request(row)
+
+    header = request["headers"]["X-Webhook-Signature"]
+    timestamp, signature = [part.split("=", 1)[1] for part in header.split(",")]
+    expected = hmac.new(
+        settings.WEBHOOK_SECRET.encode("utf-8"),
+        f"{timestamp}.".encode("utf-8") + request["content"],
+        hashlib.sha256
+    ).hexdigest()
+
+    assert signature == expected
+    assert request["headers"]["X-Webhook-Event"] == "transcription.completed"
+    assert header == sign_webhook(settings.WEBHOOK_SECRET, int(timestamp), request["content"])
+
+
+@pytest.mark.parametrize("attempt", [1, 2, 5, 10, 20])
+def test_compute_backoff_bounds(attempt):
+    """Задержка с джиттером не превышает экспоненту и потолок"""
+    for _ in range(50):
+        delay = compute_backoff(attempt, base=2, cap=600)
+        assert 0 <= delay <= min(600, 2 * 2 ** (attempt - 1))
+
+
+@pytest.mark.parametrize("status_code,expected", [(500, True), (503, True), (429, True), (408, True), (400, False), (404, False)])
+def test_is_retryable_status(status_code, expected):
+    assert is_retryable_status(status_code) is expected
+
+
+def test_attempt_counted_at_claim():
+    """Захват увеличивает attempts, а записи с исчерпанными попытками уходят в dead до захвата"""
+    db = MagicMock()
+    db.execute.return_value.fetchall.return_value = []
+
+    OutboxRepository().claim_batch(db, batch_size=10, lease_seconds=60, max_attempts=3)
+
+    dead_sql, claim_sql = [str(call.args[0]) for call in db.execute.call_args_list]
+    assert "status = 'dead'" in dead_sql and "attempts >= :max_attempts" in dead_sql
+    assert "attempts = attempts + 1" in claim_sql
+
+
+def test_results_use_claimed_attempt():
+    """record_results не увеличивает попытку повторно; последняя попытка - dead"""
+    db = MagicMock()
+    rows = [{**_row(1, "http://a"), "attempts": 1}, {**_row(2, "http://b"), "attempts": settings.DELIVERY_MAX_ATTEMPTS}]
+    results = [DeliveryResult(id=1, ok=False, error="HTTP 503"), DeliveryResult(id=2, ok=False, error="HTTP 503")]
+
+    OutboxRepository().record_results(db, rows, results)
+
+    statements = {str(call.args[0]).split("SET")[1].split(",")[0].strip(): call.args[1]
+                  for call in db.execute.call_args_list if "UPDATE" in str(call.args[0])}
+    assert statements["attempts = :attempts"][0]['attempts'] == 1
+    assert statements["status = 'dead'"][0]['attempts'] == settings.DELIVERY_MAX_ATTEMPTS
+
+
+def _resolves_to(mocker, *addresses):
+    family = {4: socket.AF_INET, 6: socket.AF_INET6}
+    return mocker.patch("app.delivery.socket.getaddrinfo", return_value=[
+        (family[ipaddress.ip_address(address).version], socket.SOCK_STREAM, 6, "", (address, 80))
+        for address in addresses
+    ])
+
+
+@pytest.mark.parametrize("address", [
+    "127.0.0.1", "10.0.0.5", "172.17.0.3", "192.168.1.10", "169.254.169.254",
+    "100.64.0.1", "0.0.0.0", "::1", "fe80::1", "fd00::1", "::ffff:127.0.0.1", "224.0.0.1"
+])
+def test_internal_callback_rejected(mocker, address):
+    """Вебхук на loopback, link-local, частные и зарезервированные адреса отклоняется"""
+    _resolves_to(mocker, address)
+
+    with pytest.raises(ValueError):
+        validate_callback_url("http://hooks.example.com/cb")
+
+
+def test_callback_rejected_if_any_address_internal(mocker):
+    """Имя с публичным и внутренним адресом отклоняется"""
+    _resolves_to(mocker, "93.184.216.34", "10.0.0.5")
+
+    with pytest.raises(ValueError):
+        validate_callback_url("https://hooks.example.com/cb")
+
+
+@pytest.mark.parametrize("url", ["ftp://example.com/cb", "http:///cb", "not a url"])
+def test_malformed_callback_rejected(url):
+    with pytest.raises(ValueError):
+        validate_callback_url(url)
+
+
+def test_unresolvable_callback_rejected(mocker):
+    """Внутреннее имя сервиса, которого нет в DNS, отклоняется"""
+    mocker.patch("app.delivery.socket.getaddrinfo", side_effect=socket.gaierror("not found"))
+
+    with pytest.raises(ValueError):
+        validate_callback_url("http://redis:6379")
+
+
+def test_public_callback_accepted(mocker):
+    _resolves_to(mocker, "93.184.216.34")
+
+    assert validate_callback_url(" https://hooks.example.com/cb ") == "https://hooks.example.com/cb"
+
+
+def test_callback_allowlist(mocker):
+    """При заданном CALLBACK_ALLOWED_HOSTS принимаются только эти хосты"""
+    mocker.patch.object(settings, "CALLBACK_ALLOWED_HOSTS", ["hooks.internal"])
+    resolve = _resolves_to(mocker, "10.0.0.5")
+
+    assert validate_callback_url("http://hooks.internal/cb") == "http://hooks.internal/cb"
+    with pytest.raises(ValueError):
+        validate_callback_url("http://hooks.example.com/cb")
+    resolve.assert_not_called()
+
+
+def test_webhook_rechecked_at_send_time(mocker):
+    """DNS rebinding: адрес, ставший внутренним после приема, не получает запрос"""
+    _resolves_to(mocker, "169.254.169.254")
+    service = DeliveryService()
+    post = mocker.patch.object(DeliveryService, "client")
+    row = _row(9, "http://hooks.example.com/cb")
+    row["kind"] = "webhook"
+
+    result = asyncio.run(service.send(row))
+
+    assert not result.ok
+    assert not result.retryable
+    post.post.assert_not_called()
+
+
+@pytest.mark.parametrize("url,host_header,sni", [
+    ("https://hooks.example.com/cb", "hooks.example.com", "hooks.example.com"),
+    ("http://hooks.example.com:8080/cb", "hooks.example.com:8080", None),
+])
+def test_webhook_connects_to_checked_address(mocker, url, host_header, sni):
+    """Запрос уходит на проверенный IP: имя только в Host и SNI, без второго разрешения DNS"""
+    resolve = _resolves_to(mocker, "93.184.216.34")
+    sent = []
+
+    def handler(request):
+        sent.append(request)
+        return httpx.Response(200)
+
+    service = DeliveryService()
+    service._webhook_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    row = _row(10, url)
+    row["kind"] = "webhook"
+    row["payload"] = {"event": "transcription.completed"}
+
+    result = asyncio.run(service.send(row))
+
+    assert result.ok
+    assert resolve.call_count == 1
+    [request] = sent
+    assert request.url.host == "93.184.216.34"
+    assert request.url.path == "/cb"
+    assert request.headers["host"] == host_header
+    assert request.extensions.get("sni_hostname") == sni
+    assert "X-Webhook-Signature" in request.headers
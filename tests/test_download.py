@@ -0,0 +1,151 @@
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.main import app
+from app.storage import TranscriptStore, content_etag
+
+TEST_UUID = "123e4567-e89b-12d3-a456-426614174000"
+TEST_TEXT = "Это тестовый текст транскрипции на русском языке. " * 20
+URL = f"/transcriptions/{TEST_UUID}/download"
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def store(tmp_path, mocker):
+    """Транскрипция в gzip-хранилище, Redis пуст"""
+    store = TranscriptStore(tmp_path, compression="gzip", shard_depth=2)
+    store.write(TEST_UUID, TEST_TEXT)
+    service = mocker.patch("app.main.transcription_service")
+    service.transcript_store = store
+    mocker.patch("app.main.disk_janitor")
+    return store
+
+
+@pytest.fixture
+def redis_cache(mocker):
+    cache = mocker.patch("app.main.async_redis_client")
+    cache.get_cached_transcript = AsyncMock(return_value=(None, None))
+    cache.get_cached_transcription = AsyncMock(return_value=None)
+    cache.cache_file_info = AsyncMock(return_value=True)
+    return cache
+
+
+def test_full_download(store, redis_cache):
+    """200 с ETag по содержимому и неизменяемым кэшированием"""
+    response = client.get(URL, headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.text == TEST_TEXT
+    assert response.headers["etag"] == f'"{content_etag(TEST_TEXT.encode("utf-8"))}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "content-encoding" not in response.headers
+    redis_cache.cache_file_info.assert_awaited_once()
+
+
+def test_conditional_request(store, redis_cache):
+    """If-None-Match с текущим тегом - 304 без тела"""
+    etag = client.get(URL, headers={"Accept-Encoding": "identity"}).headers["etag"]
+
+    response = client.get(URL, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+
+def test_encoding_passthrough(store, redis_cache):
+    """Клиенту, принимающему gzip, сжатые байты отдаются как есть"""
+    response = client.get(URL, headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].endswith('-gzip"')
+    assert response.text == TEST_TEXT
+
+
+def test_byte_range(store, redis_cache):
+    """Один диапазон - 206 с Content-Range"""
+    data = TEST_TEXT.encode("utf-8")
+
+    response = client.get(URL, headers={"Range": "bytes=0-9"})
+
+    assert response.status_code == 206
+    assert response.content == data[:10]
+    assert response.headers["content-range"] == f"bytes 0-9/{len(data)}"
+
+
+def test_unsatisfiable_range(store, redis_cache):
+    """Диапазон за концом файла - 416"""
+    size = len(TEST_TEXT.encode("utf-8"))
+
+    response = client.get(URL, headers={"Range": f"bytes={size}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+
+@pytest.mark.parametrize("header", ["bytes=0-1,5-6", "items=0-9", "bytes=abc"])
+def test_unsupported_range_ignored(store, redis_cache, header):
+    """Неподдерживаемая форма Range игнорируется: 200 и весь файл"""
+    response = client.get(URL, headers={"Range": header, "Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.text == TEST_TEXT
+
+
+def test_empty_transcript_range_ignored(tmp_path, mocker, redis_cache):
+    """Пустая транскрипция с Range - 200, а не 416"""
+    store = TranscriptStore(tmp_path, compression="gzip", shard_depth=2)
+    store.write(TEST_UUID, "")
+    mocker.patch("app.main.transcription_service").transcript_store = store
+    mocker.patch("app.main.disk_janitor")
+
+    response = client.get(URL, headers={"Range": "bytes=0-9"})
+
+    assert response.status_code == 200
+    assert response.content == b""
+
+
+def test_hot_tier_served_without_storage(redis_cache, mocker):
+    """Свежая транскрипция из Redis отдается без обращения к хранилищу"""
+    data = TEST_TEXT.encode("utf-8")
+    redis_cache.get_cached_transcript.return_value = ({"etag": content_etag(data), "size": len(data)}, TEST_TEXT)
+    service = mocker.patch("app.main.transcription_service")
+    mocker.patch("app.main.disk_janitor")
+
+    response = client.get(URL)
+
+    assert response.status_code == 200
+    assert response.text == TEST_TEXT
+    service.transcript_store.find.assert_not_called()
+
+
+def test_not_modified_from_cached_meta(redis_cache, mocker):
+    """ETag из Redis - 304 без обращения к хранилищу"""
+    redis_cache.get_cached_transcript.return_value = ({"etag": "abc", "size": 3}, None)
+    service = mocker.patch("app.main.transcription_service")
+    mocker.patch("app.main.disk_janitor")
+
+    response = client.get(URL, headers={"If-None-Match": '"abc"'})
+
+    assert response.status_code == 304
+    service.transcript_store.find.assert_not_called()
+
+
+def test_missing_transcript(tmp_path, mocker, redis_cache):
+    """Нет файла - 404 в формате ErrorResponse"""
+    mocker.patch("app.main.transcription_service").transcript_store = TranscriptStore(tmp_path)
+
+    response = client.get(URL)
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Transcription file not found"
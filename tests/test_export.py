@@ -0,0 +1,153 @@
+import asyncio
+import csv
+import io
+import sys
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.export import AnalyticsExporter, ExportError, pyarrow
+from app.main import app, export_analytics
+
+
+def _batches():
+    yield [(datetime(2024, 5, 10, 12, 0), "cpu_usage", 12.5, "transcription")]
+    yield [(datetime(2024, 5, 10, 12, 1), "cpu_usage", 13.0, "transcription"),
+           (datetime(2024, 5, 10, 12, 2), "memory_usage", 40.0, "transcription")]
+
+
+def test_csv_streams_one_chunk_per_batch():
+    exporter = AnalyticsExporter(max_concurrent=1)
+    slot = exporter.acquire()
+    assert slot
+
+    chunks = list(exporter.stream("system_metrics", "csv", batches=_batches(), slot=slot))
+
+    assert len(chunks) == 2
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+    assert rows[0] == ["timestamp", "metric_type", "metric_value", "service"]
+    assert rows[1] == ["2024-05-10T12:00:00", "cpu_usage", "12.5", "transcription"]
+    assert len(rows) == 4
+    # Слот освобожден после выгрузки
+    assert exporter.acquire()
+
+
+def test_export_query_and_validation():
+    exporter = AnalyticsExporter()
+
+    query, params = exporter.query("word_statistics", datetime(2024, 5, 1), None)
+    assert "FROM word_statistics WHERE created_at >= :start ORDER BY created_at" in str(query)
+    assert params == {'start': datetime(2024, 5, 1)}
+
+    with pytest.raises(ExportError):
+        exporter.validate("pg_authid", "csv")
+    with pytest.raises(ExportError):
+        exporter.validate("system_metrics", "xlsx")
+
+
+@pytest.mark.skipif(pyarrow is None, reason="pyarrow not installed")
+def test_parquet_row_group_per_batch():
+    import pyarrow.parquet
+
+    exporter = AnalyticsExporter(max_concurrent=1)
+    slot = exporter.acquire()
+
+    data = b"".join(exporter.stream("system_metrics", "parquet", batches=_batches(), slot=slot))
+
+    parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(data))
+    assert parquet_file.num_row_groups == 2
+    assert parquet_file.read().num_rows == 3
+
+
+def test_iter_batches_server_side_cursor():
+    """Строки читаются серверным курсором порциями по batch_size в read-only снимке"""
+    exporter = AnalyticsExporter(batch_size=500)
+    exporter._engine = MagicMock()
+    conn = exporter._engine.connect.return_value.__enter__.return_value
+    cursor_conn = conn.execution_options.return_value
+    cursor_conn.execute.return_value.partitions.return_value = iter([["row1"], ["row2"]])
+
+    assert list(exporter.iter_batches("system_metrics")) == [["row1"], ["row2"]]
+
+    conn.execution_options.assert_called_once_with(
+        isolation_level="REPEATABLE READ",
+        postgresql_readonly=True,
+        yield_per=500
+    )
+    cursor_conn.execute.assert_called_once()
+
+
+def test_slot_release_is_idempotent():
+    """Повторное освобождение слота не увеличивает число выгрузок"""
+    exporter = AnalyticsExporter(max_concurrent=1)
+    slot = exporter.acquire()
+    assert exporter.acquire() is None
+
+    slot.release()
+    slot.release()
+
+    assert exporter.acquire() is not None
+    assert exporter.acquire() is None
+
+
+def test_early_close_releases_slot():
+    """Клиент закрыл поток после первой порции - слот освобождается в finally"""
+    exporter = AnalyticsExporter(max_concurrent=1)
+    slot = exporter.acquire()
+    stream = exporter.stream("system_metrics", "csv", batches=_batches(), slot=slot)
+
+    next(stream)
+    stream.close()
+
+    assert exporter.acquire() is not None
+
+
+@pytest.fixture
+def endpoint_exporter(mocker):
+    exporter = AnalyticsExporter(max_concurrent=1)
+    mocker.patch.object(exporter, "iter_batches", side_effect=lambda *args: _batches())
+    mocker.patch("app.main.analytics_exporter", exporter)
+    return exporter
+
+
+def test_unstarted_stream_slot_released_by_response(endpoint_exporter):
+    """Генератор, закрытый до первой порции, слот не держит: его освобождает фоновая задача ответа"""
+    async def respond_and_disconnect():
+        response = await export_analytics(table="system_metrics", date_from=None, date_to=None, export_format="csv")
+        await response.body_iterator.aclose()
+        await response.background()
+
+    asyncio.run(respond_and_disconnect())
+
+    assert endpoint_exporter.acquire() is not None
+
+
+def test_endpoint_releases_slot_once(endpoint_exporter):
+    """После полной выгрузки слот свободен ровно один раз (finally и фоновая задача)"""
+    client = TestClient(app)
+
+    response = client.get("/analytics/export", params={"table": "system_metrics"})
+
+    assert response.status_code == 200
+    assert response.text.startswith("timestamp,metric_type")
+    assert endpoint_exporter.acquire() is not None
+    assert endpoint_exporter.acquire() is None
+
+
+def test_endpoint_busy_returns_429_without_leaking(endpoint_exporter):
+    """Все слоты заняты - 429, занятый слот не теряется и не освобождается дважды"""
+    client = TestClient(app)
+    slot = endpoint_exporter.acquire()
+
+    response = client.get("/analytics/export", params={"table": "system_metrics"})
+
+    assert response.status_code == 429
+    assert endpoint_exporter.acquire() is None
+    slot.release()
+    assert endpoint_exporter.acquire() is not None
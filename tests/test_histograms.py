@@ -0,0 +1,56 @@
+import random
+import sys
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.histograms import LatencyHistogram, duration_bucket, summarize
+
+
+def test_percentiles_within_relative_error():
+    """Перцентили совпадают с точными с точностью корзины (~10%)"""
+    values = [random.lognormvariate(0, 1) for _ in range(5000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    values.sort()
+    for percent in (50, 90, 99):
+        exact = values[int(len(values) * percent / 100) - 1]
+        assert abs(histogram.percentile(percent) - exact) / exact < 0.11
+
+
+def test_merge_equals_combined():
+    """Слияние гистограмм равно гистограмме всех значений"""
+    first, second, combined = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for index in range(1, 200):
+        value = index / 10
+        (first if index % 2 else second).record(value)
+        combined.record(value)
+
+    merged = LatencyHistogram().merge(first).merge(second)
+
+    assert merged.counts == combined.counts
+    assert merged.summary() == combined.summary()
+
+
+def test_summarize_breakdown():
+    fast, slow = LatencyHistogram(), LatencyHistogram()
+    fast.record(1.0)
+    slow.record(10.0)
+
+    result = summarize([
+        (('inference', 'base', 'ru', '<30s'), fast),
+        (('inference', 'large', 'en', '2m-10m'), slow),
+    ])
+
+    assert result['inference']['overall']['count'] == 2
+    assert result['inference']['by_model']['large']['p99'] == 10.0
+    assert set(result['inference']['by_duration']) == {'<30s', '2m-10m'}
+
+
+def test_duration_bucket():
+    assert duration_bucket(0) == "unknown"
+    assert duration_bucket(10) == "<30s"
+    assert duration_bucket(3600) == ">30m"
@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.janitor import DiskJanitor, DirectoryPolicy
+
+
+def _make_file(path: Path, size: int, age_seconds: float = 0) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    if age_seconds:
+        timestamp = time.time() - age_seconds
+        os.utime(path, (timestamp, timestamp))
+    return path
+
+
+class TestDiskJanitor:
+    """Тесты фоновой очистки диска"""
+
+    def test_ttl_removes_expired_files(self, tmp_path):
+        """Файлы старше TTL удаляются"""
+        old_file = _make_file(tmp_path / "old.mp3", 100, age_seconds=7200)
+        new_file = _make_file(tmp_path / "new.mp3", 100)
+
+        janitor = DiskJanitor([DirectoryPolicy(name="uploads", root=tmp_path, ttl_seconds=3600)])
+        reclaimed = janitor.run_cycle()
+
+        assert not old_file.exists()
+        assert new_file.exists()
+        assert reclaimed["uploads"] == 100
+        assert janitor.stats["uploads"]["reclaimed_bytes_ttl"] == 100
+
+    def test_quota_evicts_least_recently_accessed(self, tmp_path):
+        """При превышении квоты первыми удаляются давно не скачиваемые файлы"""
+        oldest = _make_file(tmp_path / "ab" / "oldest.txt", 400, age_seconds=300)
+        middle = _make_file(tmp_path / "cd" / "middle.txt", 400, age_seconds=200)
+        newest = _make_file(tmp_path / "ef" / "newest.txt", 400, age_seconds=100)
+
+        janitor = DiskJanitor([DirectoryPolicy(name="outputs", root=tmp_path, quota_bytes=1000)])
+        janitor.run_cycle()
+
+        assert not oldest.exists()
+        assert middle.exists()
+        assert newest.exists()
+        assert janitor.stats["outputs"]["reclaimed_bytes_quota"] == 400
+
+    def test_incremental_scan_limits_directories_per_cycle(self, tmp_path):
+        """За цикл сканируется ограниченное число директорий"""
+        for index in range(10):
+            _make_file(tmp_path / f"{index:02d}" / "file.txt", 10)
+
+        janitor = DiskJanitor([DirectoryPolicy(name="outputs", root=tmp_path)], dirs_per_cycle=3)
+
+        janitor.run_cycle()
+        assert janitor.stats["outputs"]["tracked_bytes"] == 20
+
+        for _ in range(3):
+            janitor.run_cycle()
+        assert janitor.stats["outputs"]["tracked_bytes"] == 100
+
+
+class FakeLeaseRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def expire(self, key, seconds):
+        return key in self.values
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def test_protected_uploads_not_evicted(tmp_path):
+    """Загрузки активных задач не вытесняются квотой, даже самые старые"""
+    queued = _make_file(tmp_path / "queued.mp3", 400, age_seconds=300)
+    done = _make_file(tmp_path / "done.mp3", 400, age_seconds=200)
+    _make_file(tmp_path / "fresh.mp3", 400, age_seconds=100)
+
+    policy = DirectoryPolicy(
+        name="uploads", root=tmp_path, quota_bytes=1000,
+        protect=lambda path: Path(path).stem == "queued"
+    )
+    DiskJanitor([policy]).run_cycle()
+
+    assert queued.exists()
+    assert not done.exists()
+
+
+def test_single_process_holds_lease(tmp_path):
+    """Очистку выполняет только владелец аренды, остальные процессы пропускают цикл"""
+    redis = MagicMock()
+    redis.redis_client = FakeLeaseRedis()
+    policy = DirectoryPolicy(name="uploads", root=tmp_path, ttl_seconds=3600)
+    first, second = DiskJanitor([policy], redis=redis), DiskJanitor([policy], redis=redis)
+    second.owner = "other"
+
+    assert first.tick() is not None
+    assert second.tick() is None
+    assert first.tick() is not None
+
+    first._release_lease()
+    assert second.tick() is not None
+
+
+def test_reclaimed_space_exported(tmp_path, mocker):
+    """Освобожденное место - счетчики Prometheus и одна пакетная запись в system_metrics"""
+    from prometheus_client import REGISTRY
+
+    def sample(name, reason):
+        return REGISTRY.get_sample_value(name, {"directory": "exported", "reason": reason}) or 0
+
+    mocker.patch("app.janitor.settings.ANALYTICS_ENABLED", True)
+    mocker.patch("app.database.get_db_session")
+    repository = mocker.patch("app.analytics.repository.AnalyticsRepository").return_value
+    _make_file(tmp_path / "old.mp3", 100, age_seconds=7200)
+    _make_file(tmp_path / "a" / "big.mp3", 500, age_seconds=60)
+    _make_file(tmp_path / "b" / "new.mp3", 500)
+    before = {key: sample(*key) for key in [
+        ("janitor_reclaimed_bytes_total", "ttl"), ("janitor_reclaimed_bytes_total", "quota"),
+        ("janitor_files_removed_total", "ttl"), ("janitor_files_removed_total", "quota")
+    ]}
+
+    janitor = DiskJanitor([DirectoryPolicy(name="exported", root=tmp_path, ttl_seconds=3600, quota_bytes=800)])
+    janitor.tick()
+
+    assert {key: sample(*key) - value for key, value in before.items()} == {
+        ("janitor_reclaimed_bytes_total", "ttl"): 100, ("janitor_reclaimed_bytes_total", "quota"): 500,
+        ("janitor_files_removed_total", "ttl"): 1, ("janitor_files_removed_total", "quota"): 1
+    }
+    repository.add_system_metrics.assert_called_once_with([
+        {'metric_type': 'janitor_reclaimed_bytes_exported', 'metric_value': 600, 'service': 'janitor'}
+    ])
+    repository.add_system_metric.assert_not_called()
@@ -0,0 +1,239 @@
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List
+from unittest.mock import MagicMock
+
+import redis
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.job_queue import TranscriptionQueue
+from app.worker import TranscriptionWorker
+
+
+class FakePipeline:
+    def __init__(self, client: "FakeStreamRedis"):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeStreamRedis:
+    """Минимальная модель Redis Streams с consumer group и хешей статусов"""
+
+    def __init__(self):
+        self.now_ms = 0
+        self.streams: Dict[str, List[tuple]] = {}
+        self.groups: Dict[tuple, dict] = {}
+        self.hashes: Dict[str, dict] = {}
+
+    def xgroup_create(self, stream, group, id="0", mkstream=False):
+        if (stream, group) in self.groups:
+            raise redis.ResponseError("BUSYGROUP Consumer Group name already exists")
+        self.streams.setdefault(stream, [])
+        self.groups[(stream, group)] = {'delivered': 0, 'pending': {}}
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        entries = self.streams.setdefault(stream, [])
+        message_id = f"{len(entries) + 1}-0"
+        entries.append((message_id, dict(fields)))
+        return message_id
+
+    def xlen(self, stream):
+        return len(self.streams.get(stream, []))
+
+    def _deliver(self, pending, message_id, consumer, increment=True):
+        entry = pending.setdefault(message_id, {'times_delivered': 0})
+        entry['consumer'] = consumer
+        entry['delivered_at'] = self.now_ms
+        if increment:
+            entry['times_delivered'] += 1
+
+    def xreadgroup(self, group, consumer, streams, count=1, block=None):
+        response = []
+        for stream in streams:
+            state = self.groups[(stream, group)]
+            entries = self.streams[stream][state['delivered']:state['delivered'] + count]
+            state['delivered'] += len(entries)
+            for message_id, _fields in entries:
+                self._deliver(state['pending'], message_id, consumer)
+            if entries:
+                response.append([stream, entries])
+        return response
+
+    def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=10):
+        state = self.groups[(stream, group)]
+        claimed = []
+        for message_id, fields in self.streams[stream]:
+            entry = state['pending'].get(message_id)
+            if entry and self.now_ms - entry['delivered_at'] >= min_idle_time and len(claimed) < count:
+                self._deliver(state['pending'], message_id, consumer)
+                claimed.append((message_id, fields))
+        return ["0-0", claimed, []]
+
+    def xclaim(self, stream, group, consumer, min_idle_time, message_ids, justid=False):
+        state = self.groups[(stream, group)]
+        for message_id in message_ids:
+            self._deliver(state['pending'], message_id, consumer, increment=not justid)
+        return message_ids
+
+    def xack(self, stream, group, *message_ids):
+        pending = self.groups[(stream, group)]['pending']
+        return sum(pending.pop(message_id, None) is not None for message_id in message_ids)
+
+    def xpending(self, stream, group):
+        return {'pending': len(self.groups[(stream, group)]['pending'])}
+
+    def xpending_range(self, stream, group, min, max, count):
+        entry = self.groups[(stream, group)]['pending'].get(min)
+        return [{'message_id': min, **entry}] if entry else []
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def expire(self, key, seconds):
+        return True
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+def _queue() -> TranscriptionQueue:
+    client = MagicMock()
+    client.redis_client = FakeStreamRedis()
+    return TranscriptionQueue(client)
+
+
+def _worker(mocker, queue: TranscriptionQueue, name: str = "w1") -> TranscriptionWorker:
+    mocker.patch("app.worker.notify_callback")
+    mocker.patch("app.worker.record_transcription_error")
+    return TranscriptionWorker(queue, name)
+
+
+def test_enqueue_sets_queued_status():
+    """Задача попадает в поток, статус - queued с ID сообщения"""
+    queue = _queue()
+    message_id = queue.enqueue({'file_id': 'f1', 'audio_file': 'f1.mp3'})
+
+    assert message_id == "1-0"
+    assert queue.depth() == {"length": 1, "pending": 0}
+    status = queue.get_job_status('f1')
+    assert status['status'] == "queued" and status['message_id'] == message_id
+
+
+def test_read_and_ack():
+    """Прочитанное сообщение висит в pending до подтверждения"""
+    queue = _queue()
+    queue.enqueue({'file_id': 'f1'})
+
+    [(message_id, fields)] = queue.read("w1")
+    assert json.loads(fields['payload'])['file_id'] == 'f1'
+    assert queue.depth()['pending'] == 1
+    assert queue.read("w1") == []
+
+    queue.ack(message_id)
+    assert queue.depth()['pending'] == 0
+
+
+def test_reclaim_stale_message():
+    """Сообщение упавшего воркера забирает другой воркер после простоя"""
+    queue = _queue()
+    queue.enqueue({'file_id': 'f1'})
+    [(message_id, _fields)] = queue.read("w1")
+
+    assert queue.reclaim_stale("w2", min_idle_ms=1000) == []
+    queue.redis.now_ms = 1000
+    reclaimed = queue.reclaim_stale("w2", min_idle_ms=1000)
+
+    assert [mid for mid, _ in reclaimed] == [message_id]
+    assert queue.delivery_count(message_id) == 2
+
+
+def test_heartbeat_keeps_message():
+    """Heartbeat сбрасывает простой, живой воркер задачу не теряет"""
+    queue = _queue()
+    queue.enqueue({'file_id': 'f1'})
+    [(message_id, _fields)] = queue.read("w1")
+
+    queue.redis.now_ms = 900
+    queue.heartbeat("w1", message_id)
+    queue.redis.now_ms = 1500
+
+    assert queue.reclaim_stale("w2", min_idle_ms=1000) == []
+    assert queue.delivery_count(message_id) == 1
+
+
+def test_status_transitions_on_success(mocker):
+    """processing -> completed, сообщение подтверждается"""
+    queue = _queue()
+    queue.enqueue({'file_id': 'f1'})
+    [(message_id, fields)] = queue.read("w1")
+    statuses = []
+    set_status = queue.set_job_status
+    mocker.patch.object(queue, "set_job_status",
+                        side_effect=lambda file_id, status, **extra: statuses.append(status) or set_status(file_id, status, **extra))
+    mocker.patch("app.worker.process_job", return_value=42)
+
+    _worker(mocker, queue).handle(message_id, fields)
+
+    assert statuses == ["processing", "completed"]
+    assert queue.get_job_status('f1')['text_length'] == "42"
+    assert queue.depth()['pending'] == 0
+
+
+def test_failed_job_acked(mocker):
+    """Ошибка инференса - статус failed, сообщение подтверждается"""
+    queue = _queue()
+    queue.enqueue({'file_id': 'f1'})
+    [(message_id, fields)] = queue.read("w1")
+    mocker.patch("app.worker.process_job", side_effect=RuntimeError("boom"))
+
+    _worker(mocker, queue).handle(message_id, fields)
+
+    status = queue.get_job_status('f1')
+    assert status['status'] == "failed" and status['error'] == "boom"
+    assert queue.depth()['pending'] == 0
+
+
+def test_dead_letter_after_max_deliveries(mocker):
+    """После WORKER_MAX_DELIVERIES выдач сообщение уходит в dead-letter поток"""
+    queue = _queue()
+    queue.enqueue({'file_id': 'f1'})
+    queue.read("w1")
+    for attempt in range(settings.WORKER_MAX_DELIVERIES):
+        queue.redis.now_ms += settings.WORKER_CLAIM_IDLE_MS
+        [(message_id, fields)] = queue.reclaim_stale(f"w{attempt + 2}", settings.WORKER_CLAIM_IDLE_MS)
+    process = mocker.patch("app.worker.process_job")
+
+    _worker(mocker, queue).handle(message_id, fields)
+
+    process.assert_not_called()
+    assert queue.redis.streams[queue.dead_letter_stream][0][1]['original_id'] == message_id
+    assert queue.depth()['pending'] == 0
+    assert queue.get_job_status('f1')['status'] == "failed"
+
+
+def test_malformed_message_dead_lettered(mocker):
+    """Поврежденное сообщение не зацикливается: dead-letter и подтверждение"""
+    queue = _queue()
+    queue.ensure_group()
+    queue.redis.xadd(queue.stream, {'payload': "{not json"})
+    [(message_id, fields)] = queue.read("w1")
+    process = mocker.patch("app.worker.process_job")
+
+    _worker(mocker, queue).handle(message_id, fields)
+
+    process.assert_not_called()
+    assert queue.redis.streams[queue.dead_letter_stream][0][1]['reason'] == "Malformed job payload"
+    assert queue.depth()['pending'] == 0
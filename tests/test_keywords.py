@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.keywords import KeywordIndex, idf, tfidf_keywords
+
+
+def _rows(file_uuid, counts, language="ru"):
+    return [{'file_uuid': file_uuid, 'word': word, 'language': language, 'count': count}
+            for word, count in counts.items()]
+
+
+def test_rare_terms_outrank_common_words():
+    """Служебные слова есть почти во всех документах и уступают редким терминам"""
+    keywords = tfidf_keywords(
+        {'это': 10, 'договор': 3, 'аренда': 3},
+        {'это': 1000, 'договор': 12, 'аренда': 40},
+        documents=1000,
+        limit=2
+    )
+
+    assert [term for term, _ in keywords] == ['договор', 'аренда']
+    assert idf(1000, 1000) == 1.0
+
+
+def test_ingest_updates_frequencies_once_per_document():
+    repository = MagicMock()
+    repository.register_documents.return_value = ["file-1"]
+    repository.get_document_frequencies.return_value = {('это', 'ru'): 50, ('договор', 'ru'): 1}
+    repository.get_corpus_sizes.return_value = {'ru': 50}
+    rows = _rows("file-1", {'это': 4, 'договор': 2}) + _rows("file-0", {'это': 1})
+
+    indexed = KeywordIndex(keywords_per_document=5).ingest(repository, rows)
+
+    # file-0 уже в индексе: его термины не увеличивают df повторно
+    assert indexed == 1
+    terms, documents = repository.increment_document_frequencies.call_args[0]
+    assert sorted((row['term'], row['delta']) for row in terms) == [('договор', 1), ('это', 1)]
+    assert documents == [{'language': 'ru', 'delta': 1}]
+    keywords = repository.insert_document_keywords.call_args[0][0]
+    assert [(row['term'], row['position']) for row in keywords] == [('договор', 0), ('это', 1)]
+
+
+def test_ingest_skips_known_documents():
+    repository = MagicMock()
+    repository.register_documents.return_value = []
+
+    assert KeywordIndex().ingest(repository, _rows("file-1", {'слово': 1})) == 0
+    repository.increment_document_frequencies.assert_not_called()
@@ -0,0 +1,113 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.leaderboard import LOCK_KEY, PENDING_SEPARATOR, SEEDED_KEY, TOP_KEY, WordLeaderboard
+
+
+def _leaderboard(client=None) -> WordLeaderboard:
+    redis = MagicMock()
+    redis.redis_client = client
+    return WordLeaderboard(redis, snapshot_interval=300, window_hours=24)
+
+
+def test_record_uses_single_pipeline():
+    """Счетчики пачки складываются по слову и уходят одним pipeline"""
+    client = MagicMock()
+    pipe = client.pipeline.return_value
+    leaderboard = _leaderboard(client)
+
+    recorded = leaderboard.record([
+        {'file_uuid': 'a', 'word': 'слово', 'language': 'ru', 'count': 2},
+        {'file_uuid': 'b', 'word': 'слово', 'language': 'ru', 'count': 3},
+        {'file_uuid': 'b', 'word': 'word', 'language': 'en', 'count': 1},
+    ], now=datetime(2024, 5, 1, 13, 30, tzinfo=timezone.utc))
+
+    assert recorded
+    client.pipeline.assert_called_once_with(transaction=False)
+    pipe.execute.assert_called_once()
+    pipe.zincrby.assert_any_call(TOP_KEY, 5, 'слово')
+    pipe.zincrby.assert_any_call("words:top:lang:en", 1, 'word')
+    pipe.zincrby.assert_any_call("words:top:hour:2024050113", 5, 'слово')
+    pipe.zincrby.assert_any_call("words:top:pending", 5, f"ru{PENDING_SEPARATOR}слово")
+
+
+def test_without_redis_falls_back():
+    """Без Redis запись не принимается, а чтение возвращает None"""
+    leaderboard = _leaderboard()
+
+    assert not leaderboard.record([{'word': 'слово', 'language': 'ru', 'count': 1}])
+    assert leaderboard.top(10) is None
+
+
+def test_top_filters_long_words():
+    client = MagicMock()
+    client.zrevrange.side_effect = [
+        [('кот', 9.0), ('транскрипция', 5.0), ('распознавание', 4.0)],
+        []
+    ]
+    leaderboard = _leaderboard(client)
+
+    assert leaderboard.top(2, min_length=10) == [
+        {'word': 'транскрипция', 'count': 5},
+        {'word': 'распознавание', 'count': 4}
+    ]
+
+
+def test_snapshot_adds_pending_increments(mocker):
+    """Снимок прибавляет к word_totals прирост с прошлого снимка, а не текущие счетчики"""
+    mocker.patch("app.database.get_db_session")
+    repository = mocker.patch("app.analytics.repository.AnalyticsRepository").return_value
+    client = MagicMock()
+    client.set.return_value = True
+    client.get.return_value = "owner"
+    client.zrange.return_value = [(f"ru{PENDING_SEPARATOR}слово", 7.0), (f"en{PENDING_SEPARATOR}word", 2.0)]
+    leaderboard = _leaderboard(client)
+    leaderboard.owner = "owner"
+
+    assert leaderboard.snapshot() == 2
+
+    rows = repository.add_word_totals.call_args[0][0]
+    assert {(row['word'], row['language'], row['count']) for row in rows} == {("слово", "ru", 7), ("word", "en", 2)}
+    client.delete.assert_any_call("words:top:pending:snapshot")
+    client.delete.assert_any_call(LOCK_KEY)
+
+
+def test_snapshot_and_seed_share_lock(mocker):
+    """Пока блокировку держит другой процесс, нет ни снимка, ни восстановления"""
+    session = mocker.patch("app.database.get_db_session")
+    client = MagicMock()
+    client.set.return_value = None
+    client.exists.return_value = 0
+    leaderboard = _leaderboard(client)
+
+    assert leaderboard.snapshot() == 0
+    assert leaderboard.seed() == 0
+
+    session.assert_not_called()
+    assert {call.args[0] for call in client.set.call_args_list} == {LOCK_KEY}
+    client.delete.assert_not_called()
+
+
+def test_seed_loads_totals_under_lock(mocker):
+    mocker.patch("app.database.get_db_session")
+    repository = mocker.patch("app.analytics.repository.AnalyticsRepository").return_value
+    repository.iter_word_totals.return_value = iter([[{'word': 'слово', 'language': 'ru', 'count': 4}]])
+    client = MagicMock()
+    client.exists.return_value = 0
+    client.set.return_value = True
+    client.get.return_value = "owner"
+    pipe = client.pipeline.return_value
+    leaderboard = _leaderboard(client)
+    leaderboard.owner = "owner"
+
+    assert leaderboard.seed() == 1
+
+    assert [call.args[0] for call in client.set.call_args_list] == [LOCK_KEY, SEEDED_KEY]
+    pipe.zincrby.assert_any_call(TOP_KEY, 4, 'слово')
+    pipe.expire.assert_called_with(LOCK_KEY, 300)
+    client.delete.assert_called_once_with(LOCK_KEY)
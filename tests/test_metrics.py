@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from prometheus_client import REGISTRY
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app.metrics import instrument_pool, record_cache, record_transcription, render_metrics, time_checkout
+
+
+def test_exposition_format():
+    """/metrics отдает текстовый формат Prometheus с метриками сервиса"""
+    record_transcription("base", "completed", processing_time=5.0, duration=20.0)
+    record_cache("transcript_hot", True)
+
+    body, content_type = render_metrics()
+    text = body.decode("utf-8")
+
+    assert content_type.startswith("text/plain")
+    assert 'transcriptions_total{model="base",status="completed"}' in text
+    assert 'transcription_realtime_factor_bucket{le="0.3",model="base"}' in text
+    assert 'cache_requests_total{cache="transcript_hot",result="hit"}' in text
+    assert "transcription_queue_depth" in text
+
+
+def test_pool_usage_and_checkout_wait(tmp_path):
+    """Занятость пула по событиям checkout/checkin и время ожидания соединения"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=QueuePool, pool_size=1,
+                           max_overflow=0, pool_timeout=0.05)
+    instrument_pool(engine, "test", capacity=1)
+
+    def sample(name):
+        return REGISTRY.get_sample_value(name, {"pool": "test"})
+
+    with time_checkout("test"):
+        conn = engine.connect()
+    with conn:
+        conn.execute(text("SELECT 1"))
+        assert sample("db_pool_connections_in_use") == 1
+
+        # Пул исчерпан: ожидание обрывается таймаутом и попадает в счетчик
+        with pytest.raises(PoolTimeoutError):
+            with time_checkout("test"):
+                engine.connect()
+    assert sample("db_pool_connections_in_use") == 0
+    assert sample("db_pool_capacity") == 1
+    assert sample("db_pool_checkout_seconds_count") == 2
+    assert sample("db_pool_checkout_timeouts_total") == 1
@@ -0,0 +1,67 @@
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.export import AnalyticsExporter, pyarrow
+from app.analytics.olap import OlapQueryService, OlapUnavailable, ParquetSnapshotter, duckdb
+
+
+def _snapshotter(tmp_path) -> ParquetSnapshotter:
+    return ParquetSnapshotter(tmp_path, interval=3600, mutable_days=2, backfill_days=30, exporter=AnalyticsExporter())
+
+
+def test_days_to_export(tmp_path):
+    snapshotter = _snapshotter(tmp_path)
+    today = date(2024, 5, 10)
+
+    # Первый проход: с самой старой строки, но не глубже backfill_days
+    assert snapshotter.days_to_export("word_statistics", {}, today, datetime(2024, 5, 8, 15)) == [
+        date(2024, 5, 8), date(2024, 5, 9), date(2024, 5, 10)
+    ]
+    assert len(snapshotter.days_to_export("word_statistics", {}, today, datetime(2020, 1, 1))) == 31
+    # Неизменяемые таблицы продолжают с сохраненного дня, записи транскрипций - с запасом
+    state = {"word_statistics": "2024-05-10", "transcription_records": "2024-05-10"}
+    assert snapshotter.days_to_export("word_statistics", state, today, None) == [today]
+    assert snapshotter.days_to_export("transcription_records", state, today, None)[0] == date(2024, 5, 8)
+
+
+@pytest.mark.skipif(duckdb is None or pyarrow is None, reason="duckdb/pyarrow not installed")
+def test_report_from_parquet_snapshot(tmp_path):
+    snapshotter = _snapshotter(tmp_path)
+    day = date.today() - timedelta(days=1)
+    created = datetime.combine(day, datetime.min.time()) + timedelta(hours=10)
+
+    def batches(table, start, end):
+        yield [
+            ("a", "tr-a", "a.mp3", 100, 20.0, "ru", "base", "completed", None, 10, 4.0, 0.9, created, created),
+            ("b", "tr-b", "b.mp3", 100, 25.0, "ru", "base", "completed", None, 10, 6.0, 0.9, created, created),
+            ("c", "tr-c", "c.mp3", 100, 900.0, "en", "base", "failed", "boom", 0, None, None, created, None),
+        ]
+
+    snapshotter.export_day("transcription_records", day, batches=batches)
+    service = OlapQueryService(tmp_path, threads=1)
+
+    rows = service.run("language_duration_latency", days=7)
+    # Неудачные транскрипции в разрез задержек не входят
+    assert [(row["language"], row["duration_bucket"], row["transcriptions"]) for row in rows] == [("ru", "<30s", 2)]
+    assert rows[0]["avg_processing_time"] == pytest.approx(5.0)
+    assert rows[0]["avg_realtime_factor"] == pytest.approx((4.0 / 20 + 6.0 / 25) / 2)
+
+    daily = service.run("daily", days=7)
+    assert (daily[0]["total"], daily[0]["completed"], daily[0]["failed"]) == (3, 2, 1)
+
+    # Секции вне окна отчета не открываются: поврежденный файл старого дня не мешает
+    # (схему DuckDB берет из первого по порядку файла, он должен быть целым)
+    snapshotter.export_day("transcription_records", day - timedelta(days=60), batches=lambda *args: iter([]))
+    old = snapshotter.partition_path("transcription_records", day - timedelta(days=30))
+    old.parent.mkdir(parents=True)
+    old.write_bytes(b"not a parquet file")
+    assert service.run("daily", days=7)[0]["total"] == 3
+
+    with pytest.raises(OlapUnavailable):
+        service.run("performance")
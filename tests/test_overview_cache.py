@@ -0,0 +1,62 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.overview_cache import OverviewCache, OverviewSnapshot
+
+
+def _cache(mocker, redis_client=None) -> OverviewCache:
+    redis = MagicMock()
+    redis.redis_client = redis_client
+    cache = OverviewCache(redis, refresh_interval=30, stale_seconds=300)
+    mocker.patch("app.database.get_db_session")
+    service = mocker.patch("app.analytics.service.AnalyticsService").return_value
+    service.get_system_overview.return_value = {'total_transcriptions': {'total': 3}}
+    return cache
+
+
+def test_fresh_snapshot_served_from_memory(mocker):
+    """Свежий обзор отдается из памяти без пересчета"""
+    cache = _cache(mocker)
+    first = cache.refresh()
+
+    assert cache.get() is first
+    assert b'"total": 3' in first.body
+    assert "stale-while-revalidate=300" in cache.cache_control
+
+
+def test_stale_snapshot_replaced_by_shared(mocker):
+    """Устаревшая локальная копия заменяется более новой из Redis"""
+    cache = _cache(mocker, redis_client=MagicMock())
+    cache._snapshot = OverviewSnapshot(b"{}", "old", time.time() - 60)
+    shared = OverviewSnapshot(b'{"status": "success"}', "new", time.time() - 1)
+    cache.redis.get.return_value = shared.to_json()
+
+    assert cache.get().etag == "new"
+
+
+def test_concurrent_cold_start_builds_once(mocker):
+    """Несколько запросов при холодном старте не пересчитывают обзор повторно"""
+    cache = _cache(mocker)
+    first = cache.refresh(force=False)
+    second = cache.refresh(force=False)
+
+    assert first is second
+
+
+def test_async_read_uses_async_client(mocker):
+    """В обработчике запроса общий обзор читается асинхронным клиентом"""
+    cache = _cache(mocker, redis_client=MagicMock())
+    shared = OverviewSnapshot(b'{"status": "success"}', "shared", time.time())
+    cache.async_redis = MagicMock()
+    cache.async_redis.get = AsyncMock(return_value=shared.to_json())
+
+    snapshot = asyncio.run(cache.get_or_build())
+
+    assert snapshot.etag == "shared"
+    cache.redis.get.assert_not_called()
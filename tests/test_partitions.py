@@ -0,0 +1,101 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.analytics.partitions import (
+    HOURLY_TABLE,
+    RAW_TABLE,
+    SystemMetricsMaintenance,
+    partition_name,
+    partition_range
+)
+
+
+def _maintenance() -> SystemMetricsMaintenance:
+    return SystemMetricsMaintenance(interval=600, raw_retention_hours=24, retention_days=365, days_ahead=2)
+
+
+def test_partition_names_roundtrip():
+    assert partition_name(RAW_TABLE, datetime(2024, 2, 29)) == "system_metrics_p20240229"
+    assert partition_range(RAW_TABLE, "system_metrics_p20240229") == (datetime(2024, 2, 29), datetime(2024, 3, 1))
+    assert partition_range(HOURLY_TABLE, "system_metrics_hourly_p202412") == (datetime(2024, 12, 1), datetime(2025, 1, 1))
+    assert partition_range(RAW_TABLE, "system_metrics_default") is None
+
+
+def test_missing_partitions_created():
+    repository = MagicMock()
+    repository.list_partitions.return_value = ["system_metrics_p20240510"]
+
+    created = _maintenance().ensure_partitions(repository, RAW_TABLE, datetime(2024, 5, 10, 15), datetime(2024, 5, 12, 15))
+
+    assert created == 2
+    names = [call.args[1] for call in repository.create_partition.call_args_list]
+    assert names == ["system_metrics_p20240511", "system_metrics_p20240512"]
+    # Ключ секционирования передается для переноса строк из system_metrics_default
+    assert repository.create_partition.call_args.kwargs == {'column': "timestamp"}
+
+
+def test_partition_moves_rows_from_default():
+    """Строки диапазона из секции по умолчанию переносятся в новую секцию"""
+    from app.analytics.repository import AnalyticsRepository
+
+    db = MagicMock()
+    db.execute.return_value.scalar.return_value = True
+
+    AnalyticsRepository(db).create_partition(
+        RAW_TABLE, "system_metrics_p20240511", datetime(2024, 5, 11), datetime(2024, 5, 12), column="timestamp"
+    )
+
+    statements = [str(call.args[0]) for call in db.execute.call_args_list]
+    assert "CREATE TABLE system_metrics_p20240511 (LIKE system_metrics" in statements[1]
+    assert "DELETE FROM system_metrics_default" in statements[2]
+    assert statements[3].startswith("ALTER TABLE system_metrics ATTACH PARTITION system_metrics_p20240511")
+
+
+def test_partition_without_default_created_directly():
+    from app.analytics.repository import AnalyticsRepository
+
+    db = MagicMock()
+    db.execute.return_value.scalar.return_value = False
+
+    AnalyticsRepository(db).create_partition(
+        HOURLY_TABLE, "system_metrics_hourly_p202405", datetime(2024, 5, 1), datetime(2024, 6, 1), column="hour"
+    )
+
+    assert "PARTITION OF system_metrics_hourly FOR VALUES" in str(db.execute.call_args_list[-1].args[0])
+
+
+def test_only_expired_rolled_up_partitions_dropped():
+    """Минутные секции удаляются после срока хранения и только если уже свернуты"""
+    repository = MagicMock()
+    repository.list_partitions.side_effect = lambda table: {
+        RAW_TABLE: ["system_metrics_p20240508", "system_metrics_p20240509", "system_metrics_p20240510"],
+        HOURLY_TABLE: ["system_metrics_hourly_p202304", "system_metrics_hourly_p202405"]
+    }[table]
+    now = datetime(2024, 5, 10, 12)
+
+    dropped = _maintenance().drop_expired(repository, now, rolled_until=datetime(2024, 5, 10, 12))
+    assert dropped == 2
+    assert [call.args[0] for call in repository.drop_partition.call_args_list] == [
+        "system_metrics_p20240508", "system_metrics_hourly_p202304"
+    ]
+
+    repository.drop_partition.reset_mock()
+    _maintenance().drop_expired(repository, now, rolled_until=datetime(2024, 5, 8, 20))
+    assert "system_metrics_p20240508" not in [call.args[0] for call in repository.drop_partition.call_args_list]
+
+
+def test_downsample_resumes_from_watermark():
+    repository = MagicMock()
+    repository.get_downsample_watermark.return_value = datetime(2024, 5, 10, 9)
+
+    until = _maintenance().downsample(repository, datetime(2024, 5, 10, 12, 40))
+
+    assert until == datetime(2024, 5, 10, 12)
+    repository.downsample_system_metrics.assert_called_once_with(
+        datetime(2024, 5, 10, 9), datetime(2024, 5, 10, 12), source=RAW_TABLE
+    )
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.redis_client import AsyncRedisClient
+
+
+def _client() -> AsyncRedisClient:
+    client = AsyncRedisClient()
+    client.redis_client = MagicMock()
+    return client
+
+
+def test_cached_transcript_single_mget():
+    """Метаданные и текст горячего слоя читаются одной командой MGET"""
+    client = _client()
+    client.redis_client.mget = AsyncMock(return_value=[json.dumps({"etag": "abc", "size": 5}), "hello"])
+
+    meta, text = asyncio.run(client.get_cached_transcript("f1"))
+
+    client.redis_client.mget.assert_awaited_once_with(["file_info:f1", "transcription:f1"])
+    assert meta == {"etag": "abc", "size": 5}
+    assert text == "hello"
+
+
+def test_text_without_meta_ignored():
+    """Текст без метаданных не отдается: ETag неизвестен"""
+    client = _client()
+    client.redis_client.mget = AsyncMock(return_value=[None, "hello"])
+
+    assert asyncio.run(client.get_cached_transcript("f1")) == (None, None)
+
+
+def test_increment_many_single_pipeline():
+    """Счетчики с TTL уходят одним pipeline, возвращаются только значения счетчиков"""
+    client = _client()
+    pipe = client.redis_client.pipeline.return_value
+    pipe.execute = AsyncMock(return_value=[3, True, 7, True])
+
+    result = asyncio.run(client.increment_many({"a": 1, "b": 2}, ttl=60))
+
+    client.redis_client.pipeline.assert_called_once_with(transaction=False)
+    pipe.execute.assert_awaited_once()
+    assert pipe.incrby.call_count == 2
+    assert result == [3, 7]
+
+
+def test_errors_degrade_to_miss():
+    """Ошибка Redis не пробрасывается в обработчик запроса"""
+    client = _client()
+    client.redis_client.mget = AsyncMock(side_effect=ConnectionError("down"))
+
+    assert asyncio.run(client.mget(["a", "b"])) == [None, None]
+
+
+def test_disabled_client():
+    """Без Redis вспомогательные методы отвечают промахом"""
+    client = AsyncRedisClient()
+    client.redis_client = None
+
+    assert asyncio.run(client.get_cached_transcript("f1")) == (None, None)
+    assert asyncio.run(client.zincrby_many({"k": {"w": 1}})) is False
@@ -0,0 +1,245 @@
+import contextlib
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.storage import (
+    PostgresTranscriptStore,
+    S3TranscriptStore,
+    TranscriptBackend,
+    TranscriptStore,
+    etag_matches,
+    parse_accept_encoding,
+    RangeNotSatisfiable,
+    parse_byte_range,
+    zstandard
+)
+
+TEST_UUID = "123e4567-e89b-12d3-a456-426614174000"
+TEST_TEXT = "Это тестовый текст транскрипции на русском языке. " * 20
+
+
+class TestTranscriptStore:
+    """Тесты шардированного хранилища транскрипций"""
+
+    @pytest.mark.parametrize("compression,suffix", [
+        pytest.param("zstd", ".zst", marks=pytest.mark.skipif(zstandard is None, reason="zstandard not installed")),
+        ("gzip", ".gz"),
+        ("none", ""),
+    ])
+    def test_write_and_read_roundtrip(self, tmp_path, compression, suffix):
+        """Запись и чтение текста в разных кодировках"""
+        store = TranscriptStore(tmp_path, compression=compression)
+
+        path = store.write(TEST_UUID, TEST_TEXT)
+
+        assert path.name == f"{TEST_UUID}_transcription.txt{suffix}"
+        assert store.read_text(TEST_UUID) == TEST_TEXT
+
+    def test_sharded_layout(self, tmp_path):
+        """Файлы раскладываются по поддиректориям префикса хэша"""
+        store = TranscriptStore(tmp_path, compression="gzip", shard_depth=2)
+
+        path = store.write(TEST_UUID, TEST_TEXT)
+
+        relative = path.relative_to(tmp_path)
+        assert len(relative.parts) == 3
+        assert all(len(part) == 2 for part in relative.parts[:2])
+
+    def test_compression_reduces_size(self, tmp_path):
+        """Сжатый файл меньше исходного текста"""
+        store = TranscriptStore(tmp_path, compression="gzip")
+
+        path = store.write(TEST_UUID, TEST_TEXT)
+
+        assert path.stat().st_size < len(TEST_TEXT.encode("utf-8"))
+
+    def test_find_legacy_flat_file(self, tmp_path):
+        """Файлы в старой плоской раскладке продолжают находиться"""
+        store = TranscriptStore(tmp_path, compression="gzip")
+        (tmp_path / f"{TEST_UUID}_transcription.txt").write_text(TEST_TEXT, encoding="utf-8")
+
+        stored = store.find(TEST_UUID)
+
+        assert stored is not None
+        assert stored.encoding == "identity"
+        assert store.read_text(TEST_UUID) == TEST_TEXT
+
+    def test_missing_transcript(self, tmp_path):
+        """Несуществующая транскрипция"""
+        store = TranscriptStore(tmp_path)
+
+        assert store.find(TEST_UUID) is None
+        assert store.read_text(TEST_UUID) is None
+
+    def test_streaming_read(self, tmp_path):
+        """Потоковое чтение порциями возвращает байты хранилища"""
+        store = TranscriptStore(tmp_path, compression="gzip")
+        store.write(TEST_UUID, TEST_TEXT)
+
+        stored = store.find(TEST_UUID)
+        chunks = list(store.iter_bytes(stored, chunk_size=64))
+
+        assert len(chunks) > 1
+        assert b"".join(chunks) == stored.path.read_bytes()
+        assert stored.size == stored.path.stat().st_size
+
+
+class FakeS3Error(Exception):
+    def __init__(self, code):
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+        self.closed = False
+
+    def iter_chunks(self, chunk_size):
+        for i in range(0, len(self.data), chunk_size):
+            yield self.data[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeS3:
+    """Локальная замена S3/MinIO: объекты в памяти"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+        data = b""
+        while True:
+            chunk = fileobj.read(1000)
+            if not chunk:
+                break
+            data += chunk
+        self.objects[(bucket, key)] = (data, ExtraArgs or {})
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise FakeS3Error("404")
+        return {"ContentLength": len(self.objects[(Bucket, Key)][0])}
+
+    def get_object(self, Bucket, Key):
+        return {"Body": FakeBody(self.objects[(Bucket, Key)][0])}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"http://minio:9000/{Params['Bucket']}/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+
+class TestS3TranscriptStore:
+    """Тесты хранилища в S3 на локальной замене"""
+
+    def test_roundtrip_with_presigned_url(self):
+        client = FakeS3()
+        store = S3TranscriptStore("transcripts", client=client, prefix="t/", compression="gzip")
+
+        location = store.write(TEST_UUID, TEST_TEXT)
+
+        assert location == f"s3://transcripts/t/{TEST_UUID}_transcription.txt.gz"
+        _, extra = client.objects[("transcripts", f"t/{TEST_UUID}_transcription.txt.gz")]
+        assert extra["ContentEncoding"] == "gzip"
+
+        stored = store.find(TEST_UUID)
+        assert stored.encoding == "gzip" and stored.size > 0
+        assert store.read_text(TEST_UUID) == TEST_TEXT
+        assert store.presigned_url(stored, 60).endswith(f"{TEST_UUID}_transcription.txt.gz?X-Amz-Expires=60")
+
+    def test_streaming_write(self):
+        """Порции пишутся через файловый объект без склейки в памяти"""
+        client = FakeS3()
+        store = S3TranscriptStore("transcripts", client=client, compression="none")
+
+        store.write_stream(TEST_UUID, [b"a" * 700, b"", b"b" * 700], "identity")
+
+        assert store.read_raw(TEST_UUID) == (b"a" * 700 + b"b" * 700, "identity")
+
+    def test_missing_and_errors(self):
+        client = FakeS3()
+        store = S3TranscriptStore("transcripts", client=client, compression="gzip")
+
+        assert store.find(TEST_UUID) is None
+
+        client.head_object = lambda Bucket, Key: (_ for _ in ()).throw(FakeS3Error("AccessDenied"))
+        with pytest.raises(FakeS3Error):
+            store.find(TEST_UUID)
+
+
+class TestPostgresTranscriptStore:
+    """Тесты хранилища в Postgres на подмененной сессии"""
+
+    def test_stream_written_in_one_statement(self, mocker):
+        """Порции пишутся одним UPSERT, без дописывания значения по частям"""
+        db = MagicMock()
+        mocker.patch("app.database.get_db_session", return_value=contextlib.nullcontext(db))
+        store = PostgresTranscriptStore(compression="none")
+
+        location = store.write_stream(TEST_UUID, [b"a" * 700, b"", b"b" * 300], "identity")
+
+        assert location == f"postgres:transcript_blobs/{TEST_UUID}"
+        db.execute.assert_called_once()
+        sql, params = db.execute.call_args.args
+        assert "ON CONFLICT (file_id) DO UPDATE" in str(sql)
+        assert params['data'] == b"a" * 700 + b"b" * 300
+        assert params['size'] == 1000
+
+
+def test_backend_requires_storage_methods():
+    """Реализация без write_stream/find/iter_bytes не создается"""
+    class Incomplete(TranscriptBackend):
+        def find(self, file_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("gzip, deflate, br", {"gzip", "deflate", "br"}),
+    ("zstd;q=1.0, gzip;q=0", {"zstd"}),
+    ("", set()),
+    (None, set()),
+])
+def test_parse_accept_encoding(header, expected):
+    """Разбор заголовка Accept-Encoding"""
+    assert parse_accept_encoding(header) == expected
+
+
+@pytest.mark.parametrize("header,size,expected", [
+    ("bytes=0-9", 100, (0, 9)),
+    ("bytes=90-", 100, (90, 99)),
+    ("bytes=-10", 100, (90, 99)),
+    ("bytes=50-500", 100, (50, 99)),
+    ("bytes=0-1,5-6", 100, None),
+    ("items=0-1", 100, None),
+    ("bytes=abc", 100, None),
+    ("bytes=9-0", 100, None),
+    ("bytes=0-9", 0, None),
+])
+def test_parse_byte_range(header, size, expected):
+    """Разбор заголовка Range; None - заголовок игнорируется"""
+    assert parse_byte_range(header, size) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=-0"])
+def test_parse_byte_range_unsatisfiable(header):
+    """Диапазон за концом файла - 416"""
+    with pytest.raises(RangeNotSatisfiable):
+        parse_byte_range(header, 100)
+
+
+def test_etag_matches_encoded_representation():
+    """Тег сжатого представления совпадает с хэшем текста"""
+    assert etag_matches('"abc"', "abc")
+    assert etag_matches('W/"abc-zstd", "other"', "abc")
+    assert etag_matches("*", "abc")
+    assert not etag_matches('"abd"', "abc")
+    assert not etag_matches(None, "abc")
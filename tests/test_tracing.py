@@ -0,0 +1,70 @@
+import json
+import sys
+from pathlib import Path
+
+# Добавляем путь к проекту
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.tracing import Trace, current_trace, span, trace, traced
+
+
+def test_span_outside_trace_is_noop():
+    with span("decode"):
+        pass
+    assert current_trace() is None
+
+
+def test_spans_collected_and_summed(monkeypatch):
+    monkeypatch.setattr(settings, "ANALYTICS_ENABLED", False)
+
+    @traced("db.write")
+    def write():
+        return 42
+
+    with trace(file_id="file-1") as current:
+        with span("inference", language="ru"):
+            pass
+        assert write() == 42
+        assert write() == 42
+
+    assert current_trace() is None
+    assert [item.name for item in current.spans] == ["inference", "db.write", "db.write"]
+    assert set(current.durations()) == {"inference", "db.write"}
+    assert "db-write;dur=" in current.server_timing()
+
+
+def test_spans_persisted_through_writer(monkeypatch):
+    from app.analytics.writer import analytics_writer
+
+    emitted = []
+    monkeypatch.setattr(settings, "ANALYTICS_ENABLED", True)
+    monkeypatch.setattr(analytics_writer, "emit", emitted.append)
+
+    with trace(file_id="file-1"):
+        with span("save"):
+            pass
+    with trace(persist=False):
+        with span("save"):
+            pass
+
+    assert [(event.file_uuid, event.metric_name) for event in emitted] == [("file-1", "span.save")]
+
+
+def test_chrome_trace_export(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "ANALYTICS_ENABLED", False)
+    monkeypatch.setattr(settings, "TRACE_EXPORT_DIR", str(tmp_path))
+
+    with trace(trace_id="abc") as current:
+        with span("decode"):
+            pass
+
+    exported = json.loads((tmp_path / "abc.json").read_text(encoding="utf-8"))
+    event = exported["traceEvents"][0]
+    assert event["name"] == "decode"
+    assert event["ph"] == "X"
+    assert event["args"]["trace_id"] == current.trace_id
+
+
+def test_empty_trace_has_no_timing():
+    assert Trace().server_timing() == ""